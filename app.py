@@ -1,24 +1,1485 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Blueprint, current_app, g, render_template, request, jsonify
 import aiohttp
 import asyncio
 import sqlite3
 import json
 import threading
 import time
+import math
+import os
+import atexit
+import contextlib
+import contextvars
+import queue
+import socket
+import uuid
 from datetime import datetime, timedelta
 import logging
+import logging.handlers
+import re
+import bisect
+import heapq
+import struct
+from collections import deque
 
-# 로깅 설정
-logging.basicConfig(level=logging.INFO)
+try:
+    import paho.mqtt.client as mqtt
+except ImportError:
+    # MQTT 브리지는 선택 기능 (미설치 시 비활성)
+    mqtt = None
+
+# 로깅 설정 (핸들러 구성은 실행 시점에)
 logger = logging.getLogger(__name__)
 
-app = Flask(__name__)
+# 하위 시스템별 로거 (KC868_LOG_LEVELS="board=DEBUG,modbus=WARNING" 형식으로 레벨 개별 지정)
+LOG_SUBSYSTEMS = ('board', 'schedule', 'inputs', 'rules', 'modbus', 'mqtt', 'state', 'api')
+board_logger = logger.getChild('board')
+schedule_logger = logger.getChild('schedule')
+input_logger = logger.getChild('inputs')
+rule_logger = logger.getChild('rules')
+modbus_logger = logger.getChild('modbus')
+mqtt_logger = logger.getChild('mqtt')
+state_logger = logger.getChild('state')
+api_logger = logger.getChild('api')
+
+# 로그에 함께 기록할 요청/명령 ID (asyncio 작업에도 자동 전파)
+request_id_var = contextvars.ContextVar('kc868_request_id', default=None)
+command_id_var = contextvars.ContextVar('kc868_command_id', default=None)
+
+# 기록 스레드에서 나중에 포맷해도 값이 바뀌지 않는 인자 타입
+_IMMUTABLE_LOG_ARGS = (str, int, float, bytes, type(None))
+
+class ContextQueueHandler(logging.handlers.QueueHandler):
+    """호출 스레드는 ID만 붙여서 큐에 넣고, 메시지 포맷/출력은 기록 스레드에서 처리
+
+    인자가 모두 불변 값일 때만 포맷을 미루고, dict/list/예외 객체처럼 이후에
+    바뀔 수 있는 인자가 있으면 호출 시점 값으로 여기서 포맷한다.
+    """
+
+    def prepare(self, record):
+        record.request_id = request_id_var.get()
+        record.command_id = command_id_var.get()
+        args = record.args
+        # 인자가 dict 1개면 logging이 그 dict 자체를 args로 쓰므로 항상 바로 포맷
+        if args and (isinstance(args, dict) or not all(isinstance(value, _IMMUTABLE_LOG_ARGS) for value in args)):
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+class JsonLogFormatter(logging.Formatter):
+    """로그 레코드를 JSON 한 줄로 변환"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+            'thread': record.threadName,
+        }
+        for key in ('request_id', 'command_id'):
+            value = getattr(record, key, None)
+            if value:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+_log_listener = None
+_log_config_lock = threading.Lock()
+
+def _restart_log_listener():
+    """fork 직후 자식 프로세스에서 같은 큐를 비우는 기록 스레드 새로 시작"""
+    global _log_listener, _log_config_lock
+    _log_config_lock = threading.Lock()
+    if _log_listener is not None:
+        _log_listener = logging.handlers.QueueListener(_log_listener.queue, *_log_listener.handlers)
+        _log_listener.start()
+        atexit.register(_log_listener.stop)
+
+def configure_logging(level=None, levels=None, fmt=None):
+    """큐 기반 로깅 구성 (실행 시점에 1회 호출)
+
+    level: 기본 레벨 (KC868_LOG_LEVEL, 기본 INFO)
+    levels: 하위 시스템별 레벨 "board=DEBUG,modbus=WARNING" (KC868_LOG_LEVELS)
+    fmt: 'json' 또는 'text' (KC868_LOG_FORMAT, 기본 json)
+    """
+    global _log_listener
+    # 백그라운드 DB 준비 스레드와 동시에 호출될 수 있음
+    with _log_config_lock:
+        if _log_listener is not None:
+            return _log_listener
+        level = level or os.environ.get('KC868_LOG_LEVEL', 'INFO')
+        levels = levels if levels is not None else os.environ.get('KC868_LOG_LEVELS', '')
+        fmt = fmt or os.environ.get('KC868_LOG_FORMAT', 'json')
+    
+        sink = logging.StreamHandler()
+        if fmt == 'json':
+            sink.setFormatter(JsonLogFormatter())
+        else:
+            sink.setFormatter(logging.Formatter('%(asctime)s %(levelname)s [%(name)s] %(message)s'))
+    
+        # 출력이 느려도 호출 측은 큐에 넣는 비용만 부담
+        log_queue = queue.SimpleQueue()
+        _log_listener = logging.handlers.QueueListener(log_queue, sink)
+        _log_listener.start()
+        atexit.register(_log_listener.stop)
+        # fork된 워커(gunicorn --preload)에는 기록 스레드가 없으므로 다시 시작
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=_restart_log_listener)
+    
+        root = logging.getLogger()
+        root.handlers = [ContextQueueHandler(log_queue)]
+        root.setLevel(level.upper())
+        for item in levels.split(','):
+            if '=' not in item:
+                continue
+            name, sub_level = (part.strip() for part in item.split('=', 1))
+            target = logger.getChild(name) if name in LOG_SUBSYSTEMS else logging.getLogger(name)
+            target.setLevel(sub_level.upper())
+        return _log_listener
+
+# 스케줄 요일 비트마스크 (bit0=월요일 ~ bit6=일요일)
+ALL_DAYS_MASK = 0b1111111
+
+def day_bit(day_of_week):
+    """요일(0=월~6=일)을 비트로 변환"""
+    day_of_week = int(day_of_week)
+    if not 0 <= day_of_week <= 6:
+        raise ValueError(f"잘못된 요일: {day_of_week}")
+    return 1 << day_of_week
+
+def days_to_mask(days):
+    """요일 목록을 비트마스크로 변환"""
+    mask = 0
+    for day in days:
+        mask |= day_bit(day)
+    return mask
+
+def mask_days(mask):
+    """비트마스크를 요일 목록으로 변환"""
+    return [day for day in range(7) if mask & (1 << day)]
+
+def normalize_windows(entry):
+    """스케줄 시간대 목록 검증 ([{'on': 'HH:MM', 'off': 'HH:MM'}, ...])"""
+    windows = entry.get('windows')
+    if windows is None:
+        windows = [{'on': entry.get('time_on'), 'off': entry.get('time_off')}]
+    if not isinstance(windows, list):
+        raise ValueError("windows는 목록이어야 합니다")
+    
+    normalized = []
+    for window in windows:
+        if not isinstance(window, dict):
+            raise ValueError(f"잘못된 시간대: {window!r}")
+        on, off = window.get('on') or None, window.get('off') or None
+        if not on and not off:
+            raise ValueError("켜는 시간 또는 끄는 시간 중 하나는 필요합니다")
+        # 스케줄 체크는 "HH:MM" 문자열로 비교하므로 "5:00" → "05:00"으로 저장
+        on, off = (datetime.strptime(value, "%H:%M").strftime("%H:%M") if value else None for value in (on, off))
+        # 같은 시간대 중복은 1개만 유지
+        if {'on': on, 'off': off} not in normalized:
+            normalized.append({'on': on, 'off': off})
+    
+    if not normalized:
+        raise ValueError("시간대가 지정되지 않았습니다")
+    return normalized
+
+# 센서 다운샘플링 단계: (버킷 크기 초, 보관 기간 초)
+ROLLUP_TIERS = (
+    (10, 24 * 3600),          # 10초 버킷, 1일
+    (300, 30 * 24 * 3600),    # 5분 버킷, 30일
+    (3600, 730 * 24 * 3600),  # 1시간 버킷, 2년
+)
+
+class SensorTimeSeries:
+    """입력/센서 시계열 저장소
+
+    최근 원시 샘플은 센서별 링 버퍼(메모리)에만 두고, DB에는 단계별
+    min/max/sum/count 버킷만 기록한다. 샘플 빈도와 무관하게 센서당 저장량은
+    (보관 기간 / 버킷 크기)로 제한된다.
+    """
+
+    def __init__(self, db_path='kc868_timeseries.db', ring_size=600):
+        self.db_path = db_path
+        self.ring_size = ring_size
+        self._rings = {}
+        self._latest = {}
+        # (sensor, resolution, bucket) -> [min, max, sum, count, last] (마지막 flush 이후 증분)
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def init_db(self):
+        """시계열 데이터베이스 초기화"""
+        conn = sqlite3.connect(self.db_path)
+        c = conn.cursor()
+        c.execute("PRAGMA journal_mode=WAL")
+        # (sensor, resolution, bucket) 기본키로 클러스터링 → 구간 조회가 인덱스 범위 스캔
+        c.execute('''CREATE TABLE IF NOT EXISTS sensor_rollups
+                    (sensor TEXT NOT NULL,
+                     resolution INTEGER NOT NULL,
+                     bucket INTEGER NOT NULL,
+                     min REAL, max REAL, sum REAL, count INTEGER, last REAL,
+                     PRIMARY KEY (sensor, resolution, bucket)) WITHOUT ROWID''')
+        conn.commit()
+        conn.close()
+
+    def add_sample(self, sensor, value, ts=None):
+        """샘플 1개 추가 (메모리만 갱신, DB 기록은 flush에서)"""
+        ts = time.time() if ts is None else ts
+        value = float(value)
+        with self._lock:
+            ring = self._rings.get(sensor)
+            if ring is None:
+                ring = self._rings[sensor] = deque(maxlen=self.ring_size)
+            ring.append((ts, value))
+            self._latest[sensor] = (ts, value)
+
+            for resolution, _ in ROLLUP_TIERS:
+                key = (sensor, resolution, int(ts // resolution) * resolution)
+                agg = self._pending.get(key)
+                if agg is None:
+                    self._pending[key] = [value, value, value, 1, value]
+                else:
+                    if value < agg[0]:
+                        agg[0] = value
+                    if value > agg[1]:
+                        agg[1] = value
+                    agg[2] += value
+                    agg[3] += 1
+                    agg[4] = value
+
+    def flush(self):
+        """누적된 버킷 증분을 DB에 병합 기록 (한 트랜잭션)"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+
+        try:
+            conn = sqlite3.connect(self.db_path, timeout=5)
+            try:
+                conn.executemany("""
+                    INSERT INTO sensor_rollups (sensor, resolution, bucket, min, max, sum, count, last)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(sensor, resolution, bucket) DO UPDATE SET
+                        min = MIN(min, excluded.min), max = MAX(max, excluded.max),
+                        sum = sum + excluded.sum, count = count + excluded.count, last = excluded.last
+                """, [key + tuple(agg) for key, agg in pending.items()])
+                conn.commit()
+            finally:
+                conn.close()
+        except Exception:
+            # 기록 실패한 증분은 그 사이 쌓인 증분과 합쳐서 다음 flush에 다시 기록
+            with self._lock:
+                for key, agg in pending.items():
+                    newer = self._pending.get(key)
+                    if newer is not None:
+                        agg = [min(agg[0], newer[0]), max(agg[1], newer[1]),
+                               agg[2] + newer[2], agg[3] + newer[3], newer[4]]
+                    self._pending[key] = agg
+            raise
+        return len(pending)
+
+    def prune(self, now=None):
+        """보관 기간이 지난 버킷 삭제"""
+        now = time.time() if now is None else now
+        conn = sqlite3.connect(self.db_path, timeout=5)
+        c = conn.cursor()
+        deleted = 0
+        for resolution, retention in ROLLUP_TIERS:
+            c.execute("DELETE FROM sensor_rollups WHERE resolution = ? AND bucket < ?",
+                      (resolution, now - retention))
+            deleted += c.rowcount
+        conn.commit()
+        conn.close()
+        return deleted
+
+    def latest(self):
+        """센서별 최신 값 {sensor: {'ts', 'value'}}"""
+        with self._lock:
+            return {sensor: {'ts': ts, 'value': value} for sensor, (ts, value) in self._latest.items()}
+
+    def recent(self, sensor, limit=None):
+        """링 버퍼의 최근 원시 샘플 (입력 리더 워커에만 있음, 다른 워커는 stored_recent 사용)"""
+        with self._lock:
+            samples = list(self._rings.get(sensor, ()))
+        if limit:
+            samples = samples[-limit:]
+        return [{'ts': ts, 'value': value} for ts, value in samples]
+
+    def pick_resolution(self, start, end, max_points, now=None):
+        """구간 길이와 보관 기간에 맞는 가장 세밀한 버킷 크기 선택"""
+        now = time.time() if now is None else now
+        for resolution, retention in ROLLUP_TIERS:
+            if start >= now - retention and (end - start) / resolution <= max_points:
+                return resolution
+        return ROLLUP_TIERS[-1][0]
+
+    def query(self, sensor, start, end, max_points=500, resolution=None):
+        """구간 조회 (min/max/avg 버킷 목록)"""
+        resolution = resolution or self.pick_resolution(start, end, max_points)
+        # 아직 DB에 기록되지 않은 증분도 포함되도록 먼저 flush
+        self.flush()
+
+        conn = sqlite3.connect(self.db_path, timeout=5)
+        c = conn.cursor()
+        c.execute("""
+            SELECT bucket, min, max, sum, count, last FROM sensor_rollups
+            WHERE sensor = ? AND resolution = ? AND bucket >= ? AND bucket <= ?
+            ORDER BY bucket
+        """, (sensor, resolution, int(start // resolution) * resolution, end))
+        rows = c.fetchall()
+        conn.close()
+
+        return {
+            'sensor': sensor,
+            'resolution': resolution,
+            'points': [{
+                'ts': bucket, 'min': min_, 'max': max_, 'avg': sum_ / count if count else None,
+                'count': count, 'last': last
+            } for bucket, min_, max_, sum_, count, last in rows]
+        }
+
+    def stored_recent(self, sensor, limit=None):
+        """DB에 기록된 가장 세밀한 버킷의 마지막 값 (링 버퍼가 없는 워커용, flush 주기만큼 늦음)"""
+        resolution = ROLLUP_TIERS[0][0]
+        conn = sqlite3.connect(self.db_path, timeout=5)
+        c = conn.cursor()
+        c.execute("""
+            SELECT bucket, last FROM sensor_rollups
+            WHERE sensor = ? AND resolution = ?
+            ORDER BY bucket DESC LIMIT ?
+        """, (sensor, resolution, limit or self.ring_size))
+        rows = c.fetchall()
+        conn.close()
+        return [{'ts': bucket, 'value': last} for bucket, last in reversed(rows)]
+
+    def stored_latest(self):
+        """DB에 기록된 센서별 마지막 값 (링 버퍼가 없는 워커용)"""
+        resolution = ROLLUP_TIERS[0][0]
+        conn = sqlite3.connect(self.db_path, timeout=5)
+        c = conn.cursor()
+        c.execute("""
+            SELECT sensor, MAX(bucket), last FROM sensor_rollups
+            WHERE resolution = ? GROUP BY sensor
+        """, (resolution,))
+        rows = c.fetchall()
+        conn.close()
+        return {sensor: {'ts': bucket, 'value': last} for sensor, bucket, last in rows}
+
+    def sensors(self):
+        """기록된 센서 목록"""
+        conn = sqlite3.connect(self.db_path, timeout=5)
+        c = conn.cursor()
+        c.execute("SELECT DISTINCT sensor FROM sensor_rollups")
+        names = {row[0] for row in c.fetchall()}
+        conn.close()
+        with self._lock:
+            names.update(self._latest)
+        return sorted(names)
+
+class TimerWheel:
+    """계층형 타이머 휠 (등록/취소 O(1), 타이머별 스레드 없음)
+
+    tick 단위로 시간을 나누고, 레벨마다 slots개 슬롯을 둔다. 먼 타이머는 상위
+    레벨에 두었다가 하위 레벨로 내려오며(cascade), advance()가 호출될 때 만료된
+    타이머를 반환한다.
+    """
+
+    def __init__(self, tick=0.5, slots=64, levels=4, now=None):
+        self.tick = tick
+        self.slots = slots
+        self.levels = levels
+        self._wheels = [[{} for _ in range(slots)] for _ in range(levels)]
+        # timer_id -> (level, slot, due_tick, payload)
+        self._timers = {}
+        self._current = int((time.time() if now is None else now) / tick)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._timers)
+
+    def __contains__(self, timer_id):
+        return timer_id in self._timers
+
+    def _place(self, timer_id, due_tick, payload, earliest_tick):
+        due_tick = max(due_tick, earliest_tick)
+        delta = due_tick - self._current
+        level = 0
+        span = self.slots
+        while delta >= span and level < self.levels - 1:
+            level += 1
+            span *= self.slots
+        slot = (due_tick // (self.slots ** level)) % self.slots
+        self._wheels[level][slot][timer_id] = (due_tick, payload)
+        self._timers[timer_id] = (level, slot)
+
+    def add(self, timer_id, due_at, payload):
+        """타이머 등록 (같은 ID가 있으면 교체)"""
+        with self._lock:
+            self._remove(timer_id)
+            # 이미 지난 타이머는 다음 tick에 만료
+            self._place(timer_id, math.ceil(due_at / self.tick), payload, self._current + 1)
+
+    def _remove(self, timer_id):
+        position = self._timers.pop(timer_id, None)
+        if position is None:
+            return False
+        level, slot = position
+        del self._wheels[level][slot][timer_id]
+        return True
+
+    def cancel(self, timer_id):
+        """타이머 취소"""
+        with self._lock:
+            return self._remove(timer_id)
+
+    def clear(self):
+        """모든 타이머 제거"""
+        with self._lock:
+            for wheel in self._wheels:
+                for bucket in wheel:
+                    bucket.clear()
+            self._timers.clear()
+
+    def advance(self, now=None):
+        """현재 시각까지 진행하고 만료된 (timer_id, payload) 목록 반환"""
+        target = int((time.time() if now is None else now) / self.tick)
+        expired = []
+        with self._lock:
+            while self._current < target:
+                self._current += 1
+                tick = self._current
+
+                # 상위 레벨 슬롯이 돌아오면 하위 레벨로 재배치
+                for level in range(self.levels - 1, 0, -1):
+                    unit = self.slots ** level
+                    if tick % unit:
+                        continue
+                    bucket = self._wheels[level][(tick // unit) % self.slots]
+                    entries = list(bucket.items())
+                    bucket.clear()
+                    for timer_id, (due_tick, payload) in entries:
+                        del self._timers[timer_id]
+                        # 현재 tick이 만료 시점이면 아래 레벨 0 처리에서 바로 만료
+                        self._place(timer_id, due_tick, payload, tick)
+
+                bucket = self._wheels[0][tick % self.slots]
+                if not bucket:
+                    continue
+                for timer_id, (due_tick, payload) in list(bucket.items()):
+                    if due_tick <= tick:
+                        del bucket[timer_id]
+                        del self._timers[timer_id]
+                        expired.append((timer_id, payload))
+        return expired
+
+# 규칙 트리거 연산자: eq(값이 됨), change(값이 바뀜), above/below(임계값 교차)
+RULE_TRIGGER_OPS = ('eq', 'change', 'above', 'below')
+
+def normalize_rule(data):
+    """규칙 입력 검증 및 정규화"""
+    if not isinstance(data, dict) or not data:
+        raise ValueError("규칙은 비어 있지 않은 JSON 객체여야 합니다")
+    trigger_source = str(data.get('trigger_source') or '').strip()
+    if not trigger_source:
+        raise ValueError("trigger_source가 필요합니다")
+    
+    trigger_op = data.get('trigger_op', 'eq')
+    if trigger_op not in RULE_TRIGGER_OPS:
+        raise ValueError(f"지원하지 않는 트리거: {trigger_op}")
+    
+    trigger_value = data.get('trigger_value')
+    if trigger_op == 'eq':
+        if trigger_value is None:
+            raise ValueError("eq 트리거에는 trigger_value가 필요합니다")
+        trigger_value = str(trigger_value).upper()
+    elif trigger_op in ('above', 'below'):
+        trigger_value = float(trigger_value)
+    else:
+        trigger_value = None
+    
+    if data.get('action_switch') is None:
+        raise ValueError("action_switch가 필요합니다")
+    action_switch = int(data.get('action_switch'))
+    if not 1 <= action_switch <= 6:
+        raise ValueError(f"잘못된 스위치 번호: {action_switch}")
+    
+    action = str(data.get('action', 'ON')).upper()
+    if action not in ('ON', 'OFF', 'PULSE'):
+        raise ValueError(f"지원하지 않는 동작: {action}")
+    
+    duration = data.get('duration')
+    duration = float(duration) if duration else None
+    if action == 'PULSE' and not duration:
+        raise ValueError("PULSE 동작에는 duration이 필요합니다")
+    
+    return {
+        'name': data.get('name'),
+        'board': data.get('board'),
+        'trigger_source': trigger_source,
+        'trigger_op': trigger_op,
+        'trigger_value': trigger_value,
+        'action_switch': action_switch,
+        'action': action,
+        'duration': duration,
+        'cooldown': float(data.get('cooldown', 1.0)),
+        'enabled': bool(data.get('enabled', True)),
+    }
+
+class RuleIndex:
+    """트리거 소스별로 컴파일된 규칙 색인
+
+    eq 규칙은 (소스, 값) 사전으로, 임계값 규칙은 소스별 정렬 목록으로 두어
+    이벤트 1건을 전체 규칙 수가 아닌 일치하는 규칙 수에 비례해서 매칭한다.
+    """
+
+    def __init__(self, rules=()):
+        self._exact = {}    # (source, value) -> [rule]
+        self._change = {}   # source -> [rule]
+        self._above = {}    # source -> ([threshold], [rule]) (임계값 오름차순)
+        self._below = {}
+        self.size = 0
+        
+        above, below = {}, {}
+        for rule in rules:
+            source, op = rule['trigger_source'], rule['trigger_op']
+            if op == 'eq':
+                self._exact.setdefault((source, rule['trigger_value']), []).append(rule)
+            elif op == 'change':
+                self._change.setdefault(source, []).append(rule)
+            elif op == 'above':
+                above.setdefault(source, []).append(rule)
+            elif op == 'below':
+                below.setdefault(source, []).append(rule)
+            self.size += 1
+        
+        for target, grouped in ((self._above, above), (self._below, below)):
+            for source, source_rules in grouped.items():
+                source_rules.sort(key=lambda r: r['trigger_value'])
+                target[source] = ([r['trigger_value'] for r in source_rules], source_rules)
+
+    def match(self, source, value, previous):
+        """previous → value 전이에 해당하는 규칙 목록"""
+        matched = list(self._change.get(source, ()))
+        
+        if isinstance(value, str):
+            matched.extend(self._exact.get((source, value), ()))
+            return matched
+        
+        if previous is None or isinstance(previous, str):
+            return matched
+        
+        if value > previous and source in self._above:
+            # previous <= 임계값 < value 인 규칙 (위로 교차)
+            thresholds, source_rules = self._above[source]
+            matched.extend(source_rules[bisect.bisect_left(thresholds, previous):
+                                        bisect.bisect_left(thresholds, value)])
+        elif value < previous and source in self._below:
+            # value < 임계값 <= previous 인 규칙 (아래로 교차)
+            thresholds, source_rules = self._below[source]
+            matched.extend(source_rules[bisect.bisect_right(thresholds, value):
+                                        bisect.bisect_right(thresholds, previous)])
+        return matched
+
+class RuleEngine:
+    """입력/릴레이 상태 이벤트로 릴레이를 제어하는 로컬 규칙 엔진
+
+    이벤트는 호출한 스레드에서 바로 매칭하고, 동작은 전용 이벤트 루프 스레드에
+    넘겨 컨트롤러의 control_switch 경로로 실행한다.
+    """
+
+    def __init__(self, controller):
+        self.controller = controller
+        self._index = RuleIndex()
+        self._last_values = {}
+        self._last_fired = {}
+        self._lock = threading.Lock()
+        self._loop = None
+        self._thread = None
+        self.revision = None
+        self.stats = {'events': 0, 'matched': 0, 'dispatched': 0, 'match_us_total': 0.0,
+                      'last_latency_ms': None}
+
+    def load(self, rules, revision=None):
+        """규칙 목록을 색인으로 컴파일해서 교체"""
+        self._index = RuleIndex([r for r in rules if r['enabled']])
+        self.revision = revision
+        rule_logger.info("🧩 규칙 %s개 컴파일 완료", self._index.size)
+
+    def start(self):
+        """동작 실행용 이벤트 루프 스레드 시작"""
+        if self._thread is not None:
+            return
+        loop = asyncio.new_event_loop()
+        
+        def run():
+            asyncio.set_event_loop(loop)
+            loop.run_forever()
+            loop.close()
+        
+        self._loop = loop
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        """이벤트 루프 스레드 중지"""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout)
+        self._loop = None
+        self._thread = None
+
+    def process(self, source, value):
+        """상태 이벤트 1건 처리 (첫 관측값은 기준값으로만 저장)"""
+        started = time.perf_counter()
+        with self._lock:
+            previous = self._last_values.get(source)
+            self._last_values[source] = value
+            if previous is None or previous == value or self._loop is None:
+                return 0
+            
+            matched = self._index.match(source, value, previous)
+            self.stats['events'] += 1
+            self.stats['match_us_total'] += (time.perf_counter() - started) * 1e6
+            if not matched:
+                return 0
+            
+            now = time.time()
+            ready = []
+            for rule in matched:
+                # 규칙끼리 서로 트리거하며 반복되지 않도록 재실행 대기 시간 적용
+                if now - self._last_fired.get(rule['id'], 0) < rule['cooldown']:
+                    continue
+                self._last_fired[rule['id']] = now
+                ready.append(rule)
+            self.stats['matched'] += len(matched)
+        
+        for rule in ready:
+            asyncio.run_coroutine_threadsafe(self._run_action(rule, started), self._loop)
+        return len(ready)
+
+    async def _run_action(self, rule, started):
+        action, duration = rule['action'], rule['duration']
+        rule_logger.info("🧩 규칙 실행: %s → 스위치%s %s", rule['name'] or rule['id'], rule['action_switch'], action)
+        try:
+            await self.controller.control_switch(rule['action_switch'], action, duration=duration)
+            self.stats['dispatched'] += 1
+            self.stats['last_latency_ms'] = round((time.perf_counter() - started) * 1000, 2)
+        except Exception as e:
+            rule_logger.error("💥 규칙 실행 오류: %s", e)
+
+    def get_stats(self):
+        """매칭/실행 통계"""
+        with self._lock:
+            stats = dict(self.stats)
+        stats['rules'] = self._index.size
+        match_us_total = stats.pop('match_us_total')
+        stats['avg_match_us'] = round(match_us_total / stats['events'], 2) if stats['events'] else None
+        return stats
+
+# Modbus 테이블별 읽기 함수 코드와 한 번에 읽을 수 있는 최대 개수
+MODBUS_TABLES = {
+    'coil': {'read': 1, 'max_count': 2000, 'bits': True, 'write': 5},
+    'discrete': {'read': 2, 'max_count': 2000, 'bits': True, 'write': None},
+    'holding': {'read': 3, 'max_count': 125, 'bits': False, 'write': 6},
+    'input': {'read': 4, 'max_count': 125, 'bits': False, 'write': None},
+}
+
+class ModbusError(Exception):
+    """Modbus 통신/예외 응답 오류"""
+
+def modbus_crc16(data):
+    """Modbus RTU CRC16 계산"""
+    crc = 0xFFFF
+    for byte in data:
+        crc ^= byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+    return crc
+
+def plan_modbus_reads(points, max_gap=None):
+    """포인트 목록을 연속 주소 블록으로 병합 (블록 하나당 요청 1회)
+
+    사이 간격이 max_gap 이하이면 빈 주소까지 함께 읽는 편이 요청을 따로
+    보내는 것보다 빠르므로 하나의 블록으로 합친다.
+    """
+    by_table = {}
+    for point in points:
+        by_table.setdefault(point['table'], []).append(point)
+    
+    blocks = []
+    for table, table_points in sorted(by_table.items()):
+        spec = MODBUS_TABLES[table]
+        gap = max_gap if max_gap is not None else (16 if spec['bits'] else 8)
+        block = None
+        for point in sorted(table_points, key=lambda p: p['address']):
+            address = point['address']
+            if (block is not None and address - (block['start'] + block['count']) <= gap
+                    and address - block['start'] < spec['max_count']):
+                block['count'] = max(block['count'], address - block['start'] + 1)
+                block['points'].append(point)
+                continue
+            block = {'table': table, 'start': address, 'count': 1, 'points': [point]}
+            blocks.append(block)
+    return blocks
+
+class ModbusClient:
+    """Modbus TCP / RTU-over-TCP 클라이언트 (요청은 연결마다 순차 처리)"""
+
+    def __init__(self, host, port=502, framing='tcp', timeout=2.0):
+        if framing not in ('tcp', 'rtu'):
+            raise ValueError(f"지원하지 않는 프레이밍: {framing}")
+        self.host = host
+        self.port = port
+        self.framing = framing
+        self.timeout = timeout
+        self._reader = None
+        self._writer = None
+        self._lock = asyncio.Lock()
+        self._transaction_id = 0
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except Exception:
+                pass
+        self._reader = self._writer = None
+
+    async def _connect(self):
+        if self._writer is None or self._writer.is_closing():
+            self._reader, self._writer = await asyncio.wait_for(
+                asyncio.open_connection(self.host, self.port), self.timeout)
+
+    async def _exchange(self, unit, pdu):
+        """PDU 1개 송수신 (실패 시 연결을 닫아 다음 요청에서 재연결)"""
+        async with self._lock:
+            try:
+                await self._connect()
+                if self.framing == 'tcp':
+                    response = await asyncio.wait_for(self._exchange_tcp(unit, pdu), self.timeout)
+                else:
+                    response = await asyncio.wait_for(self._exchange_rtu(unit, pdu), self.timeout)
+            except ModbusError:
+                raise
+            except Exception as e:
+                await self.close()
+                raise ModbusError(f"{self.host}:{self.port} 통신 오류: {e!r}") from e
+        
+        if not response:
+            raise ModbusError("빈 응답")
+        if response[0] & 0x80:
+            raise ModbusError(f"예외 응답 (함수 {pdu[0]}, 코드 {response[1] if len(response) > 1 else '?'})")
+        if response[0] != pdu[0]:
+            raise ModbusError(f"잘못된 응답 함수 코드: {response[0]}")
+        return response
+
+    async def _exchange_tcp(self, unit, pdu):
+        self._transaction_id = (self._transaction_id + 1) & 0xFFFF
+        header = struct.pack('>HHHB', self._transaction_id, 0, len(pdu) + 1, unit)
+        self._writer.write(header + pdu)
+        await self._writer.drain()
+        
+        while True:
+            transaction_id, _, length, _ = struct.unpack('>HHHB', await self._reader.readexactly(7))
+            response = await self._reader.readexactly(length - 1)
+            # 이전 요청의 늦은 응답은 버림
+            if transaction_id == self._transaction_id:
+                return response
+
+    async def _exchange_rtu(self, unit, pdu):
+        frame = bytes([unit]) + pdu
+        self._writer.write(frame + struct.pack('<H', modbus_crc16(frame)))
+        await self._writer.drain()
+        
+        head = await self._reader.readexactly(2)
+        function = head[1]
+        if function & 0x80:
+            rest = await self._reader.readexactly(3)
+        elif function in (1, 2, 3, 4):
+            byte_count = await self._reader.readexactly(1)
+            rest = byte_count + await self._reader.readexactly(byte_count[0] + 2)
+        else:
+            rest = await self._reader.readexactly(6)
+        
+        frame = head + rest
+        if struct.unpack('<H', frame[-2:])[0] != modbus_crc16(frame[:-2]):
+            await self.close()
+            raise ModbusError("CRC 오류")
+        return frame[1:-2]
+
+    async def read(self, unit, table, start, count):
+        """블록 읽기 → 비트 목록(bool) 또는 레지스터 목록(int)"""
+        spec = MODBUS_TABLES[table]
+        response = await self._exchange(unit, struct.pack('>BHH', spec['read'], start, count))
+        # 바이트 수 필드와 실제 길이, 요청 개수에 필요한 길이를 모두 확인
+        expected = (count + 7) // 8 if spec['bits'] else count * 2
+        if len(response) < 2 or response[1] != len(response) - 2 or response[1] < expected:
+            raise ModbusError(f"잘못된 응답 길이 (함수 {spec['read']}, {len(response)}바이트, 필요 {expected + 2})")
+        data = response[2:2 + response[1]]
+        if spec['bits']:
+            return [bool(data[i // 8] >> (i % 8) & 1) for i in range(count)]
+        return list(struct.unpack(f'>{count}H', data[:count * 2]))
+
+    async def write(self, unit, table, address, value):
+        """코일/홀딩 레지스터 1개 쓰기"""
+        spec = MODBUS_TABLES[table]
+        if not spec['write']:
+            raise ModbusError(f"{table}은(는) 쓰기를 지원하지 않습니다")
+        if spec['bits']:
+            raw = 0xFF00 if value else 0x0000
+        else:
+            raw = int(value) & 0xFFFF
+        request = struct.pack('>BHH', spec['write'], address, raw)
+        response = await self._exchange(unit, request)
+        # 단일 쓰기 응답은 요청을 그대로 반환
+        if response != request:
+            raise ModbusError(f"잘못된 쓰기 응답: {response.hex()}")
+
+def normalize_modbus_device(data):
+    """Modbus 장치 설정 검증 및 정규화"""
+    name = str(data.get('name') or '').strip()
+    if not name or '/' in name:
+        raise ValueError("장치 이름이 필요합니다 ('/' 사용 불가)")
+    host = str(data.get('host') or '').strip()
+    if not host:
+        raise ValueError("host가 필요합니다")
+    framing = data.get('framing', 'tcp')
+    if framing not in ('tcp', 'rtu'):
+        raise ValueError(f"지원하지 않는 프레이밍: {framing}")
+    poll_interval = float(data.get('poll_interval', 1.0))
+    if poll_interval < 0.1:
+        raise ValueError("poll_interval은 0.1초 이상이어야 합니다")
+    
+    points = []
+    names = set()
+    for point in data.get('points', []):
+        point_name = str(point.get('name') or '').strip()
+        table = point.get('table', 'coil')
+        address = int(point.get('address'))
+        if not point_name or point_name in names:
+            raise ValueError(f"포인트 이름이 비었거나 중복됨: {point_name!r}")
+        if table not in MODBUS_TABLES:
+            raise ValueError(f"지원하지 않는 테이블: {table}")
+        if not 0 <= address <= 0xFFFF:
+            raise ValueError(f"잘못된 주소: {address}")
+        names.add(point_name)
+        points.append({'name': point_name, 'table': table, 'address': address,
+                       'scale': float(point.get('scale', 1))})
+    if not points:
+        raise ValueError("포인트가 하나 이상 필요합니다")
+    
+    return {
+        'name': name,
+        'host': host,
+        'port': int(data.get('port', 502)),
+        'unit_id': int(data.get('unit_id', 1)),
+        'framing': framing,
+        'poll_interval': poll_interval,
+        'points': points,
+        'enabled': bool(data.get('enabled', True)),
+    }
+
+def modbus_point_value(point, raw):
+    """원시 값을 상태 API 형식으로 변환 (비트는 ON/OFF, 레지스터는 배율 적용)"""
+    if MODBUS_TABLES[point['table']]['bits']:
+        return "ON" if raw else "OFF"
+    value = raw * point['scale']
+    return int(value) if float(value).is_integer() else value
+
+class MQTTBridge:
+    """MQTT 브리지: 릴레이 상태를 retained 토픽으로 발행하고 명령 토픽을 구독
+
+    - {prefix}/relay/<n>/state : "ON"/"OFF" (retained, 바뀔 때만 발행)
+    - {prefix}/state           : 전체 릴레이 JSON (retained, 발행 묶음마다 1회)
+    - {prefix}/relay/<n>/set   : "ON"/"OFF"/"PULSE" 또는 {"action": ..., "duration": ...}
+    - {prefix}/status          : "online"/"offline" (LWT)
+
+    멀티 워커에서는 'mqtt' 임대를 가진 프로세스만 브로커에 연결한다.
+    """
+
+    def __init__(self, controller, host, port=1883, prefix='kc868', username=None, password=None,
+                 qos=1, batch_interval=0.1):
+        self.controller = controller
+        self.host = host
+        self.port = int(port)
+        self.prefix = prefix.rstrip('/')
+        self.username = username
+        self.password = password
+        self.qos = int(qos)
+        self.batch_interval = batch_interval
+        self._client = None
+        self._connected = False
+        # 발행 대기 (토픽별 마지막 값만 유지) / 브로커에 발행된 값
+        self._pending = {}
+        self._published = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._loop = None
+        self._loop_thread = None
+        self.stats = {'published': 0, 'coalesced': 0, 'batches': 0, 'commands': 0, 'rejected': 0}
+
+    def state_topic(self, switch_key):
+        return f"{self.prefix}/relay/{switch_key[len('스위치'):]}/state"
+
+    def notify(self, switch_key, state):
+        """상태 변경 알림 (어느 스레드에서든 호출, 실제 발행은 발행 스레드에서 묶어서 처리)"""
+        topic = self.state_topic(switch_key)
+        with self._lock:
+            if topic in self._pending:
+                self.stats['coalesced'] += 1
+            elif self._published.get(topic) == state:
+                return
+            self._pending[topic] = state
+        self._wake.set()
+
+    def start(self):
+        """브리지 스레드 시작 (paho-mqtt 미설치 시 비활성)"""
+        if mqtt is None:
+            mqtt_logger.warning("📡 paho-mqtt 미설치 - MQTT 브리지 비활성 (pip install paho-mqtt)")
+            return
+        if self._thread is not None:
+            return
+        self._stop_event.clear()
+        
+        # 명령 실행용 이벤트 루프 (paho 네트워크 스레드를 막지 않도록 분리)
+        loop = asyncio.new_event_loop()
+        
+        def run_loop():
+            asyncio.set_event_loop(loop)
+            loop.run_forever()
+            loop.close()
+        
+        self._loop = loop
+        self._loop_thread = threading.Thread(target=run_loop, daemon=True)
+        self._loop_thread.start()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        mqtt_logger.info("📡 MQTT 브리지 시작됨 (%s:%s, prefix=%s)", self.host, self.port, self.prefix)
+
+    def stop(self, timeout=5):
+        """브리지 중지 (정상 종료 시 offline 상태 발행)"""
+        self._stop_event.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self._disconnect(announce=True)
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._loop_thread.join(timeout)
+            self._loop = None
+            self._loop_thread = None
+
+    def _run(self):
+        last_lease = 0
+        last_sync = 0
+        while not self._stop_event.is_set():
+            now = time.time()
+            # 10초마다 임대 갱신 (리더만 브로커 연결)
+            if now - last_lease >= 10:
+                last_lease = now
+                if self.controller.try_acquire_leadership('mqtt', 30):
+                    if self._client is None:
+                        self._connect()
+                elif self._client is not None:
+                    self._disconnect()
+            
+            # 다른 워커가 바꾼 상태도 2초 내에 발행
+            if self._connected and now - last_sync >= 2:
+                last_sync = now
+                self.controller.sync_shared_state()
+                for switch_key, state in list(self.controller.last_known_status.items()):
+                    self.notify(switch_key, state)
+            
+            if self._wake.wait(1.0):
+                self._wake.clear()
+                # 짧은 구간의 연속 변경(전체 ON/OFF 등)을 한 번에 발행
+                self._stop_event.wait(self.batch_interval)
+            if self._connected:
+                self._publish_pending()
+
+    def _connect(self):
+        client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=f"kc868-{self.controller.instance_id}")
+        if self.username:
+            client.username_pw_set(self.username, self.password)
+        client.will_set(f"{self.prefix}/status", "offline", qos=self.qos, retain=True)
+        client.max_inflight_messages_set(20)
+        client.max_queued_messages_set(1000)
+        client.reconnect_delay_set(1, 30)
+        client.on_connect = self._on_connect
+        client.on_disconnect = self._on_disconnect
+        client.on_message = self._on_message
+        self._client = client
+        try:
+            client.connect_async(self.host, self.port, keepalive=30)
+            client.loop_start()
+        except Exception as e:
+            mqtt_logger.error("💥 MQTT 연결 오류: %s", e)
+            self._client = None
+
+    def _disconnect(self, announce=False):
+        client = self._client
+        if client is None:
+            return
+        self._client = None
+        try:
+            if announce and self._connected:
+                client.publish(f"{self.prefix}/status", "offline", qos=self.qos, retain=True).wait_for_publish(2)
+            self._connected = False
+            client.disconnect()
+            client.loop_stop()
+        except Exception as e:
+            mqtt_logger.error("💥 MQTT 종료 오류: %s", e)
+        self._connected = False
+
+    def _on_connect(self, client, userdata, flags, reason_code, properties):
+        if reason_code.is_failure:
+            mqtt_logger.warning("📡 MQTT 연결 거부: %s", reason_code)
+            return
+        client.subscribe(f"{self.prefix}/relay/+/set", qos=self.qos)
+        client.publish(f"{self.prefix}/status", "online", qos=self.qos, retain=True)
+        # 재연결 시 전체 상태를 다시 발행 (브로커 retained 값 보정)
+        with self._lock:
+            self._published = {}
+        for switch_key, state in list(self.controller.last_known_status.items()):
+            self.notify(switch_key, state)
+        self._connected = True
+        mqtt_logger.info("📡 MQTT 브로커 연결됨: %s:%s", self.host, self.port)
+
+    def _on_disconnect(self, client, userdata, flags, reason_code, properties):
+        if self._connected:
+            mqtt_logger.warning("📡 MQTT 연결 끊김: %s (자동 재연결)", reason_code)
+        self._connected = False
+
+    def _publish_pending(self):
+        with self._lock:
+            batch, self._pending = self._pending, {}
+        if not batch:
+            return
+        
+        client = self._client
+        failed = {}
+        for topic, payload in batch.items():
+            info = client.publish(topic, payload, qos=self.qos, retain=True)
+            if info.rc == mqtt.MQTT_ERR_SUCCESS:
+                with self._lock:
+                    self._published[topic] = payload
+                self.stats['published'] += 1
+            else:
+                failed[topic] = payload
+        
+        # 전체 상태 요약 토픽은 묶음당 1회
+        client.publish(f"{self.prefix}/state", json.dumps(self.controller.last_known_status, ensure_ascii=False),
+                       qos=self.qos, retain=True)
+        self.stats['batches'] += 1
+        
+        if failed:
+            # 연결이 끊긴 경우 재연결 후 다시 발행
+            with self._lock:
+                for topic, payload in failed.items():
+                    self._pending.setdefault(topic, payload)
+
+    def _on_message(self, client, userdata, msg):
+        """명령 토픽 수신 (paho 네트워크 스레드 → 명령 루프로 전달)"""
+        match = re.fullmatch(re.escape(self.prefix) + r'/relay/(\d+)/set', msg.topic)
+        payload = msg.payload.decode('utf-8', errors='replace').strip()
+        try:
+            if payload.startswith('{'):
+                command = json.loads(payload)
+            else:
+                command = {'action': payload}
+            action = str(command.get('action', '')).upper()
+            duration = command.get('duration')
+            switch_num = int(match.group(1)) if match else 0
+            if not 1 <= switch_num <= 6 or action not in ('ON', 'OFF', 'PULSE'):
+                raise ValueError(f"잘못된 명령: {msg.topic} {payload}")
+            # duration 검증은 /api/control과 동일
+            if duration is not None:
+                if isinstance(duration, bool) or not isinstance(duration, (int, float)) or duration <= 0:
+                    raise ValueError(f"duration은 0보다 큰 숫자여야 합니다: {duration!r}")
+            elif action == "PULSE":
+                raise ValueError("PULSE 동작에는 duration이 필요합니다")
+        except (ValueError, TypeError, AttributeError) as e:
+            self.stats['rejected'] += 1
+            mqtt_logger.warning("📡 MQTT 명령 무시: %s", e)
+            return
+        
+        if self._loop is not None:
+            asyncio.run_coroutine_threadsafe(self._run_command(switch_num, action, duration), self._loop)
+
+    async def _run_command(self, switch_num, action, duration):
+        mqtt_logger.info("📡 MQTT 명령: 스위치%s %s%s", switch_num, action, f" ({duration}초)" if duration else "")
+        self.stats['commands'] += 1
+        try:
+            success = await self.controller.control_switch(switch_num, action, duration=duration)
+        except Exception as e:
+            mqtt_logger.error("💥 MQTT 명령 실행 오류: %s", e)
+            success = False
+        if not success:
+            # 실패 시 현재 상태를 다시 발행해서 구독자 UI를 되돌림
+            switch_key = f"스위치{switch_num}"
+            with self._lock:
+                self._published.pop(self.state_topic(switch_key), None)
+            self.notify(switch_key, self.controller.last_known_status.get(switch_key, "OFF"))
+
+    def get_status(self):
+        """브리지 연결/발행 통계"""
+        return {
+            'broker': f"{self.host}:{self.port}",
+            'prefix': self.prefix,
+            'available': mqtt is not None,
+            'leader': self.controller.is_leader('mqtt'),
+            'connected': self._connected,
+            'pending': len(self._pending),
+            **self.stats,
+        }
+
+# 보드 요청 우선순위 (숫자가 작을수록 먼저 승인)
+BOARD_PRIORITIES = {'control': 0, 'schedule': 1, 'status': 2, 'debug': 3}
+# 우선순위별 최대 승인 대기 시간 (초)
+BOARD_QUEUE_TIMEOUTS = {'control': 5, 'schedule': 15, 'status': 5, 'debug': 10}
+# 공유 자리 유효 시간 (초) - 반납 없이 종료된 워커의 자리는 이 시간 후 회수
+BOARD_SLOT_TTL = 60
+
+class BoardAdmission:
+    """보드 1대에 대한 요청 승인 제어 (토큰 버킷 + 동시 요청 수 제한 + 우선순위)
+
+    ESP32 웹서버는 동시 연결을 몇 개만 처리하므로 모든 요청은 여기서 승인받은 후
+    실행한다. 대기 요청은 우선순위(제어 > 스케줄 > 상태 > 디버그) 순으로 승인하고,
+    제어용으로 동시 요청 1개와 토큰 1개를 항상 남겨두어 상태 폴링이 몰려도
+    제어 명령이 밀리지 않게 한다. 요청마다 이벤트 루프가 달라도 동작하도록
+    대기자는 자신의 루프에서 call_soon_threadsafe로 깨운다.
+
+    shared_db를 지정하면 프로세스 안에서 승인된 요청이 SQLite의 공유 자리/토큰도
+    받아야 실행되므로 gunicorn 워커가 여러 개여도 보드 전체 한도가 유지된다.
+    프로세스 사이에는 우선순위 대기열 대신 제어 예약분 규칙만 적용된다.
+    """
+
+    def __init__(self, max_concurrency=2, rate=8.0, burst=4, control_reserve=1, shared_db=None, key='board'):
+        self.max_concurrency = max_concurrency
+        self.rate = float(rate)
+        self.burst = float(burst)
+        # 제어 예약분을 빼고도 다른 요청이 승인될 수 있도록 제한
+        self.control_reserve = max(0, min(control_reserve, max_concurrency - 1, int(burst) - 1))
+        self._tokens = self.burst
+        self._refilled_at = time.monotonic()
+        self._in_flight = 0
+        self._waiters = []
+        self._seq = 0
+        self._refill_timer = None
+        self._lock = threading.Lock()
+        self.stats = {name: {'admitted': 0, 'queued': 0, 'wait_ms_total': 0.0, 'wait_ms_max': 0.0, 'timeouts': 0}
+                      for name in BOARD_PRIORITIES}
+        self.max_queue = 0
+        self.shared_db = shared_db
+        self.key = key
+        self._shared_ready = False
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+
+    def _admissible(self, priority, in_flight=None, tokens=None):
+        """(승인 가능 여부, 토큰 부족 시 대기 시간)"""
+        in_flight = self._in_flight if in_flight is None else in_flight
+        tokens = self._tokens if tokens is None else tokens
+        reserve = 0 if priority == 0 else self.control_reserve
+        if in_flight >= self.max_concurrency - reserve:
+            return False, None
+        if tokens < 1 + reserve:
+            return False, (1 + reserve - tokens) / self.rate
+        return True, 0
+
+    def _shared_connect(self):
+        conn = sqlite3.connect(self.shared_db, timeout=1, isolation_level=None)
+        if not self._shared_ready:
+            conn.execute('''CREATE TABLE IF NOT EXISTS board_admission_tokens
+                            (board TEXT PRIMARY KEY, tokens REAL NOT NULL, refilled_at REAL NOT NULL)''')
+            conn.execute('''CREATE TABLE IF NOT EXISTS board_admission_slots
+                            (slot_id TEXT PRIMARY KEY, board TEXT NOT NULL, pid INTEGER NOT NULL,
+                             priority TEXT NOT NULL, expires_at REAL NOT NULL)''')
+            self._shared_ready = True
+        return conn
+
+    def _shared_state(self, c, now):
+        """공유 (진행 중 요청 수, 충전된 토큰 수) - 트랜잭션 안에서 호출"""
+        c.execute("DELETE FROM board_admission_slots WHERE board = ? AND expires_at < ?", (self.key, now))
+        c.execute("SELECT COUNT(*) FROM board_admission_slots WHERE board = ?", (self.key,))
+        in_flight = c.fetchone()[0]
+        c.execute("SELECT tokens, refilled_at FROM board_admission_tokens WHERE board = ?", (self.key,))
+        row = c.fetchone()
+        tokens = self.burst if row is None else min(self.burst, row[0] + max(0.0, now - row[1]) * self.rate)
+        return in_flight, tokens
+
+    def _try_shared(self, priority):
+        """공유 자리 1개 시도 → (slot_id 또는 None, 토큰 부족 시 대기 시간)"""
+        now = time.time()
+        conn = self._shared_connect()
+        try:
+            c = conn.cursor()
+            c.execute("BEGIN IMMEDIATE")
+            in_flight, tokens = self._shared_state(c, now)
+            admissible, delay = self._admissible(BOARD_PRIORITIES[priority], in_flight, tokens)
+            slot_id = None
+            if admissible:
+                slot_id = uuid.uuid4().hex
+                tokens -= 1
+                c.execute("INSERT INTO board_admission_slots (slot_id, board, pid, priority, expires_at) VALUES (?, ?, ?, ?, ?)",
+                          (slot_id, self.key, os.getpid(), priority, now + BOARD_SLOT_TTL))
+            c.execute("INSERT OR REPLACE INTO board_admission_tokens (board, tokens, refilled_at) VALUES (?, ?, ?)",
+                      (self.key, tokens, now))
+            c.execute("COMMIT")
+            return slot_id, delay
+        finally:
+            conn.close()
+
+    async def _acquire_shared(self, priority, deadline):
+        """프로세스 간 공유 자리 대기 → (slot_id, 대기 여부), DB를 쓸 수 없으면 프로세스 내 제한만 적용"""
+        waited = False
+        while True:
+            try:
+                slot_id, delay = self._try_shared(priority)
+            except sqlite3.Error as e:
+                board_logger.warning("🚦 공유 승인 DB 오류, 프로세스 내 제한만 적용: %s", e)
+                return None, waited
+            if slot_id:
+                return slot_id, waited
+            remaining = deadline - time.monotonic() if deadline is not None else None
+            if remaining is not None and remaining <= 0:
+                raise asyncio.TimeoutError()
+            waited = True
+            # 자리 반납은 다른 프로세스에서 일어나므로 짧은 간격으로 다시 확인
+            wait = delay if delay is not None else 0.02
+            await asyncio.sleep(min(wait, remaining) if remaining is not None else wait)
+
+    def _release_shared(self, slot_id):
+        try:
+            conn = self._shared_connect()
+            try:
+                conn.execute("DELETE FROM board_admission_slots WHERE slot_id = ?", (slot_id,))
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            # 반납하지 못한 자리는 BOARD_SLOT_TTL 후 회수됨
+            board_logger.warning("🚦 공유 자리 반납 오류: %s", e)
+
+    def _take(self):
+        self._tokens -= 1
+        self._in_flight += 1
+
+    def _dispatch(self):
+        """대기 중인 요청을 우선순위 순으로 승인 (잠금 보유 상태에서 호출)"""
+        self._refill(time.monotonic())
+        while self._waiters:
+            waiter = self._waiters[0]
+            if waiter[4]:
+                heapq.heappop(self._waiters)
+                continue
+            admissible, delay = self._admissible(waiter[0])
+            if not admissible:
+                # 토큰 부족이면 충전 시점에 다시 확인 (동시 요청 수 부족이면 release에서 확인)
+                if delay is not None and self._refill_timer is None:
+                    self._refill_timer = threading.Timer(delay, self._on_refill)
+                    self._refill_timer.daemon = True
+                    self._refill_timer.start()
+                return
+            heapq.heappop(self._waiters)
+            waiter[4] = True
+            self._take()
+            try:
+                waiter[3].call_soon_threadsafe(self._grant, waiter[2])
+            except RuntimeError:
+                # 대기자의 이벤트 루프가 이미 닫힘
+                self._in_flight -= 1
+
+    def _on_refill(self):
+        with self._lock:
+            self._refill_timer = None
+            self._dispatch()
+
+    def _grant(self, future):
+        # 승인 전에 대기가 취소된 경우 자리 반납
+        if future.cancelled():
+            self.release()
+        else:
+            future.set_result(True)
+
+    async def acquire(self, priority='status', timeout=None):
+        """요청 1건 승인 대기 (timeout 초과 시 asyncio.TimeoutError, 반환값은 release에 전달)"""
+        level = BOARD_PRIORITIES[priority]
+        stats = self.stats[priority]
+        started = time.monotonic()
+        queued = False
+        with self._lock:
+            self._refill(started)
+            # 같거나 높은 우선순위 대기자가 없을 때만 바로 승인 (새치기 방지)
+            ahead = any(w[0] <= level and not w[4] for w in self._waiters)
+            if not ahead and self._admissible(level)[0]:
+                self._take()
+            else:
+                loop = asyncio.get_running_loop()
+                future = loop.create_future()
+                self._seq += 1
+                waiter = [level, self._seq, future, loop, False]
+                heapq.heappush(self._waiters, waiter)
+                stats['queued'] += 1
+                self.max_queue = max(self.max_queue, len(self._waiters))
+                self._dispatch()
+                queued = True
+        
+        try:
+            if queued:
+                await asyncio.wait_for(future, timeout)
+        except (asyncio.CancelledError, asyncio.TimeoutError) as e:
+            with self._lock:
+                if not waiter[4]:
+                    waiter[4] = True
+                elif future.done() and not future.cancelled():
+                    self._in_flight -= 1
+                    self._dispatch()
+            if isinstance(e, asyncio.TimeoutError):
+                stats['timeouts'] += 1
+            raise
+        
+        slot_id, shared_waited = None, False
+        if self.shared_db:
+            try:
+                slot_id, shared_waited = await self._acquire_shared(
+                    priority, started + timeout if timeout is not None else None)
+            except (asyncio.CancelledError, asyncio.TimeoutError) as e:
+                self.release()
+                if isinstance(e, asyncio.TimeoutError):
+                    stats['timeouts'] += 1
+                raise
+        
+        waited = (time.monotonic() - started) * 1000
+        stats['admitted'] += 1
+        if not queued and shared_waited:
+            # 다른 워커가 자리/토큰을 쓰고 있어서 기다린 경우
+            stats['queued'] += 1
+            queued = True
+        if queued:
+            stats['wait_ms_total'] += waited
+            stats['wait_ms_max'] = max(stats['wait_ms_max'], waited)
+        return slot_id
+
+    def release(self, slot_id=None):
+        """요청 완료 후 자리 반납 (slot_id는 acquire 반환값)"""
+        if slot_id:
+            self._release_shared(slot_id)
+        with self._lock:
+            self._in_flight -= 1
+            self._dispatch()
+
+    @contextlib.asynccontextmanager
+    async def slot(self, priority='status', timeout=None):
+        """async with admission.slot('control'): ... 형태로 사용"""
+        slot_id = await self.acquire(priority, timeout)
+        try:
+            yield
+        finally:
+            self.release(slot_id)
+
+    def get_stats(self):
+        """승인/대기 통계"""
+        with self._lock:
+            self._refill(time.monotonic())
+            state = {'in_flight': self._in_flight, 'tokens': round(self._tokens, 2),
+                     'waiting': sum(1 for w in self._waiters if not w[4]), 'max_queue': self.max_queue,
+                     'max_concurrency': self.max_concurrency, 'rate': self.rate}
+        if self.shared_db:
+            # 모든 워커 합계
+            try:
+                conn = self._shared_connect()
+                try:
+                    in_flight, tokens = self._shared_state(conn.cursor(), time.time())
+                finally:
+                    conn.close()
+                state['shared'] = {'in_flight': in_flight, 'tokens': round(tokens, 2)}
+            except sqlite3.Error as e:
+                state['shared'] = {'error': str(e)}
+        priorities = {}
+        for name, stats in self.stats.items():
+            waited = stats['queued'] or 1
+            priorities[name] = {'admitted': stats['admitted'], 'queued': stats['queued'],
+                                'timeouts': stats['timeouts'],
+                                'avg_wait_ms': round(stats['wait_ms_total'] / waited, 2),
+                                'max_wait_ms': round(stats['wait_ms_max'], 2)}
+        return {**state, 'priorities': priorities}
+
+_board_admissions = {}
+_board_admissions_lock = threading.Lock()
+
+def get_board_admission(host, **settings):
+    """보드(호스트)별 승인 제어기 (같은 보드를 쓰는 컨트롤러끼리 공유)"""
+    with _board_admissions_lock:
+        admission = _board_admissions.get(host)
+        if admission is None:
+            admission = _board_admissions[host] = BoardAdmission(key=host, **settings)
+        return admission
+
+# 스위치 상태 조회 URL 형식 (실제 펌웨어 형식 /switch/___N을 먼저 시도)
+SWITCH_STATUS_URL_PATTERNS = [
+    "/switch/___{n}",
+    "/switch/switch_{n}",
+    "/switch/switch{n}",
+    "/switch/relay{n}",
+    "/switch/relay_{n}",
+    "/sensor/switch{n}_status",
+    "/binary_sensor/switch{n}",
+    "/text_sensor/switch{n}_state",
+    "/api/switch{n}/state",
+]
+
+# 메모리에 보관할 최근 상태 전환 개수
+STATE_HISTORY_RING_SIZE = 500
 
 class KC868Controller:
         
-    async def control_switch(self, switch_num, action):
-        """스위치 제어 (ESPHome API 사용)"""
+    @contextlib.asynccontextmanager
+    async def board_request(self, session, method, url, priority='status', timing=None, **kwargs):
+        """보드 HTTP 요청 (승인 제어를 거친 후 실행, 응답을 읽는 동안 자리 유지)
+
+        timing에 dict를 넘기면 승인 시각(admitted_at, time.time())을 기록한다.
+        """
+        async with self.admission.slot(priority, timeout=BOARD_QUEUE_TIMEOUTS[priority]):
+            if timing is not None:
+                timing['admitted_at'] = time.time()
+            async with session.request(method, url, **kwargs) as response:
+                yield response
+
+    async def control_switch(self, switch_num, action, duration=None, priority='control'):
+        """스위치 제어 (명령마다 ID를 붙여서 관련 로그 추적)"""
+        token = command_id_var.set(uuid.uuid4().hex[:8])
         try:
+            return await self._control_switch(switch_num, action, duration, priority)
+        finally:
+            command_id_var.reset(token)
+
+    async def _control_switch(self, switch_num, action, duration, priority):
+        """스위치 제어 (ESPHome API 사용, duration 지정 시 해당 시간 후 반대 동작)"""
+        timer = None
+        try:
+            # PULSE = 지정 시간 동안 켜기
+            if action.upper() == "PULSE":
+                if not duration:
+                    raise ValueError("PULSE 동작에는 duration이 필요합니다")
+                action = "ON"
+
+            # 자동 반대 동작은 켜기 전에 먼저 저장 (저장 실패 시 켜지 않음 → 꺼지지 않는 스위치 방지)
+            auto_action = "OFF" if action.upper() == "ON" else "ON"
+            if duration:
+                timer = self.schedule_auto_action(switch_num, auto_action, duration)
+                if timer is None:
+                    board_logger.error("💥 자동 동작 저장 실패로 제어 중단: 스위치%s %s", switch_num, action)
+                    return False
+
             # ESPHome 표준 엔드포인트 (개발주의사항.md 기반)
             entity_name = f"스위치{switch_num}"  # ESPHome에서 설정한 정확한 이름
             esphome_action = "turn_on" if action.upper() == "ON" else "turn_off"
@@ -31,57 +1492,187 @@ class KC868Controller:
             async with aiohttp.ClientSession() as session:
                 for url in possible_urls:
                     try:
-                        logger.info(f"🔌 시도: {url}")
+                        board_logger.info("🔌 시도: %s", url)
                         
                         # ESPHome은 POST 방식 사용 (공식 문서 확인)
-                        async with session.post(
-                            url,
+                        async with self.board_request(
+                            session, 'POST', url, priority,
                             timeout=aiohttp.ClientTimeout(total=5)
                         ) as response:
                             
                             content = await response.text()
-                            logger.info(f"📡 응답 {response.status}: {content[:100]}...")
+                            board_logger.info("📡 응답 %s: %s...", response.status, content[:100])
                             
                             if response.status == 200:
-                                logger.info(f"✅ 성공! 스위치{switch_num} {action}")
+                                board_logger.info("✅ 성공! 스위치%s %s", switch_num, action)
                                 # 제어 성공 시 캐시 즉시 업데이트
-                                self.last_known_status[f"스위치{switch_num}"] = action.upper()
+                                self._set_state(f"스위치{switch_num}", action.upper(), 'controlled')
                                 # 제어 기록 저장 (검증용)
                                 self._recent_controls[switch_num] = (time.time(), action.upper())
                                 self.log_action(switch_num, action)
+                                if timer:
+                                    # 보드 응답이 늦었으면 실제 켜진 시각 기준으로 다시 예약 (실패해도 기존 행 유지)
+                                    if time.time() - (timer['due_at'] - float(duration)) > self._timer_wheel.tick:
+                                        self.schedule_auto_action(switch_num, auto_action, duration)
+                                else:
+                                    # 새 명령이 우선하므로 대기 중인 자동 동작 취소
+                                    self.cancel_switch_timers(switch_num)
                                 return True
                                 
                     except Exception as e:
-                        logger.warning(f"❌ 실패 {url}: {e}")
+                        board_logger.warning("❌ 실패 %s: %s", url, e)
                         continue
                 
                 # 모든 URL 실패시 데모 모드
-                logger.warning(f"🔄 데모 모드: 스위치{switch_num} {action}")
+                if timer:
+                    self.cancel_timer(timer['timer_id'])
+                board_logger.warning("🔄 데모 모드: 스위치%s %s", switch_num, action)
                 self.log_action(switch_num, action, demo=True)
                 return False
                 
         except Exception as e:
-            logger.error(f"💥 컨트롤 오류: {e}")
+            board_logger.error("💥 컨트롤 오류: %s", e)
+            if timer:
+                self.cancel_timer(timer['timer_id'])
             return False
     
-    def __init__(self, ip_address="192.168.0.100"):
+    def __init__(self, ip_address="192.168.0.100", admission=None):
         self.ip_address = ip_address
         self.base_url = f"http://{ip_address}"
+        # 보드로 나가는 모든 요청의 승인 제어 (같은 보드는 프로세스 내 공유)
+        self.admission = admission or get_board_admission(ip_address)
         # 상태 캐시 추가 (안정성을 위해)
         self.last_known_status = {f"스위치{i}": "OFF" for i in range(1, 7)}
+        # 상태 메타데이터 (시각/출처: polled, controlled, event)
+        self.state_meta = {key: {'state': "OFF", 'source': 'default', 'updated_at': None}
+                           for key in self.last_known_status}
+        self._state_lock = threading.Lock()
+        self._state_dirty = set()
+        self._state_flush_timer = None
+        self._persisted_at = {}
+        # 상태 전환 이력 (기록 대기 목록 / 최근 전환 메모리 링)
+        self._pending_transitions = []
+        self.state_history = deque(maxlen=STATE_HISTORY_RING_SIZE)
+        # 워밍업 중에는 스냅샷으로 즉시 응답
+        self._snapshot_loaded = False
+        self._warming_up = False
         # 최근 제어 기록 (검증용)
         self._recent_controls = {}
-        # 스케줄 데이터 초기화
-        self.init_schedule_db()
-        # 스위치 이름 데이터 초기화
-        self.init_switch_names_db()
+        # 이 보드에서 마지막으로 상태 조회에 성공한 URL 형식
+        self._status_url_pattern = SWITCH_STATUS_URL_PATTERNS[0]
+        # 같은 분 안에서 스케줄 중복 실행 방지
+        self._schedule_fired_minute = None
+        self._schedule_fired = set()
+        # DB 초기화와 백그라운드 서비스는 지연 실행 (init_databases/start)
+        self._db_lock = threading.Lock()
+        self._db_initialized = False
+        self._services_started = False
+        self._stop_event = threading.Event()
+        self._threads = []
+        # 멀티 워커 환경에서 프로세스 식별 및 리더 여부 (pid는 임대 시점에 확인)
+        self._instance_token = uuid.uuid4().hex[:8]
+        self._instance_pid = os.getpid()
+        self._leader_of = {}
+        # 자동 끄기/펄스 타이머 (리더 프로세스의 타이머 스레드 1개가 구동)
+        self._timer_wheel = TimerWheel()
+        self._timer_seq = 0
+        # 디지털/아날로그 입력 시계열 (보드 /events 스트림으로 수집)
+        self.timeseries = SensorTimeSeries()
+        self._input_loop = None
+        self._input_task = None
+        # 입력/릴레이 이벤트 기반 규칙 엔진 (입력 수집 리더 프로세스에서만 평가)
+        self.rules = RuleEngine(self)
+        # RS485 Modbus 슬레이브 장치 폴링 결과
+        self.modbus_values = {}
+        self.modbus_device_status = {}
+        self._modbus_clients = {}
+        self._modbus_loop = None
+        self._modbus_task = None
+        # MQTT 브리지 (KC868_MQTT_HOST 설정 시 생성)
+        self.mqtt = None
+
+    def init_databases(self):
+        """모든 데이터베이스 초기화 (최초 1회)"""
+        with self._db_lock:
+            if self._db_initialized:
+                return
+            # 상태 스냅샷 복원 (재시작 직후 올바른 상태 표시)
+            self.init_state_db()
+            self.load_state_snapshot()
+            # 스케줄 데이터 초기화
+            self.init_schedule_db()
+            # 스위치 이름 데이터 초기화
+            self.init_switch_names_db()
+            # 입력 시계열 데이터 초기화
+            try:
+                self.timeseries.init_db()
+            except Exception as e:
+                logger.error("💥 시계열 DB 초기화 오류: %s", e)
+            # 자동화 규칙 데이터 초기화
+            self.init_rules_db()
+            # Modbus 장치 데이터 초기화
+            self.init_modbus_db()
+            self._db_initialized = True
+
+    def start(self):
+        """백그라운드 서비스 시작 (스케줄러, 상태 동기화)"""
+        if self._services_started:
+            return
+        self.init_databases()
+        self._stop_event.clear()
         # 스케줄러 시작
         self.start_scheduler()
-        
+        # 자동 끄기/펄스 타이머 시작
+        self.start_timer_service()
+        # 규칙 엔진 시작 후 입력/센서 이벤트 수집 시작
+        self.rules.start()
+        self.reload_rules()
+        self.start_input_service()
+        # RS485 Modbus 장치 폴링 시작
+        self.start_modbus_service()
+        # MQTT 상태 발행/명령 구독 시작
+        if self.mqtt is not None:
+            self.mqtt.start()
+        # 백그라운드에서 실제 상태와 스냅샷 동기화
+        self.start_background_refresh()
+        self._services_started = True
+
+    def stop(self, timeout=5):
+        """백그라운드 서비스 중지 및 대기 중인 상태 저장"""
+        self._stop_event.set()
+        # 이벤트 스트림 대기 중인 입력 수집 작업 즉시 종료
+        if self._input_loop is not None and self._input_task is not None:
+            self._input_loop.call_soon_threadsafe(self._input_task.cancel)
+        if self._modbus_loop is not None and self._modbus_task is not None:
+            self._modbus_loop.call_soon_threadsafe(self._modbus_task.cancel)
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        self.rules.stop(timeout)
+        if self.mqtt is not None:
+            self.mqtt.stop(timeout)
+        self._services_started = False
+        for name in [name for name, leader in self._leader_of.items() if leader]:
+            self.release_leadership(name)
+
+        with self._state_lock:
+            if self._state_flush_timer is not None:
+                self._state_flush_timer.cancel()
+                self._state_flush_timer = None
+        if self._db_initialized:
+            self.flush_state_snapshot()
+            try:
+                self.timeseries.flush()
+            except Exception as e:
+                logger.error("💥 시계열 저장 오류: %s", e)
+        logger.info("🛑 백그라운드 서비스 중지됨")
+
     async def get_switch_status(self):
         """모든 스위치 상태 조회 (완전한 안정성 확보)"""
         try:
             status = {}
+            # 조회 실패 시 사용할 이전 상태를 다른 워커 기록과 맞춤
+            self.sync_shared_state()
             async with aiohttp.ClientSession() as session:
                 # 각 스위치별로 개별 상태 조회
                 for switch_num in range(1, 7):
@@ -91,23 +1682,15 @@ class KC868Controller:
                     success = False
                     for attempt in range(3):
                         try:
-                            # 정확한 ESPHome API 엔드포인트들 (실제 사용되는 형식들)
-                            possible_urls = [
-                                f"{self.base_url}/switch/switch_{switch_num}",
-                                f"{self.base_url}/switch/switch{switch_num}",
-                                f"{self.base_url}/switch/relay{switch_num}",
-                                f"{self.base_url}/switch/relay_{switch_num}",
-                                f"{self.base_url}/sensor/switch{switch_num}_status",
-                                f"{self.base_url}/binary_sensor/switch{switch_num}",
-                                f"{self.base_url}/text_sensor/switch{switch_num}_state",
-                                f"{self.base_url}/api/switch{switch_num}/state",
-                                f"{self.base_url}/switch/___{switch_num}"  # 기존 형식도 유지
-                            ]
+                            # 마지막으로 성공한 형식을 먼저 시도 (보통 요청 1번으로 끝남)
+                            patterns = sorted(SWITCH_STATUS_URL_PATTERNS, key=lambda p: p != self._status_url_pattern)
                             
-                            for url in possible_urls:
+                            for pattern in patterns:
+                                url = self.base_url + pattern.format(n=switch_num)
                                 try:
                                     # 충분한 타임아웃 설정 (네트워크 지연 고려)
-                                    async with session.get(url, timeout=aiohttp.ClientTimeout(total=4)) as response:
+                                    async with self.board_request(session, 'GET', url, 'status',
+                                                                  timeout=aiohttp.ClientTimeout(total=4)) as response:
                                         if response.status == 200:
                                             try:
                                                 # JSON 응답 처리
@@ -127,9 +1710,10 @@ class KC868Controller:
                                                     switch_state = "ON" if data > 0 else "OFF"
                                                 
                                                 if switch_state in ['ON', 'OFF']:
+                                                    self._status_url_pattern = pattern
                                                     status[switch_key] = switch_state
-                                                    self.last_known_status[switch_key] = switch_state
-                                                    logger.debug(f"✅ 스위치{switch_num} 상태: {switch_state} (from {url})")
+                                                    self._set_state(switch_key, switch_state, 'polled')
+                                                    board_logger.debug("✅ 스위치%s 상태: %s (from %s)", switch_num, switch_state, url)
                                                     success = True
                                                     break
                                                     
@@ -146,14 +1730,15 @@ class KC868Controller:
                                                     switch_state = "OFF"
                                                 
                                                 if switch_state:
+                                                    self._status_url_pattern = pattern
                                                     status[switch_key] = switch_state
-                                                    self.last_known_status[switch_key] = switch_state
-                                                    logger.debug(f"✅ 스위치{switch_num} 상태: {switch_state} (text from {url})")
+                                                    self._set_state(switch_key, switch_state, 'polled')
+                                                    board_logger.debug("✅ 스위치%s 상태: %s (text from %s)", switch_num, switch_state, url)
                                                     success = True
                                                     break
                                                     
                                 except Exception as url_error:
-                                    logger.debug(f"🔄 URL 시도 실패 {url}: {url_error}")
+                                    board_logger.debug("🔄 URL 시도 실패 %s: %s", url, url_error)
                                     continue
                             
                             if success:
@@ -164,7 +1749,7 @@ class KC868Controller:
                                 await asyncio.sleep(0.3)
                                 
                         except Exception as attempt_error:
-                            logger.debug(f"🔄 시도 {attempt + 1} 실패 - 스위치{switch_num}: {attempt_error}")
+                            board_logger.debug("🔄 시도 %s 실패 - 스위치%s: %s", attempt + 1, switch_num, attempt_error)
                             if attempt < 2:
                                 await asyncio.sleep(0.3)
                             continue
@@ -172,7 +1757,7 @@ class KC868Controller:
                     # 모든 시도 실패시 이전 상태 유지하되 경고
                     if not success:
                         status[switch_key] = self.last_known_status[switch_key]
-                        logger.warning(f"⚠️ 스위치{switch_num} 상태 조회 완전 실패 - 이전 상태 유지: {self.last_known_status[switch_key]}")
+                        board_logger.warning("⚠️ 스위치%s 상태 조회 완전 실패 - 이전 상태 유지: %s", switch_num, self.last_known_status[switch_key])
                 
                 # 추가 안정성 검증
                 await self.verify_critical_states(status)
@@ -180,7 +1765,7 @@ class KC868Controller:
                 return status
                 
         except Exception as e:
-            logger.error(f"💥 상태 조회 전체 오류: {e} - 이전 상태 반환")
+            board_logger.error("💥 상태 조회 전체 오류: %s - 이전 상태 반환", e)
             return self.last_known_status.copy()
     
     async def verify_critical_states(self, status):
@@ -198,20 +1783,20 @@ class KC868Controller:
                         actual_state = status.get(switch_key, self.last_known_status[switch_key])
                         
                         if actual_state != expected_state:
-                            logger.warning(f"🔧 상태 불일치 발견! 스위치{switch_num} 예상:{expected_state} vs 실제:{actual_state}")
+                            board_logger.warning("🔧 상태 불일치 발견! 스위치%s 예상:%s vs 실제:%s", switch_num, expected_state, actual_state)
                             
                             # 재검증 시도
                             verified_state = await self.double_check_switch(switch_num)
                             if verified_state:
                                 status[switch_key] = verified_state
-                                self.last_known_status[switch_key] = verified_state
-                                logger.info(f"🔄 스위치{switch_num} 상태 재검증 완료: {verified_state}")
+                                self._set_state(switch_key, verified_state, 'polled')
+                                board_logger.info("🔄 스위치%s 상태 재검증 완료: %s", switch_num, verified_state)
                     else:
                         # 오래된 기록 제거
                         del self._recent_controls[switch_num]
                         
         except Exception as e:
-            logger.debug(f"상태 검증 과정 오류: {e}")
+            board_logger.debug("상태 검증 과정 오류: %s", e)
     
     async def double_check_switch(self, switch_num):
         """특정 스위치 이중 확인 (문제 발생시 사용)"""
@@ -226,7 +1811,8 @@ class KC868Controller:
                 
                 for url in primary_urls:
                     try:
-                        async with session.get(url, timeout=aiohttp.ClientTimeout(total=2)) as response:
+                        async with self.board_request(session, 'GET', url, 'status',
+                                                      timeout=aiohttp.ClientTimeout(total=2)) as response:
                             if response.status == 200:
                                 data = await response.json()
                                 if 'state' in data:
@@ -280,6 +1866,7 @@ class KC868Controller:
                     endpoint_result = {
                         'url': url,
                         'status_code': None,
+                        'queue_wait_ms': None,
                         'response_time_ms': None,
                         'response_data': None,
                         'parsed_state': None,
@@ -287,10 +1874,14 @@ class KC868Controller:
                     }
                     
                     start_time = time.time()
+                    timing = {}
                     try:
-                        async with session.get(url, timeout=aiohttp.ClientTimeout(total=3)) as response:
+                        async with self.board_request(session, 'GET', url, 'debug', timing=timing,
+                                                      timeout=aiohttp.ClientTimeout(total=3)) as response:
+                            # 승인 대기와 보드 응답 시간을 따로 보고
                             endpoint_result['status_code'] = response.status
-                            endpoint_result['response_time_ms'] = round((time.time() - start_time) * 1000, 2)
+                            endpoint_result['queue_wait_ms'] = round((timing['admitted_at'] - start_time) * 1000, 2)
+                            endpoint_result['response_time_ms'] = round((time.time() - timing['admitted_at']) * 1000, 2)
                             
                             if response.status == 200:
                                 try:
@@ -335,7 +1926,12 @@ class KC868Controller:
                                 
                     except Exception as e:
                         endpoint_result['error'] = str(e)
-                        endpoint_result['response_time_ms'] = round((time.time() - start_time) * 1000, 2)
+                        # 승인 대기 중 시간 초과면 응답 시간 없음
+                        if 'admitted_at' in timing:
+                            endpoint_result['queue_wait_ms'] = round((timing['admitted_at'] - start_time) * 1000, 2)
+                            endpoint_result['response_time_ms'] = round((time.time() - timing['admitted_at']) * 1000, 2)
+                        else:
+                            endpoint_result['queue_wait_ms'] = round((time.time() - start_time) * 1000, 2)
                     
                     debug_info['endpoints_tested'].append(endpoint_result)
                 
@@ -350,6 +1946,132 @@ class KC868Controller:
             debug_info['final_status'] = debug_info['cache_state']
             return debug_info
     
+    def start_input_service(self):
+        """입력/센서 이벤트 스트림 수신 스레드 시작 (리더 프로세스만 보드에 연결)"""
+        def input_worker():
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            self._input_loop = loop
+            self._input_task = loop.create_task(self._input_stream_loop())
+            try:
+                loop.run_until_complete(self._input_task)
+            except asyncio.CancelledError:
+                pass
+            except Exception as e:
+                input_logger.error("💥 입력 수집 오류: %s", e)
+            finally:
+                self._input_loop = None
+                self._input_task = None
+                loop.close()
+        
+        thread = threading.Thread(target=input_worker, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+        input_logger.info("📥 입력 수집 서비스 시작됨")
+
+    async def _input_stream_loop(self):
+        """보드 이벤트 스트림 연결 유지 (끊기면 지수 백오프로 재연결)"""
+        backoff = 1
+        while not self._stop_event.is_set():
+            # ESP32 연결 수가 적으므로 워커 중 한 프로세스만 스트림 구독
+            if not await asyncio.to_thread(self.try_acquire_leadership, 'inputs', 60):
+                await asyncio.to_thread(self._stop_event.wait, 20)
+                continue
+            try:
+                await self._consume_event_stream()
+                backoff = 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                input_logger.warning("📥 이벤트 스트림 끊김: %s (%s초 후 재연결)", e, backoff)
+            await asyncio.to_thread(self._stop_event.wait, backoff)
+            backoff = min(backoff * 2, 60)
+
+    async def _consume_event_stream(self):
+        """ESPHome 웹서버 /events (SSE) 수신 및 처리"""
+        timeout = aiohttp.ClientTimeout(total=None, sock_connect=5, sock_read=30)
+        last_flush = last_lease = time.time()
+        last_prune = 0
+        
+        # 장시간 유지되는 스트림은 동시 요청 자리를 점유하지 않고 재연결 빈도만 제한
+        self.admission.release(await self.admission.acquire('status'))
+        async with aiohttp.ClientSession() as session:
+            async with session.get(f"{self.base_url}/events", timeout=timeout) as response:
+                if response.status != 200:
+                    raise RuntimeError(f"HTTP {response.status}")
+                input_logger.info("📥 보드 이벤트 스트림 연결됨")
+                
+                event_type, data_lines = None, []
+                async for raw_line in response.content:
+                    line = raw_line.decode('utf-8', errors='replace').rstrip('\r\n')
+                    if line.startswith('event:'):
+                        event_type = line[6:].strip()
+                        continue
+                    if line.startswith('data:'):
+                        data_lines.append(line[5:].lstrip())
+                        continue
+                    if line:
+                        continue
+                    
+                    # 빈 줄 = 이벤트 끝
+                    if event_type == 'state' and data_lines:
+                        try:
+                            self.handle_board_event(json.loads('\n'.join(data_lines)))
+                        except ValueError as e:
+                            input_logger.debug("📥 이벤트 파싱 실패: %s", e)
+                    event_type, data_lines = None, []
+                    
+                    # 주기 작업: 10초마다 DB 기록, 20초마다 임대 갱신, 1시간마다 오래된 버킷 삭제
+                    now = time.time()
+                    if now - last_flush >= 10:
+                        last_flush = now
+                        try:
+                            await asyncio.to_thread(self.timeseries.flush)
+                        except Exception as e:
+                            # 증분은 메모리에 남아 있으므로 다음 주기에 다시 기록
+                            input_logger.error("💥 시계열 저장 오류: %s", e)
+                        # 다른 워커에서 규칙이 바뀌었으면 다시 컴파일
+                        await asyncio.to_thread(self.reload_rules, True)
+                    if now - last_lease >= 20:
+                        last_lease = now
+                        if not await asyncio.to_thread(self.try_acquire_leadership, 'inputs', 60):
+                            return
+                    if now - last_prune >= 3600:
+                        last_prune = now
+                        await asyncio.to_thread(self.timeseries.prune)
+                    if self._stop_event.is_set():
+                        return
+
+    def handle_board_event(self, data):
+        """보드 상태 이벤트 1건 처리 (릴레이 상태 갱신 또는 입력 샘플 기록)"""
+        entity_id = data.get('id', '')
+        domain, _, object_id = entity_id.partition('-')
+        value = data.get('value')
+        
+        if domain == 'switch':
+            match = re.search(r'(\d+)$', object_id)
+            state = str(data.get('state', '')).upper()
+            switch_key = f"스위치{match.group(1)}" if match else None
+            if switch_key in self.last_known_status and state in ('ON', 'OFF'):
+                self._set_state(switch_key, state, 'event')
+        elif domain == 'binary_sensor':
+            self.timeseries.add_sample(entity_id, 1.0 if value else 0.0)
+            self.rules.process(entity_id, "ON" if value else "OFF")
+        elif domain == 'sensor':
+            if isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value):
+                self.timeseries.add_sample(entity_id, value)
+                self.rules.process(entity_id, float(value))
+
+    def get_input_values(self):
+        """입력/센서별 최신 값 (메모리 값 우선, 없으면 DB)"""
+        try:
+            values = self.timeseries.stored_latest()
+        except Exception as e:
+            input_logger.error("💥 입력 값 조회 오류: %s", e)
+            values = {}
+        values.update(self.timeseries.latest())
+        return values
+
     def log_action(self, switch_num, action, demo=False):
         """동작 로그 기록"""
         try:
@@ -360,181 +2082,1412 @@ class KC868Controller:
             c.execute('''CREATE TABLE IF NOT EXISTS logs
                         (timestamp TEXT, switch_num INTEGER, action TEXT, demo BOOLEAN)''')
             
-            # 로그 삽입
-            status = "데모" if demo else "실제"
-            c.execute("INSERT INTO logs VALUES (?, ?, ?, ?)",
-                     (datetime.now().strftime("%Y-%m-%d %H:%M:%S"), switch_num, action, demo))
+            # 로그 삽입
+            status = "데모" if demo else "실제"
+            c.execute("INSERT INTO logs VALUES (?, ?, ?, ?)",
+                     (datetime.now().strftime("%Y-%m-%d %H:%M:%S"), switch_num, action, demo))
+            
+            conn.commit()
+            conn.close()
+            
+            logger.info("📝 로그 기록: 스위치%s %s (%s)", switch_num, action, status)
+            
+        except Exception as e:
+            logger.error("💥 로그 오류: %s", e)
+
+    def init_state_db(self):
+        """상태 스냅샷 데이터베이스 초기화"""
+        try:
+            conn = sqlite3.connect('kc868_state.db')
+            c = conn.cursor()
+
+            # 여러 워커 프로세스가 동시에 읽고 쓸 수 있도록 WAL 모드 사용
+            c.execute("PRAGMA journal_mode=WAL")
+
+            # 스위치별 마지막 상태 (출처/시각 포함, 모든 워커가 공유)
+            c.execute('''CREATE TABLE IF NOT EXISTS switch_state
+                        (switch_key TEXT PRIMARY KEY,
+                         state TEXT NOT NULL,
+                         source TEXT,
+                         updated_at REAL)''')
+
+            # 리더 선출용 임대(lease) 테이블 (스케줄은 리더 프로세스만 실행)
+            c.execute('''CREATE TABLE IF NOT EXISTS leader_lease
+                        (name TEXT PRIMARY KEY,
+                         holder TEXT NOT NULL,
+                         expires_at REAL NOT NULL)''')
+
+            # 대기 중인 자동 동작 타이머 (재시작 후에도 유지)
+            c.execute('''CREATE TABLE IF NOT EXISTS pending_timers
+                        (seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                         timer_id TEXT UNIQUE NOT NULL,
+                         board TEXT NOT NULL,
+                         switch_num INTEGER NOT NULL,
+                         action TEXT NOT NULL,
+                         due_at REAL NOT NULL,
+                         created_at REAL,
+                         attempts INTEGER NOT NULL DEFAULT 0)''')
+            c.execute('''CREATE INDEX IF NOT EXISTS idx_pending_timers_switch
+                        ON pending_timers (board, switch_num)''')
+            # 이전 버전 테이블에는 재시도 횟수 컬럼 추가
+            c.execute("PRAGMA table_info(pending_timers)")
+            if 'attempts' not in [column[1] for column in c.fetchall()]:
+                c.execute("ALTER TABLE pending_timers ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+
+            # 릴레이 상태 전환 이력 (상태가 바뀔 때만 1행, 폴링마다 기록하지 않음)
+            c.execute('''CREATE TABLE IF NOT EXISTS state_transitions
+                        (id INTEGER PRIMARY KEY,
+                         switch_key TEXT NOT NULL,
+                         state TEXT NOT NULL,
+                         previous TEXT,
+                         source TEXT,
+                         at REAL NOT NULL)''')
+            # 특정 시각의 상태 조회를 색인 탐색 1회로 처리
+            c.execute('''CREATE INDEX IF NOT EXISTS idx_state_transitions_switch_at
+                        ON state_transitions (switch_key, at)''')
+
+            # 최근 전환을 메모리 링에 적재 (대시보드용)
+            c.execute("SELECT switch_key, state, previous, source, at FROM state_transitions ORDER BY id DESC LIMIT ?",
+                      (STATE_HISTORY_RING_SIZE,))
+            recent = c.fetchall()
+
+            conn.commit()
+            conn.close()
+
+            with self._state_lock:
+                self.state_history.clear()
+                for switch_key, state, previous, source, at in reversed(recent):
+                    self.state_history.append({'switch_key': switch_key, 'state': state, 'previous': previous,
+                                               'source': source, 'at': at})
+            state_logger.info("💾 상태 스냅샷 데이터베이스 초기화 완료")
+
+        except Exception as e:
+            state_logger.error("💥 상태 스냅샷 DB 초기화 오류: %s", e)
+
+    def load_state_snapshot(self):
+        """저장된 상태 스냅샷 복원 (재시작 직후 사용)"""
+        rows = self.sync_shared_state()
+        if rows:
+            self._snapshot_loaded = True
+            newest = max(r[3] or 0 for r in rows)
+            state_logger.info("💾 상태 스냅샷 복원: %s개 (%s초 전)", len(rows), int(time.time() - newest))
+        return len(rows)
+
+    def sync_shared_state(self):
+        """공유 상태 테이블에서 다른 워커가 기록한 최신 상태 반영"""
+        try:
+            conn = sqlite3.connect('kc868_state.db')
+            c = conn.cursor()
+            c.execute("SELECT switch_key, state, source, updated_at FROM switch_state")
+            rows = c.fetchall()
+            conn.close()
+
+            with self._state_lock:
+                for switch_key, state, source, updated_at in rows:
+                    if switch_key not in self.last_known_status:
+                        continue
+                    # 로컬 캐시보다 새로운 기록만 반영
+                    local_updated_at = self.state_meta[switch_key]['updated_at'] or 0
+                    if (updated_at or 0) <= local_updated_at:
+                        continue
+                    self.last_known_status[switch_key] = state
+                    self.state_meta[switch_key] = {'state': state, 'source': source, 'updated_at': updated_at}
+                    self._persisted_at[switch_key] = updated_at
+            return rows
+
+        except Exception as e:
+            state_logger.error("💥 공유 상태 동기화 오류: %s", e)
+            return []
+
+    def _set_state(self, switch_key, state, source):
+        """상태 캐시 갱신 및 스냅샷 저장 예약"""
+        now = time.time()
+        with self._state_lock:
+            changed = self.last_known_status.get(switch_key) != state
+            self.last_known_status[switch_key] = state
+            self.state_meta[switch_key] = {'state': state, 'source': source, 'updated_at': now}
+
+            # 상태 변경 시 또는 저장된 시각이 오래된 경우에만 디스크 기록
+            persisted_at = self._persisted_at.get(switch_key) or 0
+            if changed:
+                # 전환 이력은 스냅샷과 같은 트랜잭션으로 기록
+                self._pending_transitions.append((switch_key, state, source, now))
+            if changed or now - persisted_at >= 60:
+                self._state_dirty.add(switch_key)
+
+                # 여러 변경을 모아서 한 번에 기록
+                if self._state_flush_timer is None:
+                    self._state_flush_timer = threading.Timer(0.5, self.flush_state_snapshot)
+                    self._state_flush_timer.daemon = True
+                    self._state_flush_timer.start()
+
+        # 릴레이 상태도 규칙 트리거 (중복 평가 방지를 위해 입력 수집 리더에서만)
+        if self.is_leader('inputs'):
+            self.rules.process(switch_key, state)
+        # MQTT 구독자에게 푸시 (바뀐 값만 묶어서 발행)
+        if self.mqtt is not None:
+            self.mqtt.notify(switch_key, state)
+
+    def flush_state_snapshot(self):
+        """대기 중인 상태 변경을 디스크에 기록"""
+        with self._state_lock:
+            self._state_flush_timer = None
+            rows = [(key, self.state_meta[key]['state'], self.state_meta[key]['source'],
+                     self.state_meta[key]['updated_at']) for key in self._state_dirty]
+            self._state_dirty.clear()
+            transitions, self._pending_transitions = self._pending_transitions, []
+
+        if not rows and not transitions:
+            return
+
+        conn = None
+        try:
+            conn = sqlite3.connect('kc868_state.db', timeout=5)
+            c = conn.cursor()
+            # 여러 워커가 같은 전환을 관측해도 1번만 기록되도록 쓰기 잠금을 먼저 획득
+            c.execute("BEGIN IMMEDIATE")
+            recorded = []
+            for switch_key, state, source, at in transitions:
+                c.execute("""SELECT state FROM state_transitions WHERE switch_key = ?
+                             ORDER BY at DESC LIMIT 1""", (switch_key,))
+                last = c.fetchone()
+                previous = last[0] if last else None
+                # 재시작 직후 첫 관측처럼 실제로는 바뀌지 않은 경우 제외
+                if previous == state:
+                    continue
+                c.execute("""INSERT INTO state_transitions (switch_key, state, previous, source, at)
+                             VALUES (?, ?, ?, ?, ?)""", (switch_key, state, previous, source, at))
+                recorded.append({'switch_key': switch_key, 'state': state, 'previous': previous,
+                                 'source': source, 'at': at})
+            c.executemany("""
+                INSERT INTO switch_state (switch_key, state, source, updated_at)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(switch_key) DO UPDATE SET
+                    state = excluded.state, source = excluded.source, updated_at = excluded.updated_at
+                WHERE excluded.updated_at >= switch_state.updated_at
+            """, rows)
+            conn.commit()
+            conn.close()
+
+            with self._state_lock:
+                for key, _, _, updated_at in rows:
+                    self._persisted_at[key] = updated_at
+                self.state_history.extend(recorded)
+            state_logger.debug("💾 상태 스냅샷 저장: %s개 (전환 %s개)", len(rows), len(recorded))
+
+        except Exception as e:
+            state_logger.error("💥 상태 스냅샷 저장 오류: %s (5초 후 재시도)", e)
+            if conn is not None:
+                conn.close()
+            # 기록하지 못한 전환은 이후 전환보다 앞에 다시 넣어서 순서 유지
+            with self._state_lock:
+                self._pending_transitions[:0] = transitions
+                self._state_dirty.update(key for key, _, _, _ in rows)
+                if self._state_flush_timer is None and not self._stop_event.is_set():
+                    self._state_flush_timer = threading.Timer(5, self.flush_state_snapshot)
+                    self._state_flush_timer.daemon = True
+                    self._state_flush_timer.start()
+
+    def get_state_meta(self):
+        """스위치별 상태/출처/시각 사본 (잠금 보유 상태에서 복사)"""
+        with self._state_lock:
+            return {key: dict(meta) for key, meta in self.state_meta.items()}
+
+    def get_cached_status(self):
+        """캐시된 상태 즉시 반환 (다른 워커의 최신 상태 포함)"""
+        self.sync_shared_state()
+        with self._state_lock:
+            return self.last_known_status.copy()
+
+    def get_state_transitions(self, switch_key=None, start=None, end=None, limit=500):
+        """상태 전환 이력 구간 조회 (스위치별 색인 범위 탐색 후 시각순 병합)"""
+        keys = [switch_key] if switch_key else list(self.last_known_status)
+        start = start if start is not None else 0
+        end = end if end is not None else time.time()
+        try:
+            conn = sqlite3.connect('kc868_state.db')
+            c = conn.cursor()
+            transitions = []
+            for key in keys:
+                c.execute("""SELECT switch_key, state, previous, source, at FROM state_transitions
+                             WHERE switch_key = ? AND at >= ? AND at <= ?
+                             ORDER BY at DESC LIMIT ?""", (key, start, end, limit))
+                transitions.extend(c.fetchall())
+            conn.close()
+        except Exception as e:
+            state_logger.error("💥 상태 이력 조회 오류: %s", e)
+            return []
+
+        transitions.sort(key=lambda t: t[4], reverse=True)
+        return [{'switch_key': t[0], 'state': t[1], 'previous': t[2], 'source': t[3], 'at': t[4]}
+                for t in transitions[:limit]]
+
+    def get_state_at(self, at):
+        """지정 시각의 스위치별 상태 (at 이전 마지막 전환, 이력이 없으면 None)"""
+        try:
+            conn = sqlite3.connect('kc868_state.db')
+            c = conn.cursor()
+            states = {}
+            for key in self.last_known_status:
+                c.execute("""SELECT state, source, at FROM state_transitions
+                             WHERE switch_key = ? AND at <= ?
+                             ORDER BY at DESC LIMIT 1""", (key, at))
+                row = c.fetchone()
+                states[key] = {'state': row[0], 'source': row[1], 'since': row[2]} if row else None
+            conn.close()
+            return states
+        except Exception as e:
+            state_logger.error("💥 시점 상태 조회 오류: %s", e)
+            return {}
+
+    def get_recent_transitions(self, switch_key=None, limit=50):
+        """최근 전환 (최신순, 모든 워커가 기록한 공유 테이블 기준)"""
+        try:
+            conn = sqlite3.connect('kc868_state.db', timeout=5)
+            c = conn.cursor()
+            if switch_key:
+                c.execute("""SELECT switch_key, state, previous, source, at FROM state_transitions
+                             WHERE switch_key = ? ORDER BY at DESC, id DESC LIMIT ?""", (switch_key, limit))
+            else:
+                c.execute("""SELECT switch_key, state, previous, source, at FROM state_transitions
+                             ORDER BY id DESC LIMIT ?""", (limit,))
+            rows = c.fetchall()
+            conn.close()
+            return [{'switch_key': key, 'state': state, 'previous': previous, 'source': source, 'at': at}
+                    for key, state, previous, source, at in rows]
+        except Exception as e:
+            state_logger.error("💥 최근 전환 조회 오류: %s (메모리 링 사용)", e)
+        
+        with self._state_lock:
+            recent = list(self.state_history)
+        if switch_key:
+            recent = [t for t in recent if t['switch_key'] == switch_key]
+        return recent[::-1][:limit]
+
+    def is_warming_up(self):
+        """스냅샷 기반 응답 중인지 여부"""
+        return self._warming_up
+
+    def _check_fork(self):
+        """fork된 프로세스면 부모에게서 복사된 리더 여부를 버림 (gunicorn --preload 등)"""
+        pid = os.getpid()
+        if pid != self._instance_pid:
+            self._instance_pid = pid
+            self._leader_of = {}
+
+    @property
+    def instance_id(self):
+        """임대 소유자 ID (호스트:현재 pid:토큰 → fork된 워커끼리도 서로 다름)"""
+        self._check_fork()
+        return f"{socket.gethostname()}:{self._instance_pid}:{self._instance_token}"
+
+    def try_acquire_leadership(self, name='scheduler', ttl=90):
+        """리더 임대 획득/갱신 (여러 워커 중 한 프로세스만 성공)"""
+        now = time.time()
+        try:
+            conn = sqlite3.connect('kc868_state.db', timeout=5)
+            c = conn.cursor()
+
+            # 비어 있거나, 만료되었거나, 이미 내 것인 경우에만 갱신 (원자적 단일 구문)
+            c.execute("""
+                INSERT INTO leader_lease (name, holder, expires_at)
+                VALUES (?, ?, ?)
+                ON CONFLICT(name) DO UPDATE SET
+                    holder = excluded.holder, expires_at = excluded.expires_at
+                WHERE leader_lease.holder = excluded.holder OR leader_lease.expires_at < ?
+            """, (name, self.instance_id, now + ttl, now))
+            acquired = c.rowcount > 0
+
+            conn.commit()
+            conn.close()
+
+        except Exception as e:
+            state_logger.error("💥 리더 선출 오류: %s", e)
+            acquired = False
+
+        if acquired != self._leader_of.get(name, False):
+            if acquired:
+                state_logger.info("👑 %s 리더 획득: %s", name, self.instance_id)
+            else:
+                state_logger.info("👥 %s 리더 아님 (다른 워커가 실행 중)", name)
+        self._leader_of[name] = acquired
+        return acquired
+
+    def release_leadership(self, name='scheduler'):
+        """보유 중인 리더 임대 반납"""
+        try:
+            conn = sqlite3.connect('kc868_state.db', timeout=5)
+            conn.execute("DELETE FROM leader_lease WHERE name = ? AND holder = ?", (name, self.instance_id))
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            state_logger.error("💥 리더 반납 오류: %s", e)
+        self._leader_of[name] = False
+
+    def is_leader(self, name='scheduler'):
+        """마지막 확인 기준 리더 여부"""
+        self._check_fork()
+        return self._leader_of.get(name, False)
+
+    def schedule_auto_action(self, switch_num, action, delay):
+        """지정 시간 후 자동 실행할 동작 등록 (같은 스위치의 기존 타이머는 대체)"""
+        delay = float(delay)
+        if delay <= 0:
+            raise ValueError("duration은 0보다 커야 합니다")
+        
+        timer_id = uuid.uuid4().hex
+        now = time.time()
+        due_at = now + delay
+        
+        try:
+            conn = sqlite3.connect('kc868_state.db', timeout=5)
+            c = conn.cursor()
+            c.execute("DELETE FROM pending_timers WHERE board = ? AND switch_num = ?", (self.ip_address, switch_num))
+            c.execute("""
+                INSERT INTO pending_timers (timer_id, board, switch_num, action, due_at, created_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (timer_id, self.ip_address, switch_num, action, due_at, now))
+            conn.commit()
+            conn.close()
+            
+        except Exception as e:
+            schedule_logger.error("💥 자동 동작 예약 오류: %s", e)
+            return None
+        
+        # 타이머 리더면 바로 휠에 등록 (아니면 리더가 DB에서 가져감)
+        if self.is_leader('timers'):
+            self._timer_wheel.add(timer_id, due_at, (switch_num, action))
+        
+        schedule_logger.info("⏱️ 자동 동작 예약: 스위치%s %g초 후 %s", switch_num, delay, action)
+        return {'timer_id': timer_id, 'switch_num': switch_num, 'action': action, 'due_at': due_at}
+
+    def cancel_timer(self, timer_id):
+        """대기 중인 자동 동작 취소"""
+        try:
+            conn = sqlite3.connect('kc868_state.db', timeout=5)
+            c = conn.cursor()
+            c.execute("DELETE FROM pending_timers WHERE timer_id = ?", (timer_id,))
+            cancelled = c.rowcount > 0
+            conn.commit()
+            conn.close()
+            
+            self._timer_wheel.cancel(timer_id)
+            if cancelled:
+                schedule_logger.info("⏱️ 자동 동작 취소: %s", timer_id)
+            return cancelled
+            
+        except Exception as e:
+            schedule_logger.error("💥 타이머 취소 오류: %s", e)
+            return False
+
+    def cancel_switch_timers(self, switch_num):
+        """스위치의 대기 중인 자동 동작 모두 취소 (휠 항목은 만료 시 무시됨)"""
+        try:
+            conn = sqlite3.connect('kc868_state.db', timeout=5)
+            c = conn.cursor()
+            c.execute("DELETE FROM pending_timers WHERE board = ? AND switch_num = ?", (self.ip_address, switch_num))
+            cancelled = c.rowcount
+            conn.commit()
+            conn.close()
+            
+            if cancelled:
+                schedule_logger.info("⏱️ 스위치%s 자동 동작 %s개 취소", switch_num, cancelled)
+            return cancelled
+            
+        except Exception as e:
+            schedule_logger.error("💥 타이머 취소 오류: %s", e)
+            return 0
+
+    def get_timers(self, switch_num=None):
+        """대기 중인 자동 동작 조회"""
+        try:
+            conn = sqlite3.connect('kc868_state.db', timeout=5)
+            c = conn.cursor()
+            
+            if switch_num:
+                c.execute("""SELECT timer_id, switch_num, action, due_at, created_at, attempts FROM pending_timers
+                             WHERE board = ? AND switch_num = ? ORDER BY due_at""", (self.ip_address, switch_num))
+            else:
+                c.execute("""SELECT timer_id, switch_num, action, due_at, created_at, attempts FROM pending_timers
+                             WHERE board = ? ORDER BY due_at""", (self.ip_address,))
+                
+            timers = c.fetchall()
+            conn.close()
+            
+            now = time.time()
+            return [{
+                'timer_id': t[0], 'switch_num': t[1], 'action': t[2], 'due_at': t[3],
+                'created_at': t[4], 'attempts': t[5], 'remaining_seconds': round(max(t[3] - now, 0), 1)
+            } for t in timers]
+            
+        except Exception as e:
+            schedule_logger.error("💥 타이머 조회 오류: %s", e)
+            return []
+
+    def load_pending_timers(self, full=False):
+        """DB의 대기 타이머를 휠에 등록 (full=False면 마지막 이후 추가분만)"""
+        if full:
+            self._timer_wheel.clear()
+            self._timer_seq = 0
+        
+        conn = sqlite3.connect('kc868_state.db', timeout=5)
+        c = conn.cursor()
+        c.execute("""SELECT seq, timer_id, switch_num, action, due_at FROM pending_timers
+                     WHERE board = ? AND seq > ? ORDER BY seq""", (self.ip_address, self._timer_seq))
+        rows = c.fetchall()
+        conn.close()
+        
+        for seq, timer_id, switch_num, action, due_at in rows:
+            self._timer_wheel.add(timer_id, due_at, (switch_num, action))
+            self._timer_seq = seq
+        if full and rows:
+            schedule_logger.info("⏱️ 대기 타이머 복원: %s개", len(rows))
+        return len(rows)
+
+    def fire_timers(self, expired):
+        """만료된 타이머 실행 (DB 행을 선점한 타이머만 실행, 성공해야 행 삭제)
+
+        선점은 due_at을 재시도 시각으로 미루는 조건부 UPDATE로 처리한다. 실행이
+        실패하면 행이 재시도 시각으로 남아 있으므로 휠에 다시 등록하고, 이 프로세스가
+        종료되더라도 다음 타이머 리더가 DB에서 다시 가져가 실행한다.
+        """
+        now = time.time()
+        claimed = []
+        try:
+            conn = sqlite3.connect('kc868_state.db', timeout=5)
+            c = conn.cursor()
+            for timer_id, (switch_num, action) in expired:
+                c.execute("SELECT attempts FROM pending_timers WHERE timer_id = ?", (timer_id,))
+                row = c.fetchone()
+                if row is None:
+                    continue
+                retry_at = now + min(5 * 2 ** row[0], 300)
+                # 취소/대체되었거나 다른 워커가 이미 선점한 타이머는 제외
+                c.execute("""UPDATE pending_timers SET due_at = ?, attempts = attempts + 1
+                             WHERE timer_id = ? AND due_at <= ?""",
+                          (retry_at, timer_id, now + self._timer_wheel.tick))
+                if c.rowcount:
+                    claimed.append((timer_id, switch_num, action, retry_at, row[0]))
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            schedule_logger.error("💥 타이머 선점 오류: %s (1초 후 재시도)", e)
+            for timer_id, payload in expired:
+                self._timer_wheel.add(timer_id, now + 1, payload)
+            return 0
+        
+        if not claimed:
+            return 0
+        
+        async def run_all():
+            return await asyncio.gather(*(self.control_switch(switch_num, action, priority='schedule')
+                                          for _, switch_num, action, _, _ in claimed),
+                                        return_exceptions=True)
+        
+        for _, switch_num, action, _, attempts in claimed:
+            schedule_logger.info("⏱️ 자동 동작 실행: 스위치%s %s%s", switch_num, action,
+                                 f" (재시도 {attempts}회)" if attempts else "")
+        results = asyncio.run(run_all())
+        
+        done = []
+        for (timer_id, switch_num, action, retry_at, attempts), result in zip(claimed, results):
+            if result is True:
+                done.append((timer_id, retry_at, (switch_num, action)))
+            else:
+                # 실패한 자동 동작은 행을 남겨두고 재시도 (릴레이가 켜진 채로 남지 않도록)
+                schedule_logger.warning("⏱️ 자동 동작 실패: 스위치%s %s → %d초 후 재시도",
+                                        switch_num, action, retry_at - time.time())
+                self._timer_wheel.add(timer_id, retry_at, (switch_num, action))
+        
+        if done:
+            try:
+                conn = sqlite3.connect('kc868_state.db', timeout=5)
+                conn.executemany("DELETE FROM pending_timers WHERE timer_id = ?", [(t[0],) for t in done])
+                conn.commit()
+                conn.close()
+            except Exception as e:
+                # 행이 남아 있으므로 재시도 시각에 같은 동작을 한 번 더 보냄 (ON/OFF는 멱등)
+                schedule_logger.error("💥 완료 타이머 삭제 오류: %s", e)
+                for timer_id, retry_at, payload in done:
+                    self._timer_wheel.add(timer_id, retry_at, payload)
+        return len(done)
+
+    def start_timer_service(self):
+        """타이머 휠 구동 스레드 시작 (리더 프로세스만 타이머 실행)"""
+        def timer_worker():
+            lease_checked_at = 0
+            while not self._stop_event.is_set():
+                try:
+                    now = time.time()
+                    # 임대 갱신은 10초마다 (30초 임대)
+                    if now - lease_checked_at >= 10:
+                        lease_checked_at = now
+                        was_leader = self.is_leader('timers')
+                        if self.try_acquire_leadership('timers', ttl=30):
+                            if not was_leader:
+                                self.load_pending_timers(full=True)
+                        elif was_leader:
+                            self._timer_wheel.clear()
+                    
+                    if self.is_leader('timers'):
+                        # 다른 워커가 등록한 타이머 가져오기 (seq 인덱스)
+                        self.load_pending_timers()
+                        expired = self._timer_wheel.advance(now)
+                        if expired:
+                            self.fire_timers(expired)
+                    
+                    self._stop_event.wait(self._timer_wheel.tick)
+                except Exception as e:
+                    schedule_logger.error("💥 타이머 오류: %s", e)
+                    self._stop_event.wait(1)
+        
+        thread = threading.Thread(target=timer_worker, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+        schedule_logger.info("⏱️ 타이머 서비스 시작됨")
+
+    def start_background_refresh(self):
+        """백그라운드에서 실제 상태를 조회하여 스냅샷 보정"""
+        def refresh_worker():
+            try:
+                asyncio.run(self.get_switch_status())
+                board_logger.info("🔄 백그라운드 상태 동기화 완료")
+            except Exception as e:
+                board_logger.error("💥 백그라운드 상태 동기화 오류: %s", e)
+            finally:
+                self._warming_up = False
+
+        # 실제 상태 확인 전까지 스냅샷으로 응답
+        self._warming_up = self._snapshot_loaded
+        thread = threading.Thread(target=refresh_worker, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def init_schedule_db(self):
+        """스케줄 데이터베이스 초기화 (요일 비트마스크 모델)"""
+        try:
+            conn = sqlite3.connect('kc868_schedule.db')
+            c = conn.cursor()
+            
+            # 스케줄 항목 테이블: 요일 비트마스크(bit0=월 ~ bit6=일) + 여러 시간대
+            c.execute('''CREATE TABLE IF NOT EXISTS schedule_entries
+                        (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                         switch_num INTEGER NOT NULL,
+                         days_mask INTEGER NOT NULL,
+                         windows TEXT NOT NULL,
+                         enabled BOOLEAN,
+                         name TEXT,
+                         created_at TEXT,
+                         updated_at TEXT)''')
+            c.execute('''CREATE INDEX IF NOT EXISTS idx_schedule_entries_switch
+                        ON schedule_entries (switch_num)''')
+            # 실행 기록: (항목, 동작, 분)당 1행 → 리더가 바뀌어도 같은 분에 다시 실행하지 않음
+            c.execute('''CREATE TABLE IF NOT EXISTS schedule_fired
+                        (entry_id INTEGER NOT NULL,
+                         action TEXT NOT NULL,
+                         minute TEXT NOT NULL,
+                         fired_at REAL NOT NULL,
+                         PRIMARY KEY (entry_id, action, minute))''')
+            
+            # 기존 요일별 행(schedules)을 비트마스크 항목으로 이전 (최초 1회)
+            c.execute("PRAGMA user_version")
+            if c.fetchone()[0] < 1:
+                self._migrate_legacy_schedules(c)
+                c.execute("PRAGMA user_version = 1")
+            
+            conn.commit()
+            conn.close()
+            schedule_logger.info("📅 스케줄 데이터베이스 초기화 완료")
+            
+        except Exception as e:
+            schedule_logger.error("💥 스케줄 DB 초기화 오류: %s", e)
+
+    def _migrate_legacy_schedules(self, c):
+        """요일별 schedules 행을 (스위치, 시간, 이름) 단위 항목으로 묶어서 이전"""
+        c.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'schedules'")
+        if not c.fetchone():
+            return
+        
+        c.execute("SELECT switch_num, day_of_week, time_on, time_off, enabled, name, created_at FROM schedules")
+        grouped = {}
+        for switch_num, day_of_week, time_on, time_off, enabled, name, created_at in c.fetchall():
+            key = (switch_num, time_on, time_off, bool(enabled), name)
+            mask, first_created = grouped.get(key, (0, created_at))
+            grouped[key] = (mask | day_bit(day_of_week), first_created)
+        
+        now = datetime.now().isoformat()
+        c.executemany("""
+            INSERT INTO schedule_entries (switch_num, days_mask, windows, enabled, name, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, [(switch_num, mask, json.dumps([{'on': time_on, 'off': time_off}]), enabled, name, created_at, now)
+              for (switch_num, time_on, time_off, enabled, name), (mask, created_at) in grouped.items()])
+        
+        # 롤백 대비 원본은 이름만 바꿔서 보존
+        c.execute("ALTER TABLE schedules RENAME TO schedules_legacy")
+        schedule_logger.info("📅 스케줄 이전 완료: %s개 항목", len(grouped))
+            
+    def start_scheduler(self):
+        """백그라운드 스케줄러 시작"""
+        def scheduler_worker():
+            while not self._stop_event.is_set():
+                try:
+                    # 리더 프로세스만 스케줄 실행 (워커별 중복 실행 방지)
+                    if self.try_acquire_leadership():
+                        self.check_schedules()
+                    self._stop_event.wait(30)  # 30초마다 체크 (임대 90초 전에 갱신)
+                except Exception as e:
+                    schedule_logger.error("💥 스케줄러 오류: %s", e)
+                    self._stop_event.wait(60)  # 오류 시 1분 대기
+                    
+        thread = threading.Thread(target=scheduler_worker, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+        schedule_logger.info("⏰ 스케줄러 시작됨")
+        
+    def check_schedules(self):
+        """스케줄 체크 및 실행"""
+        try:
+            now = datetime.now()
+            current_time = now.strftime("%H:%M")
+            current_day = now.weekday()  # 0=월요일, 6=일요일
+            
+            minute = now.strftime("%Y-%m-%d %H:%M")
+            
+            # 30초 주기라 같은 분에 두 번 체크될 수 있으므로 실행 기록으로 중복 방지
+            if self._schedule_fired_minute != (current_day, current_time):
+                self._schedule_fired_minute = (current_day, current_time)
+                self._schedule_fired.clear()
+                self._prune_schedule_fired()
+            
+            conn = sqlite3.connect('kc868_schedule.db')
+            c = conn.cursor()
+            
+            # 오늘 요일 비트가 켜진 항목만 조회
+            c.execute("""
+                SELECT id, switch_num, windows, name 
+                FROM schedule_entries 
+                WHERE enabled = 1 AND (days_mask & ?) != 0
+            """, (day_bit(current_day),))
+            
+            schedules = c.fetchall()
+            conn.close()
+            
+            for entry_id, switch_num, windows, name in schedules:
+                for window in json.loads(windows):
+                    for action, at in (("ON", window.get('on')), ("OFF", window.get('off'))):
+                        if not at or current_time != at or (entry_id, action) in self._schedule_fired:
+                            continue
+                        self._schedule_fired.add((entry_id, action))
+                        # 실행이 길어져도 임대가 만료되지 않도록 동작마다 갱신 (빼앗겼으면 중단)
+                        if not self.try_acquire_leadership():
+                            schedule_logger.warning("⏰ 스케줄러 리더 상실, 남은 스케줄은 새 리더가 실행")
+                            return
+                        if not self._claim_schedule_fire(entry_id, action, minute):
+                            schedule_logger.debug("⏰ 이미 실행된 스케줄: %s %s %s", entry_id, action, minute)
+                            continue
+                        schedule_logger.info("⏰ 스케줄 실행: 스위치%s %s (%s)", switch_num, action, name)
+                        asyncio.run(self.control_switch(switch_num, action, priority='schedule'))
+                    
+        except Exception as e:
+            schedule_logger.error("💥 스케줄 체크 오류: %s", e)
+
+    def _claim_schedule_fire(self, entry_id, action, minute):
+        """(항목, 동작, 분) 실행 기록 선점 (이미 다른 워커가 실행했으면 False)"""
+        try:
+            conn = sqlite3.connect('kc868_schedule.db', timeout=5)
+            c = conn.cursor()
+            c.execute("INSERT OR IGNORE INTO schedule_fired (entry_id, action, minute, fired_at) VALUES (?, ?, ?, ?)",
+                      (entry_id, action, minute, time.time()))
+            claimed = c.rowcount > 0
+            conn.commit()
+            conn.close()
+            return claimed
+        except Exception as e:
+            # 기록하지 못해도 스케줄은 실행 (프로세스 내 기록으로 중복 방지)
+            schedule_logger.error("💥 스케줄 실행 기록 오류: %s", e)
+            return True
+
+    def _prune_schedule_fired(self):
+        """하루 지난 실행 기록 삭제"""
+        try:
+            conn = sqlite3.connect('kc868_schedule.db', timeout=5)
+            conn.execute("DELETE FROM schedule_fired WHERE fired_at < ?", (time.time() - 86400,))
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            schedule_logger.error("💥 스케줄 실행 기록 정리 오류: %s", e)
+
+    def get_schedule_entries(self, switch_num=None):
+        """스케줄 항목 조회 (요일 비트마스크 + 시간대 목록)"""
+        try:
+            conn = sqlite3.connect('kc868_schedule.db')
+            c = conn.cursor()
+            
+            if switch_num:
+                c.execute("SELECT * FROM schedule_entries WHERE switch_num = ? ORDER BY id", (switch_num,))
+            else:
+                c.execute("SELECT * FROM schedule_entries ORDER BY switch_num, id")
+                
+            entries = c.fetchall()
+            conn.close()
+            
+            return [{
+                'id': e[0], 'switch_num': e[1], 'days_mask': e[2], 'days': mask_days(e[2]),
+                'windows': json.loads(e[3]), 'enabled': e[4], 'name': e[5],
+                'created_at': e[6], 'updated_at': e[7]
+            } for e in entries]
+            
+        except Exception as e:
+            schedule_logger.error("💥 스케줄 항목 조회 오류: %s", e)
+            return []
+            
+    def get_schedules(self, switch_num=None):
+        """스케줄 조회 (기존 요일별 행 형식으로 펼쳐서 반환)"""
+        schedules = []
+        for entry in self.get_schedule_entries(switch_num):
+            for window in entry['windows']:
+                for day in entry['days']:
+                    schedules.append({
+                        'id': entry['id'], 'switch_num': entry['switch_num'], 'day_of_week': day,
+                        'time_on': window.get('on'), 'time_off': window.get('off'),
+                        'enabled': entry['enabled'], 'name': entry['name'],
+                        'created_at': entry['created_at']
+                    })
+        schedules.sort(key=lambda s: (s['switch_num'], s['day_of_week'], s['time_on'] or ''))
+        return schedules
+
+    def _find_schedule_entry(self, c, switch_num, name, windows):
+        """같은 스위치/이름/시간대의 항목 찾기 (switch_num 인덱스 사용)"""
+        c.execute("SELECT id, days_mask, windows FROM schedule_entries WHERE switch_num = ? AND name IS ?",
+                  (switch_num, name))
+        for entry_id, days_mask, entry_windows in c.fetchall():
+            if json.loads(entry_windows) == windows:
+                return entry_id, days_mask
+        return None
+
+    def _upsert_schedule_entry(self, c, entry, now):
+        """스케줄 항목 1개 추가/갱신 (트랜잭션은 호출자가 관리)"""
+        switch_num = int(entry['switch_num'])
+        if not 1 <= switch_num <= 6:
+            raise ValueError(f"잘못된 스위치 번호: {switch_num}")
+        windows = normalize_windows(entry)
+        if 'days_mask' in entry:
+            days_mask = int(entry['days_mask']) & ALL_DAYS_MASK
+        else:
+            days_mask = days_to_mask(entry.get('days', []))
+        if not days_mask:
+            raise ValueError("요일이 지정되지 않았습니다")
+        enabled = entry.get('enabled', True)
+        name = entry.get('name')
+        
+        entry_id = entry.get('id')
+        if entry_id is None:
+            found = self._find_schedule_entry(c, switch_num, name, windows)
+            if found:
+                entry_id = found[0]
+                # 요일별 추가(기존 API)는 요일 비트를 합침
+                if entry.get('merge_days'):
+                    days_mask |= found[1]
+        
+        if entry_id is not None:
+            c.execute("""
+                UPDATE schedule_entries
+                SET switch_num = ?, days_mask = ?, windows = ?, enabled = ?, name = ?, updated_at = ?
+                WHERE id = ?
+            """, (switch_num, days_mask, json.dumps(windows), enabled, name, now, entry_id))
+            if c.rowcount:
+                return entry_id
+        
+        c.execute("""
+            INSERT INTO schedule_entries (switch_num, days_mask, windows, enabled, name, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (switch_num, days_mask, json.dumps(windows), enabled, name, now, now))
+        return c.lastrowid
+
+    def upsert_schedule_entries(self, entries, replace=False):
+        """여러 스케줄 항목을 한 트랜잭션으로 추가/갱신 (replace=True면 전체 교체)"""
+        conn = sqlite3.connect('kc868_schedule.db')
+        try:
+            c = conn.cursor()
+            now = datetime.now().isoformat()
+            
+            if replace:
+                c.execute("DELETE FROM schedule_entries")
+            ids = [self._upsert_schedule_entry(c, entry, now) for entry in entries]
+            
+            conn.commit()
+            schedule_logger.info("📅 스케줄 일괄 저장: %s개 항목%s", len(ids), ' (전체 교체)' if replace else '')
+            return ids
+            
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+            
+    def save_schedule(self, switch_num, day_of_week, time_on, time_off, name, enabled=True, days=None):
+        """스케줄 저장 (같은 스위치/시간/이름 항목이 있으면 요일만 추가)"""
+        try:
+            self.upsert_schedule_entries([{
+                'switch_num': switch_num,
+                'days': days if days is not None else [day_of_week],
+                'windows': [{'on': time_on, 'off': time_off}],
+                'name': name,
+                'enabled': enabled,
+                'merge_days': True
+            }])
+            
+            schedule_logger.info("📅 스케줄 저장: 스위치%s %s", switch_num, name)
+            return True
+            
+        except ValueError:
+            # 잘못된 입력은 호출자(API)가 400으로 응답
+            raise
+        except Exception as e:
+            schedule_logger.error("💥 스케줄 저장 오류: %s", e)
+            return False
+            
+    def delete_schedule(self, schedule_id, day_of_week=None):
+        """스케줄 삭제 (ID는 항목 단위라 기본은 모든 요일 삭제, day_of_week 지정 시 해당 요일만 제거)"""
+        try:
+            conn = sqlite3.connect('kc868_schedule.db')
+            c = conn.cursor()
+            
+            if day_of_week is None:
+                c.execute("DELETE FROM schedule_entries WHERE id = ?", (schedule_id,))
+            else:
+                c.execute("UPDATE schedule_entries SET days_mask = days_mask & ?, updated_at = ? WHERE id = ?",
+                          (ALL_DAYS_MASK & ~day_bit(day_of_week), datetime.now().isoformat(), schedule_id))
+                c.execute("DELETE FROM schedule_entries WHERE id = ? AND days_mask = 0", (schedule_id,))
             
             conn.commit()
             conn.close()
             
-            logger.info(f"📝 로그 기록: 스위치{switch_num} {action} ({status})")
+            schedule_logger.info("🗑️ 스케줄 삭제: ID %s%s", schedule_id,
+                                 f" ({day_of_week}요일)" if day_of_week is not None else " (전체 요일)")
+            return True
             
         except Exception as e:
-            logger.error(f"💥 로그 오류: {e}")
-            
-    def init_schedule_db(self):
-        """스케줄 데이터베이스 초기화"""
+            schedule_logger.error("💥 스케줄 삭제 오류: %s", e)
+            return False
+    
+    def delete_schedule_by_condition(self, switch_num, day_of_week, time_on=None, time_off=None):
+        """조건별 스케줄 삭제 (해당 요일 비트만 제거)"""
         try:
             conn = sqlite3.connect('kc868_schedule.db')
             c = conn.cursor()
             
-            # 스케줄 테이블 생성
-            c.execute('''CREATE TABLE IF NOT EXISTS schedules
-                        (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                         switch_num INTEGER,
-                         day_of_week INTEGER,
-                         time_on TEXT,
-                         time_off TEXT,
-                         enabled BOOLEAN,
-                         name TEXT,
-                         created_at TEXT)''')
+            target = {'on': time_on, 'off': time_off}
+            bit = day_bit(day_of_week)
+            now = datetime.now().isoformat()
+            deleted_count = 0
+            
+            c.execute("SELECT id, days_mask, windows, enabled, name, created_at FROM schedule_entries WHERE switch_num = ?",
+                      (switch_num,))
+            for entry_id, days_mask, windows, enabled, name, created_at in c.fetchall():
+                windows = json.loads(windows)
+                if not days_mask & bit or target not in windows:
+                    continue
+                deleted_count += 1
+                
+                # 중복 저장된 같은 시간대만 남은 경우도 항목 단위로 처리
+                if all(w == target for w in windows):
+                    if days_mask & ~bit:
+                        c.execute("UPDATE schedule_entries SET days_mask = ?, updated_at = ? WHERE id = ?",
+                                  (days_mask & ~bit, now, entry_id))
+                    else:
+                        c.execute("DELETE FROM schedule_entries WHERE id = ?", (entry_id,))
+                    continue
+                
+                # 여러 시간대 항목: 해당 시간대만 분리한 뒤 요일 비트 제거
+                rest = [w for w in windows if w != target]
+                c.execute("UPDATE schedule_entries SET windows = ?, updated_at = ? WHERE id = ?",
+                          (json.dumps(rest), now, entry_id))
+                if days_mask & ~bit:
+                    c.execute("""
+                        INSERT INTO schedule_entries (switch_num, days_mask, windows, enabled, name, created_at, updated_at)
+                        VALUES (?, ?, ?, ?, ?, ?, ?)
+                    """, (switch_num, days_mask & ~bit, json.dumps([target]), enabled, name, created_at, now))
             
             conn.commit()
             conn.close()
-            logger.info("📅 스케줄 데이터베이스 초기화 완료")
+            
+            schedule_logger.info("🗑️ 조건별 스케줄 삭제: 스위치%s %s요일 (%s개)", switch_num, day_of_week, deleted_count)
+            return deleted_count > 0
             
         except Exception as e:
-            logger.error(f"💥 스케줄 DB 초기화 오류: {e}")
+            schedule_logger.error("💥 조건별 스케줄 삭제 오류: %s", e)
+            return False
             
-    def start_scheduler(self):
-        """백그라운드 스케줄러 시작"""
-        def scheduler_worker():
-            while True:
-                try:
-                    self.check_schedules()
-                    time.sleep(30)  # 30초마다 체크
-                except Exception as e:
-                    logger.error(f"💥 스케줄러 오류: {e}")
-                    time.sleep(60)  # 오류 시 1분 대기
-                    
-        thread = threading.Thread(target=scheduler_worker, daemon=True)
-        thread.start()
-        logger.info("⏰ 스케줄러 시작됨")
-        
-    def check_schedules(self):
-        """스케줄 체크 및 실행"""
+    def init_rules_db(self):
+        """자동화 규칙 데이터베이스 초기화"""
         try:
-            now = datetime.now()
-            current_time = now.strftime("%H:%M")
-            current_day = now.weekday()  # 0=월요일, 6=일요일
-            
-            conn = sqlite3.connect('kc868_schedule.db')
+            conn = sqlite3.connect('kc868_rules.db')
             c = conn.cursor()
             
-            # 현재 시간과 요일에 맞는 스케줄 조회
-            c.execute("""
-                SELECT switch_num, time_on, time_off, name 
-                FROM schedules 
-                WHERE enabled = 1 AND day_of_week = ?
-            """, (current_day,))
+            # 규칙 테이블 (트리거 소스 → 릴레이 동작)
+            c.execute('''CREATE TABLE IF NOT EXISTS rules
+                        (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                         name TEXT,
+                         board TEXT,
+                         trigger_source TEXT NOT NULL,
+                         trigger_op TEXT NOT NULL,
+                         trigger_value TEXT,
+                         action_switch INTEGER NOT NULL,
+                         action TEXT NOT NULL,
+                         duration REAL,
+                         cooldown REAL,
+                         enabled BOOLEAN,
+                         created_at TEXT,
+                         updated_at TEXT)''')
+            c.execute('''CREATE INDEX IF NOT EXISTS idx_rules_trigger
+                        ON rules (board, trigger_source)''')
             
-            schedules = c.fetchall()
+            # 규칙 변경 번호 (다른 워커의 변경 감지용)
+            c.execute('''CREATE TABLE IF NOT EXISTS rules_meta
+                        (id INTEGER PRIMARY KEY CHECK (id = 1),
+                         revision INTEGER NOT NULL)''')
+            c.execute("INSERT OR IGNORE INTO rules_meta (id, revision) VALUES (1, 0)")
+            
+            conn.commit()
             conn.close()
+            rule_logger.info("🧩 규칙 데이터베이스 초기화 완료")
             
-            for schedule in schedules:
-                switch_num, time_on, time_off, name = schedule
-                
-                # ON 시간 체크
-                if time_on and current_time == time_on:
-                    logger.info(f"⏰ 스케줄 실행: 스위치{switch_num} ON ({name})")
-                    asyncio.run(self.control_switch(switch_num, "ON"))
-                
-                # OFF 시간 체크
-                if time_off and current_time == time_off:
-                    logger.info(f"⏰ 스케줄 실행: 스위치{switch_num} OFF ({name})")
-                    asyncio.run(self.control_switch(switch_num, "OFF"))
-                    
         except Exception as e:
-            logger.error(f"💥 스케줄 체크 오류: {e}")
-            
-    def get_schedules(self, switch_num=None):
-        """스케줄 조회"""
+            rule_logger.error("💥 규칙 DB 초기화 오류: %s", e)
+
+    def get_rules(self):
+        """이 보드에 적용되는 규칙 조회 (board가 비어 있으면 모든 보드)"""
         try:
-            conn = sqlite3.connect('kc868_schedule.db')
+            conn = sqlite3.connect('kc868_rules.db')
             c = conn.cursor()
-            
-            if switch_num:
-                c.execute("SELECT * FROM schedules WHERE switch_num = ? ORDER BY day_of_week, time_on", (switch_num,))
-            else:
-                c.execute("SELECT * FROM schedules ORDER BY switch_num, day_of_week, time_on")
-                
-            schedules = c.fetchall()
+            c.execute("""
+                SELECT id, name, board, trigger_source, trigger_op, trigger_value,
+                       action_switch, action, duration, cooldown, enabled, created_at, updated_at
+                FROM rules WHERE board IS NULL OR board = ? ORDER BY id
+            """, (self.ip_address,))
+            rules = c.fetchall()
             conn.close()
             
-            return [{
-                'id': s[0], 'switch_num': s[1], 'day_of_week': s[2],
-                'time_on': s[3], 'time_off': s[4], 'enabled': s[5],
-                'name': s[6], 'created_at': s[7]
-            } for s in schedules]
+            result = []
+            for r in rules:
+                trigger_value = r[5]
+                if r[4] in ('above', 'below'):
+                    trigger_value = float(trigger_value)
+                result.append({
+                    'id': r[0], 'name': r[1], 'board': r[2], 'trigger_source': r[3],
+                    'trigger_op': r[4], 'trigger_value': trigger_value, 'action_switch': r[6],
+                    'action': r[7], 'duration': r[8], 'cooldown': r[9] or 0, 'enabled': bool(r[10]),
+                    'created_at': r[11], 'updated_at': r[12]
+                })
+            return result
             
         except Exception as e:
-            logger.error(f"💥 스케줄 조회 오류: {e}")
+            rule_logger.error("💥 규칙 조회 오류: %s", e)
             return []
-            
-    def save_schedule(self, switch_num, day_of_week, time_on, time_off, name, enabled=True):
-        """스케줄 저장"""
+
+    def _rules_revision(self):
+        conn = sqlite3.connect('kc868_rules.db')
+        c = conn.cursor()
+        c.execute("SELECT revision FROM rules_meta WHERE id = 1")
+        row = c.fetchone()
+        conn.close()
+        return row[0] if row else 0
+
+    def reload_rules(self, if_changed=False):
+        """규칙을 다시 읽어 색인 재컴파일 (if_changed면 변경 번호가 다를 때만)"""
         try:
-            conn = sqlite3.connect('kc868_schedule.db')
-            c = conn.cursor()
-            
+            revision = self._rules_revision()
+            if if_changed and revision == self.rules.revision:
+                return False
+            self.rules.load(self.get_rules(), revision)
+            return True
+        except Exception as e:
+            rule_logger.error("💥 규칙 로드 오류: %s", e)
+            return False
+
+    def save_rule(self, data, rule_id=None):
+        """규칙 추가/수정 (저장 후 즉시 재컴파일)"""
+        rule = normalize_rule(data)
+        now = datetime.now().isoformat()
+        values = (rule['name'], rule['board'], rule['trigger_source'], rule['trigger_op'],
+                  None if rule['trigger_value'] is None else str(rule['trigger_value']),
+                  rule['action_switch'], rule['action'], rule['duration'], rule['cooldown'], rule['enabled'])
+        
+        conn = sqlite3.connect('kc868_rules.db')
+        c = conn.cursor()
+        if rule_id is None:
             c.execute("""
-                INSERT INTO schedules (switch_num, day_of_week, time_on, time_off, enabled, name, created_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (switch_num, day_of_week, time_on, time_off, enabled, name, datetime.now().isoformat()))
-            
+                INSERT INTO rules (name, board, trigger_source, trigger_op, trigger_value,
+                                   action_switch, action, duration, cooldown, enabled, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, values + (now, now))
+            rule_id = c.lastrowid
+        else:
+            c.execute("""
+                UPDATE rules SET name = ?, board = ?, trigger_source = ?, trigger_op = ?, trigger_value = ?,
+                                 action_switch = ?, action = ?, duration = ?, cooldown = ?, enabled = ?, updated_at = ?
+                WHERE id = ?
+            """, values + (now, rule_id))
+            if c.rowcount == 0:
+                conn.close()
+                return None
+        c.execute("UPDATE rules_meta SET revision = revision + 1 WHERE id = 1")
+        conn.commit()
+        conn.close()
+        
+        rule_logger.info("🧩 규칙 저장: %s %s → 스위치%s %s", rule['trigger_source'], rule['trigger_op'], rule['action_switch'], rule['action'])
+        self.reload_rules()
+        return rule_id
+
+    def delete_rule(self, rule_id):
+        """규칙 삭제"""
+        try:
+            conn = sqlite3.connect('kc868_rules.db')
+            c = conn.cursor()
+            c.execute("DELETE FROM rules WHERE id = ?", (rule_id,))
+            deleted = c.rowcount > 0
+            c.execute("UPDATE rules_meta SET revision = revision + 1 WHERE id = 1")
             conn.commit()
             conn.close()
             
-            logger.info(f"📅 스케줄 저장: 스위치{switch_num} {name}")
-            return True
+            rule_logger.info("🗑️ 규칙 삭제: ID %s", rule_id)
+            self.reload_rules()
+            return deleted
             
         except Exception as e:
-            logger.error(f"💥 스케줄 저장 오류: {e}")
+            rule_logger.error("💥 규칙 삭제 오류: %s", e)
             return False
-            
-    def delete_schedule(self, schedule_id):
-        """스케줄 삭제"""
+
+    def init_modbus_db(self):
+        """Modbus 장치 데이터베이스 초기화"""
         try:
-            conn = sqlite3.connect('kc868_schedule.db')
+            conn = sqlite3.connect('kc868_modbus.db')
             c = conn.cursor()
+            c.execute("PRAGMA journal_mode=WAL")
+            
+            # RS485 슬레이브 장치 설정 (포인트 목록은 JSON)
+            c.execute('''CREATE TABLE IF NOT EXISTS modbus_devices
+                        (name TEXT PRIMARY KEY,
+                         host TEXT NOT NULL,
+                         port INTEGER NOT NULL,
+                         unit_id INTEGER NOT NULL,
+                         framing TEXT NOT NULL,
+                         poll_interval REAL NOT NULL,
+                         points TEXT NOT NULL,
+                         enabled BOOLEAN,
+                         updated_at TEXT)''')
             
-            c.execute("DELETE FROM schedules WHERE id = ?", (schedule_id,))
+            # 마지막 폴링 값 (모든 워커가 공유, 값이 바뀔 때만 기록)
+            c.execute('''CREATE TABLE IF NOT EXISTS modbus_values
+                        (device TEXT NOT NULL,
+                         point TEXT NOT NULL,
+                         value TEXT,
+                         updated_at REAL,
+                         PRIMARY KEY (device, point)) WITHOUT ROWID''')
+            
+            # 장치 설정 변경 번호 (폴링 리더가 재구성 여부 판단)
+            c.execute('''CREATE TABLE IF NOT EXISTS modbus_meta
+                        (id INTEGER PRIMARY KEY CHECK (id = 1),
+                         revision INTEGER NOT NULL)''')
+            c.execute("INSERT OR IGNORE INTO modbus_meta (id, revision) VALUES (1, 0)")
             
             conn.commit()
             conn.close()
-            
-            logger.info(f"🗑️ 스케줄 삭제: ID {schedule_id}")
-            return True
+            modbus_logger.info("🔗 Modbus 데이터베이스 초기화 완료")
             
         except Exception as e:
-            logger.error(f"💥 스케줄 삭제 오류: {e}")
-            return False
-    
-    def delete_schedule_by_condition(self, switch_num, day_of_week, time_on=None, time_off=None):
-        """조건별 스케줄 삭제"""
+            modbus_logger.error("💥 Modbus DB 초기화 오류: %s", e)
+
+    def get_modbus_devices(self):
+        """Modbus 장치 설정 조회"""
         try:
-            conn = sqlite3.connect('kc868_schedule.db')
+            conn = sqlite3.connect('kc868_modbus.db')
             c = conn.cursor()
+            c.execute("""SELECT name, host, port, unit_id, framing, poll_interval, points, enabled, updated_at
+                         FROM modbus_devices ORDER BY name""")
+            devices = c.fetchall()
+            conn.close()
             
-            # 조건에 맞는 스케줄 삭제
-            c.execute("""
-                DELETE FROM schedules 
-                WHERE switch_num = ? AND day_of_week = ? AND time_on = ? AND time_off = ?
-            """, (switch_num, day_of_week, time_on, time_off))
-            
-            deleted_count = c.rowcount
+            return [{
+                'name': d[0], 'host': d[1], 'port': d[2], 'unit_id': d[3], 'framing': d[4],
+                'poll_interval': d[5], 'points': json.loads(d[6]), 'enabled': bool(d[7]), 'updated_at': d[8]
+            } for d in devices]
             
+        except Exception as e:
+            modbus_logger.error("💥 Modbus 장치 조회 오류: %s", e)
+            return []
+
+    def save_modbus_device(self, data):
+        """Modbus 장치 추가/수정 (이름 기준)"""
+        device = normalize_modbus_device(data)
+        
+        conn = sqlite3.connect('kc868_modbus.db')
+        c = conn.cursor()
+        c.execute("""
+            INSERT INTO modbus_devices (name, host, port, unit_id, framing, poll_interval, points, enabled, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(name) DO UPDATE SET
+                host = excluded.host, port = excluded.port, unit_id = excluded.unit_id,
+                framing = excluded.framing, poll_interval = excluded.poll_interval,
+                points = excluded.points, enabled = excluded.enabled, updated_at = excluded.updated_at
+        """, (device['name'], device['host'], device['port'], device['unit_id'], device['framing'],
+              device['poll_interval'], json.dumps(device['points']), device['enabled'], datetime.now().isoformat()))
+        c.execute("UPDATE modbus_meta SET revision = revision + 1 WHERE id = 1")
+        conn.commit()
+        conn.close()
+        
+        modbus_logger.info("🔗 Modbus 장치 저장: %s (%s:%s #%s, 포인트 %s개 → 요청 %s회/주기)",
+                           device['name'], device['host'], device['port'], device['unit_id'],
+                           len(device['points']), len(plan_modbus_reads(device['points'])))
+        return device
+
+    def delete_modbus_device(self, name):
+        """Modbus 장치 삭제"""
+        try:
+            conn = sqlite3.connect('kc868_modbus.db')
+            c = conn.cursor()
+            c.execute("DELETE FROM modbus_devices WHERE name = ?", (name,))
+            deleted = c.rowcount > 0
+            c.execute("DELETE FROM modbus_values WHERE device = ?", (name,))
+            c.execute("UPDATE modbus_meta SET revision = revision + 1 WHERE id = 1")
             conn.commit()
             conn.close()
             
-            logger.info(f"🗑️ 조건별 스케줄 삭제: 스위치{switch_num} {day_of_week}요일 ({deleted_count}개)")
-            return deleted_count > 0
+            self.modbus_values.pop(name, None)
+            modbus_logger.info("🗑️ Modbus 장치 삭제: %s", name)
+            return deleted
             
         except Exception as e:
-            logger.error(f"💥 조건별 스케줄 삭제 오류: {e}")
+            modbus_logger.error("💥 Modbus 장치 삭제 오류: %s", e)
             return False
+
+    def _modbus_revision(self):
+        conn = sqlite3.connect('kc868_modbus.db')
+        c = conn.cursor()
+        c.execute("SELECT revision FROM modbus_meta WHERE id = 1")
+        row = c.fetchone()
+        conn.close()
+        return row[0] if row else 0
+
+    def get_modbus_values(self):
+        """장치별 포인트 값 {device: {point: {'value', 'updated_at'}}} (폴링 리더는 메모리, 그 외는 DB)"""
+        if self.is_leader('modbus'):
+            return {device: dict(points) for device, points in self.modbus_values.items()}
+        
+        try:
+            conn = sqlite3.connect('kc868_modbus.db')
+            c = conn.cursor()
+            c.execute("SELECT device, point, value, updated_at FROM modbus_values")
+            rows = c.fetchall()
+            conn.close()
+        except Exception as e:
+            modbus_logger.error("💥 Modbus 값 조회 오류: %s", e)
+            return {}
+        
+        values = {}
+        for device, point, value, updated_at in rows:
+            values.setdefault(device, {})[point] = {'value': json.loads(value), 'updated_at': updated_at}
+        return values
+
+    def get_modbus_status(self):
+        """상태 API용 평면 형식 {'장치/포인트': 값}"""
+        return {f"{device}/{point}": info['value']
+                for device, points in self.get_modbus_values().items()
+                for point, info in points.items()}
+
+    def _store_modbus_values(self, device_name, changed):
+        """바뀐 포인트 값만 공유 테이블에 기록"""
+        conn = sqlite3.connect('kc868_modbus.db', timeout=5)
+        conn.executemany("""
+            INSERT INTO modbus_values (device, point, value, updated_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT(device, point) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at
+        """, [(device_name, point, json.dumps(value), ts) for point, value, ts in changed])
+        conn.commit()
+        conn.close()
+
+    def _modbus_client(self, device):
+        """게이트웨이(host, port)별 클라이언트 1개 공유 (같은 RS485 버스 요청은 순차 처리)"""
+        key = (device['host'], device['port'], device['framing'])
+        client = self._modbus_clients.get(key)
+        if client is None:
+            client = self._modbus_clients[key] = ModbusClient(device['host'], device['port'], device['framing'])
+        return client
+
+    async def _poll_modbus_device(self, device):
+        """장치 1개 폴링 (병합된 블록당 요청 1회)"""
+        client = self._modbus_client(device)
+        name = device['name']
+        values = self.modbus_values.setdefault(name, {})
+        changed = []
+        
+        for block in device['plan']:
+            try:
+                raw_values = await client.read(device['unit_id'], block['table'], block['start'], block['count'])
+            except ModbusError as e:
+                if self.modbus_device_status.get(name, {}).get('online', True):
+                    modbus_logger.warning("🔗 Modbus 장치 %s 응답 없음: %s", name, e)
+                self.modbus_device_status[name] = {'online': False, 'error': str(e), 'last_poll': time.time()}
+                return
             
+            now = time.time()
+            for point in block['points']:
+                value = modbus_point_value(point, raw_values[point['address'] - block['start']])
+                previous = values.get(point['name'])
+                values[point['name']] = {'value': value, 'updated_at': now}
+                if previous is None or previous['value'] != value:
+                    changed.append((point['name'], value, now))
+                    # Modbus 포인트 변화도 규칙 트리거로 사용
+                    if self.is_leader('inputs'):
+                        self.rules.process(f"{name}/{point['name']}", value)
+        
+        if not self.modbus_device_status.get(name, {}).get('online', False):
+            modbus_logger.info("🔗 Modbus 장치 %s 연결됨", name)
+        self.modbus_device_status[name] = {'online': True, 'error': None, 'last_poll': time.time()}
+        if changed:
+            try:
+                await asyncio.to_thread(self._store_modbus_values, name, changed)
+            except Exception as e:
+                modbus_logger.error("💥 Modbus 값 저장 오류 (%s): %s", name, e)
+                # 다음 폴링에서 변경으로 다시 감지해서 저장 재시도
+                for point_name, _, _ in changed:
+                    values.pop(point_name, None)
+
+    async def _close_modbus_clients(self):
+        for client in self._modbus_clients.values():
+            await client.close()
+        self._modbus_clients = {}
+
+    async def _modbus_poll_loop(self):
+        """장치별 폴링 주기에 맞춰 폴링 (다음 폴링 시각 힙)"""
+        heap, devices = [], {}
+        revision = None
+        last_check = 0
+        backoff = 1
+        try:
+            while not self._stop_event.is_set():
+                try:
+                    now = time.time()
+                    # 10초마다 임대 갱신 및 장치 설정 변경 확인
+                    if now - last_check >= 10:
+                        last_check = now
+                        if not await asyncio.to_thread(self.try_acquire_leadership, 'modbus', 30):
+                            if devices:
+                                await self._close_modbus_clients()
+                                heap, devices, revision = [], {}, None
+                                self.modbus_values = {}
+                            await asyncio.sleep(10)
+                            continue
+                    
+                        current = await asyncio.to_thread(self._modbus_revision)
+                        if current != revision:
+                            revision = current
+                            await self._close_modbus_clients()
+                            devices = {}
+                            for device in await asyncio.to_thread(self.get_modbus_devices):
+                                if device['enabled']:
+                                    device['plan'] = plan_modbus_reads(device['points'])
+                                    devices[device['name']] = device
+                            heap = [(now, name) for name in devices]
+                            heapq.heapify(heap)
+                            self.modbus_values = {name: self.modbus_values.get(name, {}) for name in devices}
+                            modbus_logger.info("🔗 Modbus 폴링 구성: 장치 %s개", len(devices))
+                
+                    if not heap or heap[0][0] > now:
+                        wait = min(heap[0][0] - now, 1.0) if heap else 1.0
+                        await asyncio.sleep(wait)
+                        continue
+                
+                    # 폴링 시각이 된 장치들은 동시에 폴링 (같은 게이트웨이는 클라이언트 잠금으로 순차)
+                    due = []
+                    while heap and heap[0][0] <= now:
+                        due.append(heapq.heappop(heap))
+                    results = await asyncio.gather(*(self._poll_modbus_device(devices[name]) for _, name in due),
+                                                   return_exceptions=True)
+                    for (_, name), result in zip(due, results):
+                        # 장치 1개의 예기치 않은 오류가 전체 폴링을 멈추지 않도록 오프라인 처리만
+                        if isinstance(result, Exception):
+                            modbus_logger.error("💥 Modbus 장치 %s 폴링 오류: %r", name, result)
+                            self.modbus_device_status[name] = {'online': False, 'error': repr(result),
+                                                               'last_poll': time.time()}
+                
+                    now = time.time()
+                    for scheduled, name in due:
+                        interval = devices[name]['poll_interval']
+                        # 밀린 경우 따라잡기 대신 현재 시각 기준으로 재조정
+                        next_due = scheduled + interval
+                        heapq.heappush(heap, (next_due if next_due > now else now + interval, name))
+                    backoff = 1
+                except Exception as e:
+                    # DB 잠금 등 일시 오류는 대기 후 재시도 (폴링 작업 자체는 유지)
+                    modbus_logger.error("💥 Modbus 폴링 오류: %s (%s초 후 재시도)", e, backoff)
+                    await asyncio.sleep(backoff)
+                    backoff = min(backoff * 2, 30)
+                    last_check = 0
+        finally:
+            await self._close_modbus_clients()
+
+    def start_modbus_service(self):
+        """Modbus 폴링 스레드 시작 (RS485 버스 부하를 위해 리더 프로세스만 폴링)"""
+        def modbus_worker():
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            self._modbus_loop = loop
+            self._modbus_task = loop.create_task(self._modbus_poll_loop())
+            try:
+                loop.run_until_complete(self._modbus_task)
+            except asyncio.CancelledError:
+                pass
+            except Exception as e:
+                modbus_logger.error("💥 Modbus 폴링 오류: %s", e)
+            finally:
+                self._modbus_loop = None
+                self._modbus_task = None
+                loop.close()
+        
+        thread = threading.Thread(target=modbus_worker, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+        modbus_logger.info("🔗 Modbus 폴링 서비스 시작됨")
+
+    def write_modbus_point(self, device_name, point_name, value):
+        """Modbus 포인트 쓰기 (코일: ON/OFF, 홀딩 레지스터: 숫자)"""
+        device = next((d for d in self.get_modbus_devices() if d['name'] == device_name), None)
+        if device is None:
+            raise ValueError(f"알 수 없는 장치: {device_name}")
+        point = next((p for p in device['points'] if p['name'] == point_name), None)
+        if point is None:
+            raise ValueError(f"알 수 없는 포인트: {device_name}/{point_name}")
+        
+        if MODBUS_TABLES[point['table']]['bits']:
+            raw = str(value).upper() in ('ON', 'TRUE', '1')
+        else:
+            raw = round(float(value) / point['scale'])
+        
+        async def write(client):
+            await client.write(device['unit_id'], point['table'], point['address'], raw)
+        
+        async def write_once():
+            client = ModbusClient(device['host'], device['port'], device['framing'])
+            try:
+                await write(client)
+            finally:
+                await client.close()
+        
+        loop = self._modbus_loop
+        if loop is not None and self.is_leader('modbus'):
+            # 폴링 중인 연결을 그대로 사용 (게이트웨이 동시 연결 수 제한 대비)
+            asyncio.run_coroutine_threadsafe(write(self._modbus_client(device)), loop).result(timeout=10)
+        else:
+            asyncio.run(write_once())
+        
+        now = time.time()
+        result = modbus_point_value(point, raw)
+        self.modbus_values.setdefault(device_name, {})[point_name] = {'value': result, 'updated_at': now}
+        self._store_modbus_values(device_name, [(point_name, result, now)])
+        modbus_logger.info("🔗 Modbus 쓰기: %s/%s = %s", device_name, point_name, result)
+        return result
+
     def init_switch_names_db(self):
         """스위치 이름 데이터베이스 초기화"""
         try:
@@ -567,7 +3520,7 @@ class KC868Controller:
             logger.info("🏷️ 스위치 이름 데이터베이스 초기화 완료")
             
         except Exception as e:
-            logger.error(f"💥 스위치 이름 DB 초기화 오류: {e}")
+            logger.error("💥 스위치 이름 DB 초기화 오류: %s", e)
             
     def get_switch_names(self):
         """모든 스위치 이름 조회"""
@@ -587,7 +3540,7 @@ class KC868Controller:
             }
             
         except Exception as e:
-            logger.error(f"💥 스위치 이름 조회 오류: {e}")
+            logger.error("💥 스위치 이름 조회 오류: %s", e)
             # 기본값 반환
             return {
                 "1": {"name": "메인 조명", "icon": "fa-lightbulb"}, 
@@ -620,11 +3573,11 @@ class KC868Controller:
             conn.commit()
             conn.close()
             
-            logger.info(f"🏷️ 스위치{switch_num} 이름 변경: '{name}'")
+            logger.info("🏷️ 스위치%s 이름 변경: '%s'", switch_num, name)
             return True
             
         except Exception as e:
-            logger.error(f"💥 스위치 이름 업데이트 오류: {e}")
+            logger.error("💥 스위치 이름 업데이트 오류: %s", e)
             return False
             
     def update_switch_icon(self, switch_num, icon):
@@ -649,50 +3602,224 @@ class KC868Controller:
             conn.commit()
             conn.close()
             
-            logger.info(f"🎨 스위치{switch_num} 아이콘 변경: '{icon}'")
+            logger.info("🎨 스위치%s 아이콘 변경: '%s'", switch_num, icon)
             return True
             
         except Exception as e:
-            logger.error(f"💥 스위치 아이콘 업데이트 오류: {e}")
+            logger.error("💥 스위치 아이콘 업데이트 오류: %s", e)
             return False
 
-# KC868 컨트롤러 인스턴스
-controller = KC868Controller()
+# 라우트 블루프린트 (앱 팩토리에서 등록)
+bp = Blueprint('kc868', __name__)
+_controller_lock = threading.Lock()
+
+def _build_controller():
+    """컨트롤러 생성 + DB 초기화 (_controller_lock 보유 상태에서 호출)"""
+    controller = current_app.extensions.get('kc868')
+    if controller is None:
+        # 호스트(WSGI 서버 등)가 로깅을 구성하지 않았으면 기본 구성 적용
+        if not logging.getLogger().handlers:
+            configure_logging()
+        controller = KC868Controller(current_app.config['KC868_IP'], admission=get_board_admission(
+            current_app.config['KC868_IP'],
+            max_concurrency=current_app.config['KC868_BOARD_MAX_CONCURRENCY'],
+            rate=current_app.config['KC868_BOARD_RATE'],
+            # 요청마다 DB 쓰기 2번이 추가되므로 여러 워커로 실행할 때만 사용
+            shared_db='kc868_state.db' if current_app.config['KC868_BOARD_SHARED_LIMITS'] else None,
+        ))
+        if current_app.config['KC868_MQTT_HOST']:
+            controller.mqtt = MQTTBridge(
+                controller,
+                current_app.config['KC868_MQTT_HOST'],
+                port=current_app.config['KC868_MQTT_PORT'],
+                prefix=current_app.config['KC868_MQTT_PREFIX'],
+                username=current_app.config['KC868_MQTT_USERNAME'],
+                password=current_app.config['KC868_MQTT_PASSWORD'],
+                qos=current_app.config['KC868_MQTT_QOS'],
+            )
+        controller.init_databases()
+        current_app.extensions['kc868'] = controller
+    return controller
+
+def get_controller():
+    """현재 앱의 KC868 컨트롤러 반환 (DB는 보통 백그라운드에서 준비됨, 서비스는 첫 요청 시 시작)"""
+    controller = current_app.extensions.get('kc868')
+    if controller is not None and current_app.extensions.get('kc868_started'):
+        return controller
+
+    with _controller_lock:
+        controller = _build_controller()
+        if not current_app.extensions.get('kc868_started'):
+            if current_app.config['KC868_START_SERVICES']:
+                controller.start()
+                atexit.register(controller.stop)
+            current_app.extensions['kc868_started'] = True
+    return controller
+
+def _warm_up(app):
+    """첫 요청 전에 컨트롤러 생성과 DB 초기화/이전을 미리 수행"""
+    started = time.perf_counter()
+    try:
+        with app.app_context(), _controller_lock:
+            _build_controller()
+        logger.info("🔥 DB 준비 완료: %.0fms", (time.perf_counter() - started) * 1000)
+    except Exception as e:
+        # 실패해도 첫 요청에서 다시 시도
+        logger.error("💥 DB 준비 오류: %s", e)
+
+def start_warm_up(app):
+    """DB 준비 스레드 시작 (python app.py 실행 시 또는 gunicorn post_fork 훅에서 호출)"""
+    thread = threading.Thread(target=_warm_up, args=(app,), name='kc868-warm-up', daemon=True)
+    thread.start()
+    return thread
+
+def create_app(config=None):
+    """Flask 앱 생성 (import 시 DB/스레드 부작용 없음, KC868_WARM_UP을 켠 경우만 DB 준비 스레드 시작)"""
+    app = Flask(__name__)
+    app.config.update(
+        KC868_IP=os.environ.get('KC868_IP', '192.168.0.100'),
+        # False면 스케줄러 등 백그라운드 서비스를 시작하지 않음 (테스트/CLI용)
+        KC868_START_SERVICES=True,
+        # True면 create_app 직후 백그라운드 스레드에서 DB 준비 (기본은 첫 요청 시)
+        KC868_WARM_UP=os.environ.get('KC868_WARM_UP', '0') == '1',
+        # 보드 동시 요청 수 / 초당 요청 수 제한 (ESP32 웹서버 보호)
+        KC868_BOARD_MAX_CONCURRENCY=int(os.environ.get('KC868_BOARD_MAX_CONCURRENCY', 2)),
+        KC868_BOARD_RATE=float(os.environ.get('KC868_BOARD_RATE', 8)),
+        # True면 위 한도를 kc868_state.db로 모든 워커 프로세스가 공유 (gunicorn -w N)
+        KC868_BOARD_SHARED_LIMITS=os.environ.get('KC868_BOARD_SHARED_LIMITS', '0') == '1',
+        # MQTT 브리지 (호스트 미지정 시 비활성)
+        KC868_MQTT_HOST=os.environ.get('KC868_MQTT_HOST'),
+        KC868_MQTT_PORT=int(os.environ.get('KC868_MQTT_PORT', 1883)),
+        KC868_MQTT_PREFIX=os.environ.get('KC868_MQTT_PREFIX', 'kc868'),
+        KC868_MQTT_USERNAME=os.environ.get('KC868_MQTT_USERNAME'),
+        KC868_MQTT_PASSWORD=os.environ.get('KC868_MQTT_PASSWORD'),
+        KC868_MQTT_QOS=int(os.environ.get('KC868_MQTT_QOS', 1)),
+    )
+    if config:
+        app.config.update(config)
+    app.register_blueprint(bp)
+    if app.config['KC868_WARM_UP']:
+        start_warm_up(app)
+    return app
+
+@bp.before_app_request
+def assign_request_id():
+    """요청 ID 지정 (X-Request-ID 헤더가 있으면 그대로 사용)"""
+    g.kc868_request_token = request_id_var.set(request.headers.get('X-Request-ID') or uuid.uuid4().hex[:12])
 
-@app.route('/')
+@bp.after_app_request
+def add_request_id_header(response):
+    response.headers['X-Request-ID'] = request_id_var.get()
+    return response
+
+@bp.teardown_app_request
+def clear_request_id(exc):
+    token = g.pop('kc868_request_token', None)
+    if token is not None:
+        request_id_var.reset(token)
+
+@bp.route('/')
 def dashboard():
     """메인 대시보드"""
     return render_template('dashboard.html')
 
-@app.route('/debug')
+@bp.route('/debug')
 def debug_monitor():
     """실시간 디버그 모니터"""
     return render_template('debug_monitor.html')
 
-@app.route('/api/status')
+@bp.route('/api/status')
 def get_status():
     """모든 스위치 상태 조회 API"""
+    controller = get_controller()
     try:
-        logger.debug("📊 상태 조회 요청")
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        status = loop.run_until_complete(controller.get_switch_status())
-        loop.close()
-        logger.debug(f"📊 상태 결과: {status}")
+        api_logger.debug("📊 상태 조회 요청")
+        # 재시작 직후에는 스냅샷으로 즉시 응답 (백그라운드에서 동기화 중)
+        if controller.is_warming_up():
+            status = controller.get_cached_status()
+        else:
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            status = loop.run_until_complete(controller.get_switch_status())
+            loop.close()
+        
+        # ?include=modbus: RS485 슬레이브 포인트도 '장치/포인트' 키로 포함
+        if request.args.get('include') == 'modbus':
+            status.update(controller.get_modbus_status())
+        api_logger.debug("📊 상태 결과: %s", status)
         return jsonify(status)
     except Exception as e:
-        logger.error(f"❌ 상태 조회 오류: {e}")
+        api_logger.error("❌ 상태 조회 오류: %s", e)
         # 데모 데이터 반환
         return jsonify({
             "스위치1": "OFF", "스위치2": "OFF", "스위치3": "OFF",
             "스위치4": "OFF", "스위치5": "OFF", "스위치6": "OFF"
         })
 
-@app.route('/api/debug/status/<int:switch_num>')
+@bp.route('/api/status/meta')
+def get_status_meta():
+    """캐시된 상태의 출처/시각 조회 API"""
+    controller = get_controller()
+    controller.sync_shared_state()
+    return jsonify({
+        'warming_up': controller.is_warming_up(),
+        'instance': controller.instance_id,
+        'scheduler_leader': controller.is_leader(),
+        'switches': controller.get_state_meta()
+    })
+
+@bp.route('/api/debug/admission')
+def get_admission_stats():
+    """보드 요청 승인 제어 통계 API"""
+    controller = get_controller()
+    return jsonify(controller.admission.get_stats())
+
+@bp.route('/api/mqtt/status')
+def get_mqtt_status():
+    """MQTT 브리지 상태 조회 API"""
+    controller = get_controller()
+    if controller.mqtt is None:
+        return jsonify({'enabled': False})
+    return jsonify({'enabled': True, **controller.mqtt.get_status()})
+
+@bp.route('/api/state-history')
+def get_state_history():
+    """릴레이 상태 전환 이력 조회 API (?switch=1&start=...&end=...&limit=...)"""
+    controller = get_controller()
+    try:
+        switch_num = request.args.get('switch', type=int)
+        switch_key = f"스위치{switch_num}" if switch_num else None
+        start = request.args.get('start', type=float)
+        end = request.args.get('end', type=float)
+        limit = request.args.get('limit', 500, type=int)
+        return jsonify(controller.get_state_transitions(switch_key, start, end, limit))
+    except Exception as e:
+        api_logger.error("💥 상태 이력 조회 오류: %s", e)
+        return jsonify([]), 500
+
+@bp.route('/api/state-history/recent')
+def get_state_history_recent():
+    """최근 상태 전환 조회 API"""
+    controller = get_controller()
+    switch_num = request.args.get('switch', type=int)
+    limit = request.args.get('limit', 50, type=int)
+    return jsonify(controller.get_recent_transitions(f"스위치{switch_num}" if switch_num else None, limit))
+
+@bp.route('/api/state-history/at')
+def get_state_history_at():
+    """지정 시각의 릴레이 상태 조회 API (?time=epoch초)"""
+    controller = get_controller()
+    at = request.args.get('time', type=float)
+    if at is None:
+        return jsonify({'success': False, 'message': 'time(epoch 초)이 필요합니다'}), 400
+    return jsonify({'time': at, 'states': controller.get_state_at(at)})
+
+@bp.route('/api/debug/status/<int:switch_num>')
 def get_debug_status(switch_num):
     """개별 스위치 상세 디버그 상태 조회 API"""
+    controller = get_controller()
     try:
-        logger.info(f"🔍 스위치{switch_num} 디버그 상태 조회")
+        api_logger.info("🔍 스위치%s 디버그 상태 조회", switch_num)
         loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
         
@@ -702,7 +3829,7 @@ def get_debug_status(switch_num):
         
         return jsonify(debug_info)
     except Exception as e:
-        logger.error(f"❌ 디버그 상태 조회 오류: {e}")
+        api_logger.error("❌ 디버그 상태 조회 오류: %s", e)
         return jsonify({
             'switch_num': switch_num,
             'status': 'ERROR',
@@ -711,59 +3838,252 @@ def get_debug_status(switch_num):
             'cache_state': controller.last_known_status.get(f"스위치{switch_num}", "UNKNOWN")
         })
 
-@app.route('/api/debug/force-refresh')
+@bp.route('/api/debug/force-refresh')
 def force_refresh_all():
     """모든 스위치 강제 새로고침 API"""
+    controller = get_controller()
     try:
-        logger.info("🔄 모든 스위치 강제 새로고침")
+        api_logger.info("🔄 모든 스위치 강제 새로고침")
         loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
         
-        # 캐시 초기화
-        controller.last_known_status = {f"스위치{i}": "UNKNOWN" for i in range(1, 7)}
-        
-        # 새로운 상태 조회
+        # 새로운 상태 조회 (조회 실패한 스위치는 마지막으로 확인된 상태 유지)
         status = loop.run_until_complete(controller.get_switch_status())
         loop.close()
         
         return jsonify({
             'success': True,
             'status': status,
+            'meta': controller.get_state_meta(),
             'message': '모든 스위치 상태가 강제로 새로고침되었습니다.'
         })
     except Exception as e:
-        logger.error(f"❌ 강제 새로고침 오류: {e}")
+        api_logger.error("❌ 강제 새로고침 오류: %s", e)
         return jsonify({
             'success': False,
             'error': str(e)
         })
 
-@app.route('/api/control', methods=['POST'])
+@bp.route('/api/control', methods=['POST'])
 def control():
     """스위치 제어 API"""
+    controller = get_controller()
     try:
         data = request.get_json()
+        
+        # RS485 Modbus 장치 포인트 제어: {"device": "floor1", "point": "로비조명", "action": "ON" | "value": 25}
+        if data.get('device'):
+            value = data.get('value', data.get('action'))
+            try:
+                result = controller.write_modbus_point(data['device'], data.get('point'), value)
+            except ValueError as e:
+                return jsonify({'success': False, 'message': str(e)}), 400
+            except (ModbusError, TimeoutError) as e:
+                api_logger.warning("🔗 Modbus 제어 실패: %s", e)
+                return jsonify({'success': False, 'message': str(e)}), 502
+            return jsonify({
+                'success': True,
+                'value': result,
+                'message': f'{data["device"]}/{data.get("point")} {result} 성공'
+            })
+        
         switch_num = data.get('switch')
         action = data.get('action')
+        # 선택: duration초 후 반대 동작 (action=PULSE는 duration 동안 켜기)
+        duration = data.get('duration')
+        
+        if duration is not None:
+            if isinstance(duration, bool) or not isinstance(duration, (int, float)) or duration <= 0:
+                return jsonify({'success': False, 'message': 'duration은 0보다 큰 숫자여야 합니다'}), 400
+        elif str(action).upper() == "PULSE":
+            return jsonify({'success': False, 'message': 'PULSE 동작에는 duration이 필요합니다'}), 400
         
-        logger.info(f"🎮 제어 요청: 스위치{switch_num} {action}")
+        api_logger.info("🎮 제어 요청: 스위치%s %s%s", switch_num, action, f" ({duration}초)" if duration else "")
         
         # 비동기 함수 실행
         loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
-        success = loop.run_until_complete(controller.control_switch(switch_num, action))
+        success = loop.run_until_complete(controller.control_switch(switch_num, action, duration=duration))
         loop.close()
         
-        return jsonify({
+        result = {
             'success': success,
             'message': f'스위치{switch_num} {action} {"성공" if success else "실패"}'
-        })
+        }
+        if success and duration:
+            result['timers'] = controller.get_timers(switch_num)
+        return jsonify(result)
+        
+    except Exception as e:
+        api_logger.error("💥 제어 오류: %s", e)
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@bp.route('/api/timers')
+def get_timers():
+    """대기 중인 자동 동작 조회 API"""
+    controller = get_controller()
+    try:
+        switch_num = request.args.get('switch_num', type=int)
+        return jsonify(controller.get_timers(switch_num))
+    except Exception as e:
+        api_logger.error("💥 타이머 조회 오류: %s", e)
+        return jsonify([]), 500
+
+@bp.route('/api/timers/<timer_id>', methods=['DELETE'])
+def cancel_timer(timer_id):
+    """자동 동작 취소 API"""
+    controller = get_controller()
+    try:
+        success = controller.cancel_timer(timer_id)
+        return jsonify({'success': success})
+    except Exception as e:
+        api_logger.error("💥 타이머 취소 오류: %s", e)
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@bp.route('/api/inputs')
+def get_inputs():
+    """입력/센서 최신 값 조회 API"""
+    controller = get_controller()
+    try:
+        return jsonify(controller.get_input_values())
+    except Exception as e:
+        api_logger.error("💥 입력 조회 오류: %s", e)
+        return jsonify({}), 500
+
+@bp.route('/api/inputs/<sensor>/history')
+def get_input_history(sensor):
+    """입력/센서 구간 조회 API (구간 길이에 따라 버킷 크기 자동 선택)"""
+    controller = get_controller()
+    try:
+        now = time.time()
+        end = request.args.get('end', now, type=float)
+        start = request.args.get('start', end - 3600, type=float)
+        max_points = request.args.get('points', 500, type=int)
+        resolution = request.args.get('resolution', type=int)
         
+        if start >= end or max_points <= 0:
+            return jsonify({'success': False, 'message': '잘못된 조회 구간입니다'}), 400
+        if resolution and resolution not in [tier[0] for tier in ROLLUP_TIERS]:
+            return jsonify({'success': False, 'message': '지원하지 않는 버킷 크기입니다'}), 400
+        
+        return jsonify(controller.timeseries.query(sensor, start, end, max_points, resolution))
+    except Exception as e:
+        api_logger.error("💥 입력 이력 조회 오류: %s", e)
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@bp.route('/api/inputs/<sensor>/recent')
+def get_input_recent(sensor):
+    """입력/센서 최근 샘플 조회 API
+
+    입력 리더 워커는 메모리 링 버퍼의 원시 샘플을, 다른 워커는 DB의 10초 버킷
+    마지막 값을 반환한다. 어느 쪽인지는 X-Samples-Source 헤더(raw / rollup)로 알린다.
+    """
+    controller = get_controller()
+    limit = request.args.get('limit', type=int)
+    if controller.is_leader('inputs'):
+        response = jsonify(controller.timeseries.recent(sensor, limit))
+        response.headers['X-Samples-Source'] = 'raw'
+        return response
+    try:
+        response = jsonify(controller.timeseries.stored_recent(sensor, limit))
+    except Exception as e:
+        api_logger.error("💥 입력 최근 샘플 조회 오류: %s", e)
+        return jsonify({'success': False, 'message': str(e)}), 500
+    response.headers['X-Samples-Source'] = 'rollup'
+    return response
+
+@bp.route('/api/rules')
+def get_rules():
+    """자동화 규칙 조회 API"""
+    controller = get_controller()
+    try:
+        return jsonify(controller.get_rules())
+    except Exception as e:
+        api_logger.error("💥 규칙 조회 오류: %s", e)
+        return jsonify([]), 500
+
+@bp.route('/api/rules', methods=['POST'])
+@bp.route('/api/rules/<int:rule_id>', methods=['PUT'])
+def save_rule(rule_id=None):
+    """자동화 규칙 추가/수정 API"""
+    controller = get_controller()
+    try:
+        saved_id = controller.save_rule(request.get_json(silent=True), rule_id)
+        if saved_id is None:
+            return jsonify({'success': False, 'message': '규칙을 찾을 수 없습니다'}), 404
+        return jsonify({'success': True, 'id': saved_id})
+    except (TypeError, ValueError) as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except Exception as e:
+        api_logger.error("💥 규칙 저장 오류: %s", e)
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@bp.route('/api/rules/<int:rule_id>', methods=['DELETE'])
+def delete_rule(rule_id):
+    """자동화 규칙 삭제 API"""
+    controller = get_controller()
+    try:
+        return jsonify({'success': controller.delete_rule(rule_id)})
     except Exception as e:
-        logger.error(f"💥 제어 오류: {e}")
+        api_logger.error("💥 규칙 삭제 오류: %s", e)
         return jsonify({'success': False, 'message': str(e)}), 500
 
-@app.route('/api/logs')
+@bp.route('/api/rules/stats')
+def get_rule_stats():
+    """규칙 엔진 매칭/실행 통계 API"""
+    controller = get_controller()
+    stats = controller.rules.get_stats()
+    stats['active'] = controller.is_leader('inputs')
+    return jsonify(stats)
+
+@bp.route('/api/modbus/devices')
+def get_modbus_devices():
+    """Modbus 장치 설정 조회 API"""
+    controller = get_controller()
+    try:
+        devices = controller.get_modbus_devices()
+        for device in devices:
+            device['status'] = controller.modbus_device_status.get(device['name'])
+            device['requests_per_poll'] = len(plan_modbus_reads(device['points']))
+        return jsonify(devices)
+    except Exception as e:
+        api_logger.error("💥 Modbus 장치 조회 오류: %s", e)
+        return jsonify([]), 500
+
+@bp.route('/api/modbus/devices', methods=['POST'])
+def save_modbus_device():
+    """Modbus 장치 추가/수정 API"""
+    controller = get_controller()
+    try:
+        device = controller.save_modbus_device(request.get_json())
+        return jsonify({'success': True, 'device': device})
+    except (TypeError, ValueError) as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except Exception as e:
+        api_logger.error("💥 Modbus 장치 저장 오류: %s", e)
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@bp.route('/api/modbus/devices/<name>', methods=['DELETE'])
+def delete_modbus_device(name):
+    """Modbus 장치 삭제 API"""
+    controller = get_controller()
+    try:
+        return jsonify({'success': controller.delete_modbus_device(name)})
+    except Exception as e:
+        api_logger.error("💥 Modbus 장치 삭제 오류: %s", e)
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@bp.route('/api/modbus/status')
+def get_modbus_status():
+    """Modbus 장치별 포인트 값 조회 API"""
+    controller = get_controller()
+    try:
+        return jsonify(controller.get_modbus_values())
+    except Exception as e:
+        api_logger.error("💥 Modbus 상태 조회 오류: %s", e)
+        return jsonify({}), 500
+
+@bp.route('/api/logs')
 def get_logs():
     """로그 조회 API"""
     try:
@@ -781,54 +4101,104 @@ def get_logs():
         } for log in logs])
         
     except Exception as e:
-        logger.error(f"💥 로그 조회 오류: {e}")
+        api_logger.error("💥 로그 조회 오류: %s", e)
         return jsonify([])
 
-@app.route('/api/schedules')
+@bp.route('/api/schedules')
 def get_schedules():
     """스케줄 조회 API"""
+    controller = get_controller()
     try:
         switch_num = request.args.get('switch_num', type=int)
         schedules = controller.get_schedules(switch_num)
         return jsonify(schedules)
     except Exception as e:
-        logger.error(f"💥 스케줄 조회 오류: {e}")
+        api_logger.error("💥 스케줄 조회 오류: %s", e)
         return jsonify([]), 500
 
-@app.route('/api/schedules', methods=['POST'])
+@bp.route('/api/schedules', methods=['POST'])
 def save_schedule():
     """스케줄 저장 API"""
+    controller = get_controller()
     try:
         data = request.get_json()
         
+        # day_of_week(단일 요일) 또는 days(요일 목록) 지원
         success = controller.save_schedule(
             switch_num=data['switch_num'],
-            day_of_week=data['day_of_week'],
+            day_of_week=data.get('day_of_week'),
             time_on=data.get('time_on'),
             time_off=data.get('time_off'),
             name=data['name'],
-            enabled=data.get('enabled', True)
+            enabled=data.get('enabled', True),
+            days=data.get('days')
         )
         
         return jsonify({'success': success})
         
+    except (KeyError, TypeError, ValueError) as e:
+        api_logger.warning("⚠️ 스케줄 저장 요청 오류: %s", e)
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except Exception as e:
+        api_logger.error("💥 스케줄 저장 오류: %s", e)
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@bp.route('/api/schedule-entries')
+def get_schedule_entries():
+    """스케줄 항목 조회 API (요일 비트마스크 + 시간대 목록)"""
+    controller = get_controller()
+    try:
+        switch_num = request.args.get('switch_num', type=int)
+        return jsonify(controller.get_schedule_entries(switch_num))
+    except Exception as e:
+        api_logger.error("💥 스케줄 항목 조회 오류: %s", e)
+        return jsonify([]), 500
+
+@bp.route('/api/schedule-entries/bulk', methods=['POST'])
+def bulk_upsert_schedule_entries():
+    """스케줄 항목 일괄 저장/가져오기 API (한 트랜잭션)"""
+    controller = get_controller()
+    try:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({'success': False, 'message': '요청 본문은 JSON 객체여야 합니다'}), 400
+        entries = data.get('entries', [])
+        
+        if not isinstance(entries, list):
+            return jsonify({'success': False, 'message': 'entries는 목록이어야 합니다'}), 400
+        
+        ids = controller.upsert_schedule_entries(entries, replace=data.get('replace', False))
+        return jsonify({'success': True, 'ids': ids})
+        
+    except (KeyError, TypeError, ValueError) as e:
+        api_logger.warning("⚠️ 스케줄 일괄 저장 요청 오류: %s", e)
+        return jsonify({'success': False, 'message': str(e)}), 400
     except Exception as e:
-        logger.error(f"💥 스케줄 저장 오류: {e}")
+        api_logger.error("💥 스케줄 일괄 저장 오류: %s", e)
         return jsonify({'success': False, 'message': str(e)}), 500
 
-@app.route('/api/schedules/<int:schedule_id>', methods=['DELETE'])
+@bp.route('/api/schedules/<int:schedule_id>', methods=['DELETE'])
 def delete_schedule(schedule_id):
-    """스케줄 삭제 API"""
+    """스케줄 삭제 API
+
+    /api/schedules가 요일별로 펼쳐 보여주는 행들은 같은 항목 ID를 공유하므로
+    ?day_of_week=N 없이 호출하면 항목의 모든 요일이 삭제된다.
+    """
+    controller = get_controller()
     try:
-        success = controller.delete_schedule(schedule_id)
+        day_of_week = request.args.get('day_of_week', type=int)
+        if day_of_week is not None and not 0 <= day_of_week <= 6:
+            return jsonify({'success': False, 'message': f'잘못된 요일: {day_of_week}'}), 400
+        success = controller.delete_schedule(schedule_id, day_of_week)
         return jsonify({'success': success})
     except Exception as e:
-        logger.error(f"💥 스케줄 삭제 오류: {e}")
+        api_logger.error("💥 스케줄 삭제 오류: %s", e)
         return jsonify({'success': False, 'message': str(e)}), 500
 
-@app.route('/api/schedules/delete-by-condition', methods=['POST'])
+@bp.route('/api/schedules/delete-by-condition', methods=['POST'])
 def delete_schedule_by_condition():
     """조건별 스케줄 삭제 API"""
+    controller = get_controller()
     try:
         data = request.get_json()
         success = controller.delete_schedule_by_condition(
@@ -839,22 +4209,24 @@ def delete_schedule_by_condition():
         )
         return jsonify({'success': success})
     except Exception as e:
-        logger.error(f"💥 조건별 스케줄 삭제 오류: {e}")
+        api_logger.error("💥 조건별 스케줄 삭제 오류: %s", e)
         return jsonify({'success': False, 'message': str(e)}), 500
 
-@app.route('/api/switch-names')
+@bp.route('/api/switch-names')
 def get_switch_names():
     """스위치 이름 조회 API"""
+    controller = get_controller()
     try:
         names = controller.get_switch_names()
         return jsonify(names)
     except Exception as e:
-        logger.error(f"💥 스위치 이름 조회 오류: {e}")
+        api_logger.error("💥 스위치 이름 조회 오류: %s", e)
         return jsonify({}), 500
 
-@app.route('/api/switch-names/<int:switch_num>', methods=['PUT'])
+@bp.route('/api/switch-names/<int:switch_num>', methods=['PUT'])
 def update_switch_name(switch_num):
     """스위치 이름 업데이트 API"""
+    controller = get_controller()
     try:
         data = request.get_json()
         name = data.get('name', '').strip()
@@ -869,12 +4241,13 @@ def update_switch_name(switch_num):
         return jsonify({'success': success})
         
     except Exception as e:
-        logger.error(f"💥 스위치 이름 업데이트 오류: {e}")
+        api_logger.error("💥 스위치 이름 업데이트 오류: %s", e)
         return jsonify({'success': False, 'message': str(e)}), 500
 
-@app.route('/api/switch-icons/<int:switch_num>', methods=['PUT'])
+@bp.route('/api/switch-icons/<int:switch_num>', methods=['PUT'])
 def update_switch_icon(switch_num):
     """스위치 아이콘 업데이트 API"""
+    controller = get_controller()
     try:
         data = request.get_json()
         icon = data.get('icon', '').strip()
@@ -890,12 +4263,13 @@ def update_switch_icon(switch_num):
         return jsonify({'success': success})
         
     except Exception as e:
-        logger.error(f"💥 스위치 아이콘 업데이트 오류: {e}")
+        api_logger.error("💥 스위치 아이콘 업데이트 오류: %s", e)
         return jsonify({'success': False, 'message': str(e)}), 500
 
-@app.route('/api/reset-icons', methods=['POST'])
+@bp.route('/api/reset-icons', methods=['POST'])
 def reset_icons():
     """모든 아이콘을 기본값으로 리셋"""
+    get_controller()  # 스위치 이름 DB 초기화 보장
     try:
         safe_icons = {
             1: {"icon": "fa-lightbulb", "name": "메인 조명"},
@@ -927,17 +4301,22 @@ def reset_icons():
         conn.commit()
         conn.close()
         
-        logger.info("🔄 모든 아이콘과 이름이 기본값으로 리셋되었습니다")
+        api_logger.info("🔄 모든 아이콘과 이름이 기본값으로 리셋되었습니다")
         return jsonify({"success": True, "message": "모든 아이콘과 이름이 리셋되었습니다. 페이지를 새로고침하세요."})
         
     except Exception as e:
-        logger.error(f"💥 아이콘 리셋 오류: {e}")
+        api_logger.error("💥 아이콘 리셋 오류: %s", e)
         return jsonify({"success": False, "message": str(e)}), 500
 
+# WSGI 서버용 앱 인스턴스 (컨트롤러는 첫 요청 시 생성)
+app = create_app()
+
 if __name__ == '__main__':
+    configure_logging()
+    start_warm_up(app)
     print("🚀 KC868-A6 웹 서버 시작")
-    print(f"📡 KC868-A6 IP: {controller.ip_address}")
+    print(f"📡 KC868-A6 IP: {app.config['KC868_IP']}")
     print("🌐 웹 인터페이스: http://localhost:5000")
     print("⚠️  먼저 WiFi 설정을 확인하고 ESPHome 펌웨어를 업로드하세요!")
     
-    app.run(host='0.0.0.0', port=5000, debug=True) 
\ No newline at end of file
+    app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,110 @@
+"""로컬 Modbus TCP / RTU-over-TCP 시뮬레이터 (테스트 및 보드 없이 수동 확인용)
+
+    python tests/modbus_simulator.py --port 5020 --framing tcp
+"""
+import argparse
+import asyncio
+import os
+import struct
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import modbus_crc16
+
+
+class ModbusSimulator:
+    """슬레이브 1대를 흉내 내는 asyncio 서버
+
+    malformed: None, 'short'(바이트 수보다 짧은 데이터), 'count'(요청보다 적은 개수),
+               'empty'(빈 PDU), 'bad_echo'(쓰기 응답 불일치)
+    """
+
+    def __init__(self, framing='tcp', unit_id=1, size=200):
+        self.framing = framing
+        self.unit_id = unit_id
+        self.coils = [False] * size
+        self.discrete = [False] * size
+        self.holding = [0] * size
+        self.input = [0] * size
+        self.requests = []
+        self.malformed = None
+        self._server = None
+        self.port = None
+
+    async def start(self, host='127.0.0.1', port=0):
+        self._server = await asyncio.start_server(self._handle, host, port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    def process(self, pdu):
+        """요청 PDU → 응답 PDU"""
+        function = pdu[0]
+        self.requests.append((function,) + struct.unpack('>HH', pdu[1:5]))
+        if self.malformed == 'empty':
+            return b''
+        if function in (1, 2, 3, 4):
+            start, count = struct.unpack('>HH', pdu[1:5])
+            if self.malformed == 'count':
+                count = max(count - 1, 0)
+            if function in (1, 2):
+                bits = (self.coils if function == 1 else self.discrete)[start:start + count]
+                data = bytearray((count + 7) // 8)
+                for i, bit in enumerate(bits):
+                    if bit:
+                        data[i // 8] |= 1 << (i % 8)
+            else:
+                registers = (self.holding if function == 3 else self.input)[start:start + count]
+                data = b''.join(struct.pack('>H', v) for v in registers)
+            if self.malformed == 'short':
+                return bytes([function, len(data)]) + bytes(data[:-1])
+            return bytes([function, len(data)]) + bytes(data)
+        if function in (5, 6):
+            address, raw = struct.unpack('>HH', pdu[1:5])
+            if function == 5:
+                self.coils[address] = raw == 0xFF00
+            else:
+                self.holding[address] = raw
+            if self.malformed == 'bad_echo':
+                return pdu[:3] + b'\x00\x00'
+            return pdu[:5]
+        return bytes([function | 0x80, 1])
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                if self.framing == 'tcp':
+                    transaction_id, _, length, unit = struct.unpack('>HHHB', await reader.readexactly(7))
+                    response = self.process(await reader.readexactly(length - 1))
+                    writer.write(struct.pack('>HHHB', transaction_id, 0, len(response) + 1, unit) + response)
+                else:
+                    frame = await reader.readexactly(8)
+                    if struct.unpack('<H', frame[-2:])[0] != modbus_crc16(frame[:-2]):
+                        continue
+                    body = bytes([frame[0]]) + self.process(frame[1:-2])
+                    writer.write(body + struct.pack('<H', modbus_crc16(body)))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='Modbus 시뮬레이터')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5020)
+    parser.add_argument('--framing', choices=['tcp', 'rtu'], default='tcp')
+    args = parser.parse_args()
+
+    simulator = await ModbusSimulator(args.framing).start(args.host, args.port)
+    print(f"🔗 Modbus 시뮬레이터 ({args.framing}) {args.host}:{simulator.port}")
+    await asyncio.Event().wait()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
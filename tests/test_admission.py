@@ -0,0 +1,90 @@
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import BoardAdmission
+
+
+class AdmissionTest(unittest.TestCase):
+    def test_waiters_are_admitted_by_priority(self):
+        async def scenario():
+            admission = BoardAdmission(max_concurrency=2, rate=1000, burst=10, control_reserve=0)
+            order = []
+            await admission.acquire('status')
+            await admission.acquire('status')
+
+            async def request(priority):
+                await admission.acquire(priority, timeout=2)
+                order.append(priority)
+                admission.release()
+
+            tasks = [asyncio.create_task(request(p)) for p in ('debug', 'status', 'schedule', 'control')]
+            await asyncio.sleep(0.05)
+            admission.release()
+            admission.release()
+            await asyncio.gather(*tasks)
+            return order
+
+        self.assertEqual(asyncio.run(scenario()), ['control', 'schedule', 'status', 'debug'])
+
+    def test_rate_limits_requests(self):
+        async def scenario():
+            admission = BoardAdmission(max_concurrency=10, rate=20, burst=2, control_reserve=0)
+            started = time.monotonic()
+            for _ in range(6):
+                async with admission.slot('status', timeout=2):
+                    pass
+            return time.monotonic() - started
+
+        # 버스트 2개 이후 4개는 초당 20개 → 최소 0.2초
+        self.assertGreaterEqual(asyncio.run(scenario()), 0.18)
+
+    def test_control_reserve_keeps_a_slot_for_commands(self):
+        async def scenario():
+            admission = BoardAdmission(max_concurrency=2, rate=1000, burst=10, control_reserve=1)
+            await admission.acquire('status')
+            with self.assertRaises(asyncio.TimeoutError):
+                await admission.acquire('status', timeout=0.05)
+            await asyncio.wait_for(admission.acquire('control'), 0.5)
+            return admission.get_stats()
+
+        stats = asyncio.run(scenario())
+        self.assertEqual(stats['in_flight'], 2)
+        self.assertEqual(stats['priorities']['status']['timeouts'], 1)
+
+    def test_uncontended_requests_are_not_counted_as_queued(self):
+        async def scenario(admission):
+            for _ in range(5):
+                async with admission.slot('status', timeout=1):
+                    pass
+            return admission.get_stats()
+
+        with tempfile.TemporaryDirectory() as tmp:
+            for shared_db in (None, os.path.join(tmp, 'state.db')):
+                with self.subTest(shared=bool(shared_db)):
+                    admission = BoardAdmission(max_concurrency=2, rate=1000, burst=10, shared_db=shared_db)
+                    stats = asyncio.run(scenario(admission))['priorities']['status']
+                    self.assertEqual((stats['admitted'], stats['queued']), (5, 0))
+
+    def test_shared_slots_limit_concurrency_across_instances(self):
+        # 같은 DB를 쓰는 두 인스턴스 = 두 워커 프로세스
+        async def scenario(db):
+            first = BoardAdmission(max_concurrency=1, rate=1000, burst=10, control_reserve=0, shared_db=db, key='b')
+            second = BoardAdmission(max_concurrency=1, rate=1000, burst=10, control_reserve=0, shared_db=db, key='b')
+            slot_id = await first.acquire('status')
+            with self.assertRaises(asyncio.TimeoutError):
+                await second.acquire('status', timeout=0.1)
+            first.release(slot_id)
+            second.release(await second.acquire('status', timeout=1))
+
+        with tempfile.TemporaryDirectory() as tmp:
+            asyncio.run(scenario(os.path.join(tmp, 'state.db')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,24 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class ImportTest(unittest.TestCase):
+    def test_import_has_no_side_effects(self):
+        script = ("import logging, threading, app; "
+                  "print(len(threading.enumerate()), len(logging.getLogger().handlers))")
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ, PYTHONPATH=ROOT)
+            env.pop('KC868_WARM_UP', None)
+            output = subprocess.run([sys.executable, '-c', script], cwd=tmp, env=env,
+                                    capture_output=True, text=True, check=True).stdout.split()
+            self.assertEqual(output, ['1', '0'])
+            self.assertEqual(os.listdir(tmp), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
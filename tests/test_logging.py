@@ -0,0 +1,48 @@
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_script(script):
+    """로깅 구성은 프로세스 전역이므로 별도 프로세스에서 실행하고 stderr의 JSON 줄 반환"""
+    result = subprocess.run([sys.executable, '-c', script], cwd=ROOT, capture_output=True, text=True,
+                            env=dict(os.environ, KC868_LOG_FORMAT='json'), check=True)
+    return [json.loads(line) for line in result.stderr.splitlines() if line.startswith('{')]
+
+
+class JsonLogTest(unittest.TestCase):
+    def test_records_carry_request_and_command_ids(self):
+        records = run_script(
+            "import app\n"
+            "app.configure_logging()\n"
+            "app.request_id_var.set('req-1')\n"
+            "app.command_id_var.set('cmd-1')\n"
+            "data = {'a': 1}\n"
+            "app.board_logger.info('제어 %s', data)\n"
+            "data['a'] = 2\n"
+        )
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0]['logger'], 'app.board')
+        self.assertEqual(records[0]['msg'], "제어 {'a': 1}")
+        self.assertEqual((records[0]['request_id'], records[0]['command_id']), ('req-1', 'cmd-1'))
+
+    @unittest.skipUnless(hasattr(os, 'fork'), 'fork 필요')
+    def test_forked_worker_logs_are_written(self):
+        records = run_script(
+            "import os, app\n"
+            "app.configure_logging()\n"
+            "pid = os.fork()\n"
+            "if pid == 0:\n"
+            "    app.api_logger.info('worker')\n"
+            "else:\n"
+            "    os.waitpid(pid, 0)\n"
+        )
+        self.assertEqual([r['msg'] for r in records], ['worker'])
+
+
+if __name__ == '__main__':
+    unittest.main()
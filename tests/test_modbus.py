@@ -0,0 +1,123 @@
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import KC868Controller, ModbusClient, ModbusError, plan_modbus_reads
+from modbus_simulator import ModbusSimulator
+
+
+def run_with_simulator(framing, scenario):
+    async def runner():
+        simulator = await ModbusSimulator(framing).start()
+        client = ModbusClient('127.0.0.1', simulator.port, framing, timeout=1.0)
+        try:
+            return await scenario(simulator, client)
+        finally:
+            await client.close()
+            await simulator.stop()
+    return asyncio.run(runner())
+
+
+class PlanTest(unittest.TestCase):
+    def test_contiguous_points_share_one_block(self):
+        points = [{'name': f'p{i}', 'table': 'holding', 'address': a, 'scale': 1}
+                  for i, a in enumerate([10, 11, 14, 40])]
+        blocks = plan_modbus_reads(points)
+        self.assertEqual([(b['table'], b['start'], b['count']) for b in blocks],
+                         [('holding', 10, 5), ('holding', 40, 1)])
+
+    def test_tables_are_planned_separately(self):
+        points = [{'name': 'a', 'table': 'coil', 'address': 0, 'scale': 1},
+                  {'name': 'b', 'table': 'holding', 'address': 0, 'scale': 1}]
+        self.assertEqual(len(plan_modbus_reads(points)), 2)
+
+
+class ClientTest(unittest.TestCase):
+    def test_read_and_write_both_framings(self):
+        async def scenario(simulator, client):
+            simulator.holding[10:13] = [1, 2, 3]
+            simulator.coils[3] = True
+            registers = await client.read(1, 'holding', 10, 3)
+            coils = await client.read(1, 'coil', 0, 5)
+            await client.write(1, 'coil', 4, True)
+            await client.write(1, 'holding', 20, 255)
+            return registers, coils, simulator
+
+        for framing in ('tcp', 'rtu'):
+            with self.subTest(framing=framing):
+                registers, coils, simulator = run_with_simulator(framing, scenario)
+                self.assertEqual(registers, [1, 2, 3])
+                self.assertEqual(coils, [False, False, False, True, False])
+                self.assertTrue(simulator.coils[4])
+                self.assertEqual(simulator.holding[20], 255)
+
+    def test_coalesced_block_is_one_request(self):
+        async def scenario(simulator, client):
+            points = [{'name': f'p{a}', 'table': 'holding', 'address': a, 'scale': 1} for a in (0, 2, 5)]
+            for block in plan_modbus_reads(points):
+                await client.read(1, block['table'], block['start'], block['count'])
+            return simulator.requests
+
+        self.assertEqual(run_with_simulator('tcp', scenario), [(3, 0, 6)])
+
+    def test_malformed_replies_raise_modbus_error(self):
+        cases = [('short', 'read'), ('count', 'read'), ('empty', 'read'), ('bad_echo', 'write')]
+        for framing in ('tcp', 'rtu'):
+            for malformed, operation in cases:
+                with self.subTest(framing=framing, malformed=malformed):
+                    async def scenario(simulator, client):
+                        simulator.malformed = malformed
+                        if operation == 'read':
+                            await client.read(1, 'holding', 0, 3)
+                        else:
+                            await client.write(1, 'holding', 0, 7)
+                    with self.assertRaises(ModbusError):
+                        run_with_simulator(framing, scenario)
+
+
+class PollTest(unittest.TestCase):
+    def setUp(self):
+        self._cwd = os.getcwd()
+        self._tmp = tempfile.TemporaryDirectory()
+        os.chdir(self._tmp.name)
+        self.controller = KC868Controller('127.0.0.1')
+        self.controller.init_modbus_db()
+
+    def tearDown(self):
+        os.chdir(self._cwd)
+        self._tmp.cleanup()
+
+    def poll(self, simulator_setup):
+        async def runner():
+            simulator = await ModbusSimulator('tcp').start()
+            simulator_setup(simulator)
+            points = [{'name': 'temp', 'table': 'holding', 'address': 0, 'scale': 1}]
+            device = {'name': 'dev', 'host': '127.0.0.1', 'port': simulator.port, 'framing': 'tcp',
+                      'unit_id': 1, 'points': points, 'plan': plan_modbus_reads(points)}
+            try:
+                await self.controller._poll_modbus_device(device)
+            finally:
+                await self.controller._close_modbus_clients()
+                await simulator.stop()
+        asyncio.run(runner())
+
+    def test_malformed_reply_marks_device_offline(self):
+        self.poll(lambda simulator: setattr(simulator, 'malformed', 'short'))
+        self.assertFalse(self.controller.modbus_device_status['dev']['online'])
+
+    def test_store_failure_is_retried_on_next_poll(self):
+        def fail(*args):
+            raise sqlite3.OperationalError('database is locked')
+        self.controller._store_modbus_values = fail
+        self.poll(lambda simulator: simulator.holding.__setitem__(0, 42))
+        self.assertNotIn('temp', self.controller.modbus_values['dev'])
+
+
+if __name__ == '__main__':
+    unittest.main()
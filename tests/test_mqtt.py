@@ -0,0 +1,115 @@
+import os
+import queue
+import socket
+import sys
+import tempfile
+import unittest
+import uuid
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import KC868Controller, MQTTBridge, mqtt
+
+BROKER_HOST = os.environ.get('KC868_MQTT_TEST_HOST', '127.0.0.1')
+BROKER_PORT = int(os.environ.get('KC868_MQTT_TEST_PORT', 1883))
+
+
+def broker_reachable():
+    try:
+        socket.create_connection((BROKER_HOST, BROKER_PORT), timeout=0.5).close()
+        return True
+    except OSError:
+        return False
+
+
+class MQTTTestBase(unittest.TestCase):
+    def setUp(self):
+        self._cwd = os.getcwd()
+        self._tmp = tempfile.TemporaryDirectory()
+        os.chdir(self._tmp.name)
+        self.controller = KC868Controller('127.0.0.1')
+        self.controller.init_state_db()
+        self.commands = queue.Queue()
+
+        async def control_switch(switch_num, action, duration=None, priority='control'):
+            self.commands.put((switch_num, action, duration))
+            return True
+
+        self.controller.control_switch = control_switch
+
+    def tearDown(self):
+        os.chdir(self._cwd)
+        self._tmp.cleanup()
+
+
+class CommandValidationTest(MQTTTestBase):
+    def test_invalid_commands_are_rejected(self):
+        bridge = MQTTBridge(self.controller, 'localhost')
+        payloads = [
+            ('kc868/relay/7/set', 'ON'),
+            ('kc868/relay/1/set', 'TOGGLE'),
+            ('kc868/relay/1/set', 'PULSE'),
+            ('kc868/relay/1/set', '{"action": "ON", "duration": true}'),
+            ('kc868/relay/1/set', '{"action": "ON", "duration": -1}'),
+            ('kc868/relay/1/set', '{"action": "ON", "duration": "5"}'),
+            ('kc868/relay/1/set', '{broken'),
+        ]
+        for topic, payload in payloads:
+            bridge._on_message(None, None, SimpleNamespace(topic=topic, payload=payload.encode()))
+        self.assertEqual(bridge.stats['rejected'], len(payloads))
+
+    def test_unchanged_state_is_not_republished(self):
+        bridge = MQTTBridge(self.controller, 'localhost')
+        bridge._published[bridge.state_topic('스위치1')] = 'ON'
+        bridge.notify('스위치1', 'ON')
+        bridge.notify('스위치2', 'ON')
+        bridge.notify('스위치2', 'OFF')
+        self.assertEqual(bridge._pending, {'kc868/relay/2/state': 'OFF'})
+        self.assertEqual(bridge.stats['coalesced'], 1)
+
+
+@unittest.skipUnless(mqtt is not None and broker_reachable(), f'MQTT 브로커 없음 ({BROKER_HOST}:{BROKER_PORT})')
+class BrokerTest(MQTTTestBase):
+    def setUp(self):
+        super().setUp()
+        self.prefix = f'kc868-test-{uuid.uuid4().hex[:8]}'
+        self.controller.last_known_status['스위치1'] = 'ON'
+        self.bridge = MQTTBridge(self.controller, BROKER_HOST, port=BROKER_PORT, prefix=self.prefix)
+        self.bridge.start()
+        self.messages = queue.Queue()
+        self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
+        self.client.on_message = lambda client, userdata, msg: self.messages.put((msg.topic, msg.payload.decode()))
+        self.client.connect(BROKER_HOST, BROKER_PORT)
+        self.client.loop_start()
+
+    def tearDown(self):
+        self.bridge.stop()
+        # 테스트가 남긴 retained 값 정리
+        for topic in ('relay/1/state', 'state', 'status'):
+            self.client.publish(f'{self.prefix}/{topic}', b'', retain=True).wait_for_publish(2)
+        self.client.loop_stop()
+        self.client.disconnect()
+        super().tearDown()
+
+    def wait_for(self, topic, timeout=5):
+        while True:
+            received, payload = self.messages.get(timeout=timeout)
+            if received == topic:
+                return payload
+
+    def test_state_is_retained_and_commands_are_routed(self):
+        topic = f'{self.prefix}/relay/1/state'
+        self.client.subscribe(f'{self.prefix}/status')
+        self.assertEqual(self.wait_for(f'{self.prefix}/status'), 'online')
+        # 브리지 연결 후에 구독해도 retained 값을 받는다
+        self.client.subscribe(topic)
+        self.assertEqual(self.wait_for(topic), 'ON')
+
+        self.client.publish(f'{self.prefix}/relay/2/set', '{"action": "pulse", "duration": 3}')
+        self.assertEqual(self.commands.get(timeout=5), (2, 'PULSE', 3))
+        self.assertEqual(self.bridge.stats['commands'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import RuleEngine, RuleIndex, create_app, normalize_rule
+
+
+def rule(rule_id, op, value=None, source='sensor-temp'):
+    return dict(normalize_rule({'trigger_source': source, 'trigger_op': op, 'trigger_value': value,
+                                'action_switch': 1, 'action': 'ON', 'cooldown': 0}), id=rule_id)
+
+
+class RuleIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.index = RuleIndex([
+            rule(1, 'above', 25), rule(2, 'above', 30), rule(3, 'below', 10), rule(4, 'change'),
+            rule(5, 'eq', 'on', source='binary_sensor-door'),
+        ])
+
+    def ids(self, source, value, previous):
+        return sorted(r['id'] for r in self.index.match(source, value, previous))
+
+    def test_thresholds_match_only_when_crossed(self):
+        self.assertEqual(self.ids('sensor-temp', 26, 24), [1, 4])
+        self.assertEqual(self.ids('sensor-temp', 31, 24), [1, 2, 4])
+        self.assertEqual(self.ids('sensor-temp', 27, 26), [4])
+        self.assertEqual(self.ids('sensor-temp', 9, 11), [3, 4])
+        self.assertEqual(self.ids('sensor-temp', 11, 9), [4])
+
+    def test_exact_match_and_unknown_source(self):
+        self.assertEqual(self.ids('binary_sensor-door', 'ON', 'OFF'), [5])
+        self.assertEqual(self.ids('binary_sensor-door', 'OFF', 'ON'), [])
+        self.assertEqual(self.ids('sensor-other', 50, 0), [])
+        self.assertEqual(self.index.size, 5)
+
+
+class RuleEngineStatsTest(unittest.TestCase):
+    def test_stats_without_and_with_events(self):
+        engine = RuleEngine(controller=None)
+        stats = engine.get_stats()
+        self.assertNotIn('match_us_total', stats)
+        self.assertIsNone(stats['avg_match_us'])
+
+        engine.load([rule(1, 'above', 25)])
+        engine._loop = object()  # 매칭만 확인 (동작 실행 루프 없이)
+        engine.process('sensor-temp', 20)
+        engine.process('sensor-temp', 21)
+        stats = engine.get_stats()
+        self.assertNotIn('match_us_total', stats)
+        self.assertEqual((stats['events'], stats['matched'], stats['rules']), (1, 0, 1))
+        self.assertIsNotNone(stats['avg_match_us'])
+
+
+class NormalizeRuleTest(unittest.TestCase):
+    def test_invalid_rules_raise_value_error(self):
+        bad = [None, [], {}, {'trigger_source': 's', 'trigger_op': 'eq'},
+               {'trigger_source': 's', 'trigger_op': 'eq', 'trigger_value': 'ON'},
+               {'trigger_source': 's', 'trigger_op': 'nope', 'action_switch': 1},
+               {'trigger_source': 's', 'trigger_op': 'change', 'action_switch': 7},
+               {'trigger_source': 's', 'trigger_op': 'change', 'action_switch': 1, 'action': 'PULSE'}]
+        for data in bad:
+            with self.subTest(data=data):
+                with self.assertRaises(ValueError):
+                    normalize_rule(data)
+
+
+class RuleApiTest(unittest.TestCase):
+    def setUp(self):
+        self._cwd = os.getcwd()
+        self._tmp = tempfile.TemporaryDirectory()
+        os.chdir(self._tmp.name)
+        self.client = create_app({'KC868_START_SERVICES': False}).test_client()
+
+    def tearDown(self):
+        os.chdir(self._cwd)
+        self._tmp.cleanup()
+
+    def test_malformed_body_returns_400(self):
+        for body in ([1, 2], {}, 'text'):
+            with self.subTest(body=body):
+                self.assertEqual(self.client.post('/api/rules', json=body).status_code, 400)
+        response = self.client.post('/api/rules', data='not json', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_saved_rule_is_compiled(self):
+        response = self.client.post('/api/rules', json={'trigger_source': 'sensor-temp', 'trigger_op': 'above',
+                                                        'trigger_value': 25, 'action_switch': 2})
+        self.assertEqual(response.status_code, 200)
+        stats = self.client.get('/api/rules/stats').get_json()
+        self.assertEqual(stats['rules'], 1)
+        self.assertNotIn('match_us_total', stats)
+
+
+if __name__ == '__main__':
+    unittest.main()
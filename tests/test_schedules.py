@@ -0,0 +1,120 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+from datetime import datetime
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as kc868
+from app import KC868Controller, create_app, normalize_windows
+
+
+class NormalizeWindowsTest(unittest.TestCase):
+    def test_times_are_zero_padded_and_duplicates_dropped(self):
+        windows = normalize_windows({'windows': [{'on': '5:00', 'off': '7:5'}, {'on': '05:00', 'off': '07:05'}]})
+        self.assertEqual(windows, [{'on': '05:00', 'off': '07:05'}])
+
+    def test_invalid_windows_raise_value_error(self):
+        for windows in ('08:00', ['08:00'], [{'on': '25:00'}], [{}], []):
+            with self.subTest(windows=windows):
+                with self.assertRaises(ValueError):
+                    normalize_windows({'windows': windows})
+
+
+class ScheduleTest(unittest.TestCase):
+    def setUp(self):
+        self._cwd = os.getcwd()
+        self._tmp = tempfile.TemporaryDirectory()
+        os.chdir(self._tmp.name)
+
+    def tearDown(self):
+        os.chdir(self._cwd)
+        self._tmp.cleanup()
+
+    def test_legacy_rows_are_grouped_into_entries(self):
+        conn = sqlite3.connect('kc868_schedule.db')
+        conn.execute("""CREATE TABLE schedules (id INTEGER PRIMARY KEY, switch_num INTEGER, day_of_week INTEGER,
+                        time_on TEXT, time_off TEXT, enabled BOOLEAN, name TEXT, created_at TEXT)""")
+        conn.executemany("INSERT INTO schedules (switch_num, day_of_week, time_on, time_off, enabled, name, created_at) "
+                         "VALUES (?, ?, ?, ?, 1, ?, '2024-01-01')",
+                         [(1, 0, '08:00', '09:00', '아침'), (1, 2, '08:00', '09:00', '아침'), (2, 5, None, '22:00', '밤')])
+        conn.commit()
+        conn.close()
+
+        controller = KC868Controller('127.0.0.1')
+        controller.init_schedule_db()
+        entries = {e['name']: e for e in controller.get_schedule_entries()}
+        self.assertEqual(entries['아침']['days'], [0, 2])
+        self.assertEqual(entries['밤']['windows'], [{'on': None, 'off': '22:00'}])
+        self.assertEqual(len(controller.get_schedules()), 3)
+
+    def test_padded_window_fires_at_its_minute(self):
+        controller = KC868Controller('127.0.0.1')
+        controller.init_state_db()
+        controller.init_schedule_db()
+        controller.upsert_schedule_entries([{'switch_num': 1, 'days': list(range(7)), 'windows': [{'on': '5:00'}]}])
+        fired = []
+
+        async def control_switch(switch_num, action, duration=None, priority='control'):
+            fired.append((switch_num, action))
+            return True
+
+        controller.control_switch = control_switch
+        controller.try_acquire_leadership()
+
+        class FixedDatetime(datetime):
+            @classmethod
+            def now(cls, tz=None):
+                return cls(2024, 1, 1, 5, 0, 10)
+
+        with mock.patch.object(kc868, 'datetime', FixedDatetime):
+            controller.check_schedules()
+            controller.check_schedules()
+        self.assertEqual(fired, [(1, 'ON')])
+
+
+class ScheduleApiTest(unittest.TestCase):
+    def setUp(self):
+        self._cwd = os.getcwd()
+        self._tmp = tempfile.TemporaryDirectory()
+        os.chdir(self._tmp.name)
+        self.client = create_app({'KC868_START_SERVICES': False}).test_client()
+
+    def tearDown(self):
+        os.chdir(self._cwd)
+        self._tmp.cleanup()
+
+    def test_malformed_input_returns_400(self):
+        bodies = [
+            ['not', 'an', 'object'],
+            {'entries': 'x'},
+            {'entries': [{'switch_num': 1, 'days': [0], 'windows': ['08:00']}]},
+            {'entries': [{'switch_num': 99, 'days': [0], 'windows': [{'on': '08:00'}]}]},
+            {'entries': [{'switch_num': 1, 'days': [], 'windows': [{'on': '08:00'}]}]},
+        ]
+        for body in bodies:
+            with self.subTest(body=body):
+                response = self.client.post('/api/schedule-entries/bulk', json=body)
+                self.assertEqual(response.status_code, 400)
+        response = self.client.post('/api/schedules', json={'switch_num': 99, 'day_of_week': 0,
+                                                            'time_on': '08:00', 'name': 'x'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.delete('/api/schedules/1?day_of_week=9').status_code, 400)
+
+    def test_delete_single_day_or_whole_entry(self):
+        response = self.client.post('/api/schedule-entries/bulk', json={'entries': [
+            {'switch_num': 1, 'days': [0, 1, 2], 'windows': [{'on': '08:00'}], 'name': '아침'}]})
+        entry_id = response.get_json()['ids'][0]
+
+        self.client.delete(f'/api/schedules/{entry_id}?day_of_week=1')
+        self.assertEqual([s['day_of_week'] for s in self.client.get('/api/schedules').get_json()], [0, 2])
+
+        self.client.delete(f'/api/schedules/{entry_id}')
+        self.assertEqual(self.client.get('/api/schedules').get_json(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
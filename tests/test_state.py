@@ -0,0 +1,191 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as kc868
+from app import KC868Controller, create_app
+
+
+class TempDirTest(unittest.TestCase):
+    def setUp(self):
+        self._cwd = os.getcwd()
+        self._tmp = tempfile.TemporaryDirectory()
+        os.chdir(self._tmp.name)
+        self._controllers = []
+
+    def tearDown(self):
+        # 예약된 스냅샷 저장이 임시 디렉터리 밖에서 실행되지 않도록 취소
+        for controller in self._controllers:
+            if controller._state_flush_timer is not None:
+                controller._state_flush_timer.cancel()
+        os.chdir(self._cwd)
+        self._tmp.cleanup()
+
+    def controller(self):
+        controller = KC868Controller('127.0.0.1')
+        controller.init_state_db()
+        self._controllers.append(controller)
+        return controller
+
+
+class LeaderTest(TempDirTest):
+    def test_two_controllers_elect_one_leader(self):
+        first, second = self.controller(), self.controller()
+        self.assertEqual([first.try_acquire_leadership(), second.try_acquire_leadership()], [True, False])
+        self.assertTrue(first.try_acquire_leadership())
+        first.release_leadership()
+        self.assertTrue(second.try_acquire_leadership())
+
+    @unittest.skipUnless(hasattr(os, 'fork'), 'fork 필요')
+    def test_forked_workers_elect_one_leader(self):
+        # gunicorn --preload처럼 부모가 만든 컨트롤러를 fork된 워커들이 공유
+        controller = self.controller()
+        results = []
+        for _ in range(2):
+            read_fd, write_fd = os.pipe()
+            pid = os.fork()
+            if pid == 0:
+                os.close(read_fd)
+                os.write(write_fd, b'1' if controller.try_acquire_leadership() else b'0')
+                os._exit(0)
+            os.close(write_fd)
+            os.waitpid(pid, 0)
+            results.append(os.read(read_fd, 1))
+            os.close(read_fd)
+        self.assertEqual(results, [b'1', b'0'])
+        self.assertFalse(controller.is_leader())
+
+
+class SnapshotTest(TempDirTest):
+    def test_new_controller_warm_starts_from_snapshot(self):
+        first = self.controller()
+        first._set_state('스위치2', 'ON', 'controlled')
+        first._set_state('스위치3', 'OFF', 'polled')
+        first.flush_state_snapshot()
+        saved = first.get_state_meta()
+
+        second = self.controller()
+        self.assertEqual(second.load_state_snapshot(), 2)
+        self.assertEqual(second.last_known_status['스위치2'], 'ON')
+        self.assertEqual(second.get_state_meta()['스위치2'], saved['스위치2'])
+        self.assertEqual(second.get_state_meta()['스위치3']['source'], 'polled')
+        self.assertIsNone(second.get_state_meta()['스위치1']['updated_at'])
+
+        # 실제 상태를 확인하는 동안만 스냅샷으로 응답
+        observed = []
+
+        async def get_switch_status():
+            observed.append(second.is_warming_up())
+
+        second.get_switch_status = get_switch_status
+        second.start_background_refresh()
+        second._threads[-1].join(5)
+        self.assertEqual(observed, [True])
+        self.assertFalse(second.is_warming_up())
+
+    def test_cold_start_is_not_warming_up(self):
+        controller = self.controller()
+        self.assertEqual(controller.load_state_snapshot(), 0)
+
+        async def get_switch_status():
+            return {}
+
+        controller.get_switch_status = get_switch_status
+        controller.start_background_refresh()
+        self.assertFalse(controller.is_warming_up())
+        controller._threads[-1].join(5)
+
+    def test_older_shared_state_does_not_override_local_state(self):
+        first, second = self.controller(), self.controller()
+        first._set_state('스위치1', 'ON', 'controlled')
+        first.flush_state_snapshot()
+        second._set_state('스위치1', 'OFF', 'polled')
+        second.sync_shared_state()
+        self.assertEqual(second.get_cached_status()['스위치1'], 'OFF')
+        second.flush_state_snapshot()
+        first.sync_shared_state()
+        self.assertEqual(first.get_state_meta()['스위치1']['source'], 'polled')
+
+    def test_unchanged_state_is_not_rewritten(self):
+        controller = self.controller()
+        controller._set_state('스위치1', 'ON', 'polled')
+        controller.flush_state_snapshot()
+        controller._set_state('스위치1', 'ON', 'polled')
+        self.assertEqual(controller._state_dirty, set())
+        self.assertEqual(controller.get_state_meta()['스위치1']['state'], 'ON')
+
+
+class TransitionTest(TempDirTest):
+    def states(self, transitions):
+        return [(t['state'], t['previous'], t['source']) for t in transitions]
+
+    def test_only_changes_are_recorded(self):
+        controller = self.controller()
+        for state in ('ON', 'ON', 'OFF', 'ON'):
+            controller._set_state('스위치1', state, 'polled')
+        controller.flush_state_snapshot()
+        self.assertEqual(self.states(controller.get_recent_transitions('스위치1')),
+                         [('ON', 'OFF', 'polled'), ('OFF', 'ON', 'polled'), ('ON', None, 'polled')])
+
+        # 재시작 후 첫 관측(메모리 초기값 OFF → ON)이 마지막 기록과 같으면 전환이 아님
+        restarted = self.controller()
+        restarted._set_state('스위치1', 'ON', 'polled')
+        restarted.flush_state_snapshot()
+        self.assertEqual(len(restarted.get_recent_transitions('스위치1')), 3)
+
+    def test_state_at_a_point_in_time(self):
+        controller = self.controller()
+        controller._set_state('스위치1', 'ON', 'controlled')
+        on_at = controller.get_state_meta()['스위치1']['updated_at']
+        controller._set_state('스위치1', 'OFF', 'schedule')
+        off_at = controller.get_state_meta()['스위치1']['updated_at']
+        controller.flush_state_snapshot()
+
+        self.assertIsNone(controller.get_state_at(on_at - 1)['스위치1'])
+        self.assertEqual(controller.get_state_at(on_at)['스위치1'], {'state': 'ON', 'source': 'controlled', 'since': on_at})
+        self.assertEqual(controller.get_state_at(off_at + 1)['스위치1']['state'], 'OFF')
+        self.assertIsNone(controller.get_state_at(off_at)['스위치2'])
+        self.assertEqual(self.states(controller.get_state_transitions('스위치1', start=off_at)),
+                         [('OFF', 'ON', 'schedule')])
+        self.assertEqual(len(controller.get_state_transitions(end=on_at)), 1)
+
+    def test_recent_transitions_are_shared_between_workers(self):
+        first, second = self.controller(), self.controller()
+        first._set_state('스위치1', 'ON', 'controlled')
+        first.flush_state_snapshot()
+        second._set_state('스위치2', 'ON', 'polled')
+        second.flush_state_snapshot()
+        for controller in (first, second):
+            self.assertEqual([t['switch_key'] for t in controller.get_recent_transitions()], ['스위치2', '스위치1'])
+
+    def test_failed_flush_keeps_transitions_in_order(self):
+        controller = self.controller()
+        controller._set_state('스위치1', 'ON', 'controlled')
+        with mock.patch.object(kc868.sqlite3, 'connect', side_effect=sqlite3.OperationalError('locked')):
+            controller.flush_state_snapshot()
+        self.assertIsNotNone(controller._state_flush_timer)  # 재시도 예약
+        controller._state_flush_timer.cancel()
+        controller._state_flush_timer = None
+
+        controller._set_state('스위치1', 'OFF', 'controlled')
+        controller.flush_state_snapshot()
+        self.assertEqual(self.states(controller.get_recent_transitions('스위치1')),
+                         [('OFF', 'ON', 'controlled'), ('ON', None, 'controlled')])
+
+
+class HistoryApiTest(TempDirTest):
+    def test_state_at_requires_time(self):
+        client = create_app({'KC868_START_SERVICES': False}).test_client()
+        self.assertEqual(client.get('/api/state-history/at').status_code, 400)
+        response = client.get('/api/state-history/at?time=0')
+        self.assertEqual(response.get_json()['states']['스위치1'], None)
+        self.assertEqual(client.get('/api/state-history/recent').get_json(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+import asyncio
+import contextlib
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import unittest
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import KC868Controller, TimerWheel
+
+
+class TimerWheelTest(unittest.TestCase):
+    def test_timers_expire_at_their_tick(self):
+        wheel = TimerWheel(tick=1, slots=4, levels=3, now=0)
+        wheel.add('near', 2, 'a')
+        wheel.add('far', 40, 'b')  # 상위 레벨에서 cascade
+        self.assertEqual(wheel.advance(1), [])
+        self.assertEqual(wheel.advance(2), [('near', 'a')])
+        self.assertEqual(wheel.advance(39), [])
+        self.assertEqual(wheel.advance(40), [('far', 'b')])
+        self.assertEqual(len(wheel), 0)
+
+    def test_cancel_and_replace(self):
+        wheel = TimerWheel(tick=1, slots=4, levels=3, now=0)
+        wheel.add('a', 3, 'x')
+        wheel.add('b', 3, 'y')
+        wheel.add('b', 5, 'z')  # 같은 ID는 교체
+        self.assertTrue(wheel.cancel('a'))
+        self.assertFalse(wheel.cancel('a'))
+        self.assertNotIn('a', wheel)
+        self.assertEqual(wheel.advance(4), [])
+        self.assertEqual(wheel.advance(5), [('b', 'z')])
+
+    def test_past_due_timer_expires_on_next_tick(self):
+        wheel = TimerWheel(tick=1, slots=4, levels=3, now=10)
+        wheel.add('late', 3, 'x')
+        self.assertEqual(wheel.advance(11), [('late', 'x')])
+
+
+class PendingTimerTest(unittest.TestCase):
+    def setUp(self):
+        self._cwd = os.getcwd()
+        self._tmp = tempfile.TemporaryDirectory()
+        os.chdir(self._tmp.name)
+        self._controllers = []
+
+    def tearDown(self):
+        for controller in self._controllers:
+            if controller._state_flush_timer is not None:
+                controller._state_flush_timer.cancel()
+        os.chdir(self._cwd)
+        self._tmp.cleanup()
+
+    def controller(self):
+        controller = KC868Controller('127.0.0.1')
+        controller.init_state_db()
+        self._controllers.append(controller)
+        return controller
+
+    def test_timers_are_restored_by_a_new_controller(self):
+        first = self.controller()
+        timer = first.schedule_auto_action(1, 'OFF', 60)
+        self.assertEqual([t['timer_id'] for t in first.get_timers()], [timer['timer_id']])
+
+        second = self.controller()
+        self.assertEqual(second.load_pending_timers(full=True), 1)
+        self.assertIn(timer['timer_id'], second._timer_wheel)
+        # 이후에는 다른 워커가 추가한 타이머만 가져온다
+        self.assertEqual(second.load_pending_timers(), 0)
+        first.schedule_auto_action(2, 'OFF', 60)
+        self.assertEqual(second.load_pending_timers(), 1)
+
+    def test_new_command_replaces_or_cancels_pending_timer(self):
+        controller = self.controller()
+        urls = []
+
+        async def text():
+            return 'OK'
+
+        @contextlib.asynccontextmanager
+        async def board_request(session, method, url, priority='status', timing=None, **kwargs):
+            urls.append(url)
+            yield SimpleNamespace(status=200, text=text)
+
+        controller.board_request = board_request
+        self.assertTrue(asyncio.run(controller.control_switch(1, 'PULSE', duration=30)))
+        self.assertEqual([(t['switch_num'], t['action']) for t in controller.get_timers()], [(1, 'OFF')])
+        self.assertTrue(asyncio.run(controller.control_switch(1, 'ON', duration=10)))
+        self.assertEqual(len(controller.get_timers(1)), 1)
+        self.assertTrue(asyncio.run(controller.control_switch(1, 'OFF')))
+        self.assertEqual(controller.get_timers(), [])
+        self.assertTrue(urls[-1].endswith('/switch/___1/turn_off'))
+
+    def test_failed_timer_is_kept_for_retry(self):
+        controller = self.controller()
+        results = [False, True]
+        fired = []
+
+        async def control_switch(switch_num, action, duration=None, priority='control'):
+            fired.append((switch_num, action, priority))
+            return results.pop(0)
+
+        controller.control_switch = control_switch
+        timer = controller.schedule_auto_action(3, 'OFF', 0.1)
+        expired = [(timer['timer_id'], (3, 'OFF'))]
+
+        self.assertEqual(controller.fire_timers(expired), 0)
+        [row] = controller.get_timers()
+        self.assertEqual(row['attempts'], 1)
+        self.assertGreater(row['due_at'], time.time() + 4)
+        self.assertIn(timer['timer_id'], controller._timer_wheel)
+        # 재시도 시각 전에는 다시 선점되지 않는다
+        self.assertEqual(controller.fire_timers(expired), 0)
+
+        conn = sqlite3.connect('kc868_state.db')
+        conn.execute("UPDATE pending_timers SET due_at = ?", (time.time(),))
+        conn.commit()
+        conn.close()
+        self.assertEqual(controller.fire_timers(expired), 1)
+        self.assertEqual(controller.get_timers(), [])
+        self.assertEqual(fired, [(3, 'OFF', 'schedule')] * 2)
+
+
+if __name__ == '__main__':
+    unittest.main()